@@ -1,6 +1,9 @@
 import os
+import asyncio
 import base64
+import functools
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Optional
 
 from selenium import webdriver
@@ -14,6 +17,26 @@ from webdriver_manager.chrome import ChromeDriverManager
 # Reusable webdriver (single session per process)
 _DRIVER: Optional[webdriver.Chrome] = None
 
+# Selenium calls block for seconds. Tools run on this single worker thread so the
+# event loop stays free and the shared driver only ever sees one command at a time.
+_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="selenium")
+
+
+def _off_loop(fn):
+    """Expose a blocking tool as a coroutine that runs on the Selenium thread.
+
+    If the run is cancelled (client gone, deadline passed) while the call is
+    still queued behind another one, the executor drops it; a call already
+    running finishes, but its result is discarded.
+    """
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_EXECUTOR, functools.partial(fn, *args, **kwargs))
+
+    return wrapper
+
 
 def _artifact_dir() -> str:
     d = os.path.join(os.path.dirname(__file__), "artifacts")
@@ -42,6 +65,7 @@ def _get_driver() -> webdriver.Chrome:
 
 # -------------------- TOOL FUNCTIONS --------------------
 
+@_off_loop
 def go_to_url(url: str, wait_selector: Optional[str] = None, timeout: float = 15) -> dict[str, Any]:
     """Navigate to URL and optionally wait for a CSS selector to appear."""
     drv = _get_driver()
@@ -56,6 +80,7 @@ def go_to_url(url: str, wait_selector: Optional[str] = None, timeout: float = 15
     return {"ok": True, "url": drv.current_url, "title": drv.title}
 
 
+@_off_loop
 def take_screenshot(name: Optional[str] = None) -> dict[str, Any]:
     """Capture a PNG screenshot and return both path and base64."""
     drv = _get_driver()
@@ -84,6 +109,7 @@ def _find_elements_by_text(text: str, tag: Optional[str] = None, exact: bool = F
     return drv.find_elements(By.XPATH, xpath)
 
 
+@_off_loop
 def find_element_with_text(text: str, tag: Optional[str] = None, exact: bool = False, timeout: float = 5) -> dict[str, Any]:
     """Find the first element containing given text and return summary info."""
     drv = _get_driver()
@@ -111,6 +137,7 @@ def find_element_with_text(text: str, tag: Optional[str] = None, exact: bool = F
     }
 
 
+@_off_loop
 def click_element_with_text(text: str, tag: Optional[str] = None, exact: bool = False, timeout: float = 8) -> dict[str, Any]:
     """Click the first element matching text. Scroll into view before clicking."""
     drv = _get_driver()
@@ -132,6 +159,7 @@ def click_element_with_text(text: str, tag: Optional[str] = None, exact: bool =
     return {"ok": False, "error": last_err or "click_failed", "text": text}
 
 
+@_off_loop
 def enter_text_into_element(selector: str, text: str, clear: bool = True, submit: bool = False, timeout: float = 8) -> dict[str, Any]:
     """Type text into element located by CSS selector. Optionally submit (Enter)."""
     from selenium.webdriver.common.keys import Keys
@@ -155,6 +183,7 @@ def enter_text_into_element(selector: str, text: str, clear: bool = True, submit
         return {"ok": False, "error": str(e)}
 
 
+@_off_loop
 def scroll_down_screen(times: int = 2, pause_sec: float = 0.6) -> dict[str, Any]:
     """Scroll down the page a few times to load more content."""
     drv = _get_driver()
@@ -169,6 +198,7 @@ def scroll_down_screen(times: int = 2, pause_sec: float = 0.6) -> dict[str, Any]
     return {"ok": True, "scrolled_times": i + 1, "final_y": last_y}
 
 
+@_off_loop
 def load_artifacts_tool(include_html: bool = True) -> dict[str, Any]:
     """Return current page artifacts such as URL, title, HTML snapshot (truncated)."""
     drv = _get_driver()
@@ -192,6 +222,7 @@ def _extract_domain(url: str) -> str:
         return ""
 
 
+@_off_loop
 def analyze_webpage_and_determine_actions(max_results: int = 15) -> dict[str, Any]:
     """Parse a Google SERP to extract result items (rank, title, url, snippet).
     This is a lightweight DOM parser using common selectors that work for most locales.
@@ -2,22 +2,47 @@ import os
 os.environ.setdefault("OTEL_SDK_DISABLED", "true")  # Disable OpenTelemetry SDK to suppress NoneType warnings
 import logging
 import asyncio
-import base64
-import re
-from typing import Any, Optional
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
-from pydantic import BaseModel
-import requests
+import json
+import sys
+import time
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
+from pydantic import BaseModel, Field
 from google.adk.agents import LoopAgent, LlmAgent
-from google.adk.sessions import InMemorySessionService
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
 from google.adk.runners import Runner
 from google.adk.tools import google_search
 from google.genai import types
 from dotenv import load_dotenv
-import json
 load_dotenv()
 
+# Shared web helpers live in the repo-root gateway package; make it importable
+# when this app is started on its own.
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(_REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(_REPO_ROOT))
+from gateway.aggregate import EventAggregator
+from gateway.cancellation import ClientGone, RunCost, wait_for_client
+from gateway.compression import CompressionMiddleware
+from gateway.events import ToolTimer
+from gateway.images import ImageProxy
+from gateway.looplag import LoopLagMonitor
+from gateway.metrics import MetricsPlugin, MetricsRegistry
+from gateway.serialization import FastJSONResponse, dumps_str
+from gateway.sessions import (
+    SESSION_ID_PATTERN,
+    AlreadyExistsError,
+    SessionLocks,
+    new_session_id,
+    register_session_gauges,
+    session_service_from_env,
+    valid_session_id,
+)
+
 
 logging.basicConfig(level=logging.INFO)
 logging.getLogger("opentelemetry").setLevel(logging.ERROR)
@@ -26,14 +51,11 @@ logging.getLogger("opentelemetry.semconv").setLevel(logging.ERROR)
 logging.getLogger("google.adk.runners").setLevel(logging.ERROR)
 logging.getLogger("google.genai.types").setLevel(logging.ERROR)
 APP_NAME = "e-commerce-agent"
-USER_ID = "user-1"
-SESSION_ID = "session-001"
 
-#create a session
-session_service = InMemorySessionService()
-session = session_service.create_session(
-    app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-)
+#session store shared by every request; sessions are created on first use.
+#The default in-memory store expires idle sessions and caps memory (SESSION_IDLE_TTL,
+#SESSION_MAX_MB, SESSION_MAX_EVENTS); SESSION_BACKEND=sqlite/redis shares it across workers
+session_service = session_service_from_env()
 
 # Configure tools based on available credentials
 ENABLE_WEB_SEARCH = bool(os.getenv("GOOGLE_CSE_ID") and os.getenv("GOOGLE_SEARCH_API_KEY"))
@@ -94,95 +116,56 @@ e_commerce_root = LoopAgent(
  
 root_agent  = e_commerce_root
 
+# Image proxy with pooled upstream connections and a disk cache (IMG_* env vars)
+images = ImageProxy()
+
+# The metrics plugin records per-agent events, tool latency and LLM usage for /metrics;
+# the loop-lag probe flags blocking calls on the event loop.
+metrics = MetricsRegistry()
+loop_lag = LoopLagMonitor(metrics)
+register_session_gauges(metrics, session_service)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    loop_lag.start()
+    yield
+    await loop_lag.stop()
+    await images.close()
+    close_sessions = getattr(session_service, "close", None)
+    if close_sessions is not None:
+        await close_sessions()
+
 # --- FastAPI app to render search results with images (HTML + gallery fallback) ---
-app = FastAPI(title="ADK E-commerce Search UI", version="0.1.0")
+app = FastAPI(title="ADK E-commerce Search UI", version="0.1.0", lifespan=lifespan)
+# gzip/brotli for large bodies (GATEWAY_COMPRESS_MIN_BYTES); images and streams pass through
+app.add_middleware(CompressionMiddleware, registry=metrics)
 
 class QueryIn(BaseModel):
     query: str
-    user_id: Optional[str] = "user-1"
-    session_id: Optional[str] = "session-001"
-
-def _extract_text_and_html(gen_content: Optional[types.Content]) -> tuple[str, str, list[dict[str, Any]], list[str]]:
-    """Extract text, rendered HTML, Products array (if provided in JSON), and related page URLs.
-    - Parses fenced JSON blocks for key 'products' and optional 'page_urls'.
-    - Also gathers non-image URLs from text parts into page_urls.
-    """
-    if not gen_content or not getattr(gen_content, "parts", None):
-        return "", "", [], []
-    texts: list[str] = []
-    htmls: list[str] = []
-    page_urls_set: set[str] = set()
-    products: list[dict[str, Any]] = []
-    for part in gen_content.parts:
-        txt = getattr(part, "text", None)
-        if isinstance(txt, str) and txt:
-            texts.append(txt)
-            # Try parse JSON fences for products/page_urls
-            for fence in re.findall(r"```json\s*([\s\S]*?)```", txt, flags=re.IGNORECASE):
-                try:
-                    obj = json.loads(fence)
-                    if isinstance(obj, dict):
-                        if isinstance(obj.get("products"), list):
-                            for p in obj.get("products", []) or []:
-                                if isinstance(p, dict):
-                                    products.append(p)
-                        for u in obj.get("page_urls", []) or []:
-                            if isinstance(u, str):
-                                page_urls_set.add(u)
-                except Exception:
-                    pass
-            # Generic URLs
-            for u in re.findall(r"https?://[^\s)]+", txt):
-                if not _is_direct_image_url(u):
-                    page_urls_set.add(u)
-        for maybe_html_attr in ("rendered_content", "renderedContent", "html"):
-            h = getattr(part, maybe_html_attr, None)
-            if isinstance(h, str) and h:
-                htmls.append(h)
-        inline = getattr(part, "inline_data", None)
-        if inline is not None:
-            mt = getattr(inline, "mime_type", None)
-            data = getattr(inline, "data", None)
-            if mt in ("text/html", "application/html") and data:
-                try:
-                    if isinstance(data, (bytes, bytearray)):
-                        htmls.append(data.decode("utf-8", errors="ignore"))
-                    elif isinstance(data, str):
-                        htmls.append(base64.b64decode(data).decode("utf-8", errors="ignore"))
-                except Exception:
-                    pass
-    return (
-        "\n".join(texts).strip(),
-        "\n".join(htmls).strip(),
-        products,
-        list(page_urls_set),
-    )
-
-def _is_direct_image_url(u: str) -> bool:
-    u = u.lower()
-    return any(u.endswith(ext) for ext in (".jpg", ".jpeg", ".png", ".webp", ".gif"))
+    # Omit session_id to get a fresh one back ("session_id" / X-Session-Id)
+    user_id: Optional[str] = Field(default=None, pattern=SESSION_ID_PATTERN)
+    session_id: Optional[str] = Field(default=None, pattern=SESSION_ID_PATTERN)
+    timeout: Optional[float] = Field(default=None, gt=0)  # seconds; capped by ECOMMERCE_RUN_DEADLINE
 
 @app.get("/img")
-def proxy_image(u: str):
-    # Lightweight proxy to avoid hotlink issues. Not production-hardened.
-    if not (u.startswith("http://") or u.startswith("https://")):
-        raise HTTPException(status_code=400, detail="Invalid URL")
-    try:
-        resp = requests.get(u, timeout=10, headers={
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
-        })
-        ct = resp.headers.get("Content-Type", "application/octet-stream")
-        if resp.status_code != 200:
-            raise HTTPException(status_code=resp.status_code, detail="Upstream error")
-        if not ct.startswith("image/") and not _is_direct_image_url(u):
-            raise HTTPException(status_code=415, detail="Not an image")
-        return Response(content=resp.content, media_type=ct)
-    except requests.Timeout:
-        raise HTTPException(status_code=504, detail="Image fetch timeout")
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+async def proxy_image(
+    u: str,
+    request: Request,
+    w: Optional[int] = Query(default=None, ge=1),
+    h: Optional[int] = Query(default=None, ge=1),
+    fmt: Optional[str] = None,
+):
+    # Streams through the shared proxy: keep-alive pool, size cap, disk cache, Range support
+    return await images.serve(
+        u,
+        range_header=request.headers.get("range"),
+        if_none_match=request.headers.get("if-none-match"),
+        width=w,
+        height=h,
+        fmt=fmt,
+    )
 
-@app.get("/")
+@app.get("/", response_class=HTMLResponse)
 async def index():
     return (
         """
@@ -226,24 +209,38 @@ async def index():
               <div id="chat"></div>
             </main>
             <form id="f">
--              <input id="q" name="q" placeholder="Ask about products, include 'images' to see visuals" autocomplete="off" />
-+              <input id="q" name="q" placeholder="Ask about products. I will return structured product links with item numbers/SKUs." autocomplete="off" />
-               <button>Send</button>
-             </form>
+              <input id="q" name="q" placeholder="Ask about products. I will return structured product links with item numbers/SKUs." autocomplete="off" />
+              <button>Send</button>
+            </form>
             <script>
               const chat = document.getElementById('chat');
               const f = document.getElementById('f');
               const q = document.getElementById('q');
               const status = document.getElementById('status');
- 
+
+              // One conversation per tab: the server issues the session id on the first
+              // connection or request; the WebSocket and the HTTP fallback then reuse it
+              let sessionId = sessionStorage.getItem('ecommerce-session');
+              function remember(sid) {
+                if (sid) { sessionId = sid; sessionStorage.setItem('ecommerce-session', sid); }
+              }
+
               function addMsg(role, data) {
                 const wrap = document.createElement('div');
                 wrap.className = 'msg ' + (role === 'user' ? 'user' : 'assistant');
+                render(wrap, role, data);
+                chat.appendChild(wrap);
+                window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });
+                return wrap;
+              }
+
+              function render(wrap, role, data) {
+                wrap.replaceChildren();
                 const roleEl = document.createElement('div');
                 roleEl.className = 'role';
                 roleEl.textContent = role === 'user' ? 'You' : 'Assistant';
                 wrap.appendChild(roleEl);
- 
+
                 if (data && data.html) {
                   const div = document.createElement('div');
                   div.innerHTML = data.html;
@@ -254,107 +251,378 @@ async def index():
                   pre.textContent = data.text;
                   wrap.appendChild(pre);
                 }
-+                // Render structured products as a list (no image URLs)
-+                if (data && Array.isArray(data.products) && data.products.length) {
-+                  const list = document.createElement('div');
-+                  for (const p of data.products) {
-+                    const card = document.createElement('div');
-+                    card.style.border = '1px solid #eee';
-+                    card.style.borderRadius = '10px';
-+                    card.style.padding = '8px 10px';
-+                    card.style.marginTop = '8px';
-+                    const title = document.createElement('div');
-+                    const a = document.createElement('a');
-+                    a.href = p.product_url || '#'; a.target = '_blank'; a.rel = 'noopener noreferrer';
-+                    a.textContent = p.title || p.product_url || 'Product';
-+                    title.appendChild(a);
-+                    const meta = document.createElement('div');
-+                    meta.style.fontSize = '12px'; meta.style.color = '#555';
-+                    const parts = [];
-+                    if (p.item_number || p.sku) parts.push('Item: ' + (p.item_number || p.sku));
-+                    if (p.seller_or_brand) parts.push('Seller/Brand: ' + p.seller_or_brand);
-+                    if (p.price) parts.push('Price: ' + p.price);
-+                    if (p.rating) parts.push('Rating: ' + p.rating);
-+                    meta.textContent = parts.join(' • ');
-+                    const specs = document.createElement('ul');
-+                    if (Array.isArray(p.key_specs)) {
-+                      for (const s of p.key_specs) {
-+                        const li = document.createElement('li'); li.textContent = s; specs.appendChild(li);
-+                      }
-+                    }
-+                    card.appendChild(title);
-+                    card.appendChild(meta);
-+                    if (specs.childElementCount) card.appendChild(specs);
-+                    list.appendChild(card);
-+                  }
-+                  wrap.appendChild(list);
-+                }
-+                // Related links (non-image URLs)
-+                if (data && Array.isArray(data.page_urls) && data.page_urls.length) {
-+                  const ul = document.createElement('ul');
-+                  for (const u of data.page_urls) {
-+                    const li = document.createElement('li');
-+                    const a = document.createElement('a'); a.href = u; a.textContent = u; a.target = '_blank'; a.rel = 'noopener';
-+                    li.appendChild(a); ul.appendChild(li);
-+                  }
-+                  wrap.appendChild(ul);
-+                }
-                 chat.appendChild(wrap);
-                 window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });
-               }
- 
-               f.addEventListener('submit', async (e) => {
-                 e.preventDefault();
-                 const prompt = q.value.trim();
-                 if (!prompt) return;
-                 addMsg('user', { text: prompt });
-                 q.value = '';
-                 status.textContent = 'Working...';
-                 try {
-                   const resp = await fetch('/query', {
-                     method: 'POST',
-                     headers: { 'Content-Type': 'application/json' },
-                     body: JSON.stringify({ query: prompt })
-                   });
-                   const data = await resp.json();
-                   if (data && data.error) {
-                     status.textContent = 'Error: ' + data.error;
-                   } else {
-                     status.textContent = '';
-                     addMsg('assistant', data);
-                   }
-                 } catch (err) {
-                   status.textContent = 'Request failed';
-                 }
-               });
-             </script>
-           </body>
-         </html>
-         """
-     )
-
-from google.adk.runners import InMemoryRunner
+                // Render structured products as a list (no image URLs)
+                if (data && Array.isArray(data.products) && data.products.length) {
+                  const list = document.createElement('div');
+                  for (const p of data.products) {
+                    const card = document.createElement('div');
+                    card.style.border = '1px solid #eee';
+                    card.style.borderRadius = '10px';
+                    card.style.padding = '8px 10px';
+                    card.style.marginTop = '8px';
+                    const title = document.createElement('div');
+                    const a = document.createElement('a');
+                    a.href = p.product_url || '#'; a.target = '_blank'; a.rel = 'noopener noreferrer';
+                    a.textContent = p.title || p.product_url || 'Product';
+                    title.appendChild(a);
+                    const meta = document.createElement('div');
+                    meta.style.fontSize = '12px'; meta.style.color = '#555';
+                    const parts = [];
+                    if (p.item_number || p.sku) parts.push('Item: ' + (p.item_number || p.sku));
+                    if (p.seller_or_brand) parts.push('Seller/Brand: ' + p.seller_or_brand);
+                    if (p.price) parts.push('Price: ' + p.price);
+                    if (p.rating) parts.push('Rating: ' + p.rating);
+                    meta.textContent = parts.join(' • ');
+                    const specs = document.createElement('ul');
+                    if (Array.isArray(p.key_specs)) {
+                      for (const s of p.key_specs) {
+                        const li = document.createElement('li'); li.textContent = s; specs.appendChild(li);
+                      }
+                    }
+                    card.appendChild(title);
+                    card.appendChild(meta);
+                    if (specs.childElementCount) card.appendChild(specs);
+                    list.appendChild(card);
+                  }
+                  wrap.appendChild(list);
+                }
+                // Related links (non-image URLs)
+                if (data && Array.isArray(data.page_urls) && data.page_urls.length) {
+                  const ul = document.createElement('ul');
+                  for (const u of data.page_urls) {
+                    const li = document.createElement('li');
+                    const a = document.createElement('a'); a.href = u; a.textContent = u; a.target = '_blank'; a.rel = 'noopener';
+                    li.appendChild(a); ul.appendChild(li);
+                  }
+                  wrap.appendChild(ul);
+                }
+              }
+
+              // Streaming chat over a WebSocket bound to this tab's session; /query is the fallback
+              let ws = null;
+              let turn = null;  // { wrap, data } of the answer being streamed
+              let retryMs = 500;
+
+              function connect() {
+                const proto = location.protocol === 'https:' ? 'wss://' : 'ws://';
+                const sock = new WebSocket(proto + location.host + '/ws' + (sessionId ? '?session_id=' + encodeURIComponent(sessionId) : ''));
+                sock.onopen = () => { ws = sock; retryMs = 500; };
+                sock.onmessage = (e) => onFrame(JSON.parse(e.data));
+                sock.onclose = () => {
+                  if (ws === sock) ws = null;
+                  if (turn) { status.textContent = 'Connection lost'; turn = null; }
+                  setTimeout(connect, retryMs);
+                  retryMs = Math.min(retryMs * 2, 15000);
+                };
+              }
+
+              let pending = false;
+              function redraw() {
+                if (pending || !turn) return;
+                pending = true;
+                requestAnimationFrame(() => {
+                  pending = false;
+                  if (turn) render(turn.wrap, 'assistant', turn.data);
+                });
+              }
+
+              function onFrame(m) {
+                if (m.type === 'session') { remember(m.session_id); return; }
+                if (!turn) return;
+                const d = turn.data;
+                if (m.type === 'delta') {
+                  if (m.author !== turn.author) { turn.author = m.author; d.text = ''; }
+                  d.text += m.text;
+                  status.textContent = 'Working... (' + m.author + ')';
+                } else if (m.type === 'message') {
+                  turn.author = m.author; d.text = m.text;
+                } else if (m.type === 'products') {
+                  d.products.push(...m.products);
+                } else if (m.type === 'page_urls') {
+                  d.page_urls.push(...m.page_urls);
+                } else if (m.type === 'done') {
+                  turn.data = m; redraw(); turn = null;
+                  status.textContent = '';
+                  return;
+                } else if (m.type === 'error') {
+                  status.textContent = 'Error: ' + m.error;
+                  turn = null;
+                  return;
+                }
+                redraw();
+              }
+
+              async function viaHttp(prompt) {
+                try {
+                  const resp = await fetch('/query', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify(sessionId ? { query: prompt, session_id: sessionId } : { query: prompt })
+                  });
+                  const data = await resp.json();
+                  remember(data && data.session_id);
+                  if (!resp.ok || (data && data.error)) {
+                    status.textContent = 'Error: ' + ((data && (data.error || data.detail)) || resp.status);
+                  } else {
+                    status.textContent = '';
+                    addMsg('assistant', data);
+                  }
+                } catch (err) {
+                  status.textContent = 'Request failed';
+                }
+              }
+
+              f.addEventListener('submit', async (e) => {
+                e.preventDefault();
+                const prompt = q.value.trim();
+                if (!prompt || turn) return;
+                addMsg('user', { text: prompt });
+                q.value = '';
+                status.textContent = 'Working...';
+                if (ws && ws.readyState === WebSocket.OPEN) {
+                  const data = { text: '', products: [], page_urls: [] };
+                  turn = { wrap: addMsg('assistant', data), data, author: null };
+                  ws.send(JSON.stringify({ query: prompt }));
+                } else {
+                  await viaHttp(prompt);
+                }
+              });
+
+              if ('WebSocket' in window) connect();
+            </script>
+          </body>
+        </html>
+        """
+    )
+
+# One runner for the app; run_async keeps the event loop free while agents work
+metrics_plugin = MetricsPlugin(metrics)
+runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service, plugins=[metrics_plugin])
+# Cap concurrent agent runs (<= 0 means unlimited)
+MAX_CONCURRENCY = int(os.getenv("ECOMMERCE_MAX_CONCURRENCY", "8"))
+_run_slots = asyncio.Semaphore(MAX_CONCURRENCY) if MAX_CONCURRENCY > 0 else None
+
+# Turns on one session (HTTP or WebSocket) run in arrival order; other sessions never wait
+session_locks = SessionLocks()
+
+def _identify(user_id: Optional[str], session_id: Optional[str]) -> tuple[str, str]:
+    """Issue a session to callers without one; anonymous sessions get a user of their own."""
+    session_id = session_id or new_session_id()
+    return user_id or f"anon-{session_id}", session_id
+
+async def _ensure_session(user_id: str, session_id: str) -> None:
+    existing = await session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    if existing is None:
+        try:
+            await session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        except AlreadyExistsError:
+            pass  # created concurrently by another request or worker
+
+# Stop a run once its client disconnects or its deadline passes (<= 0 means no deadline)
+RUN_DEADLINE = float(os.getenv("ECOMMERCE_RUN_DEADLINE", "300"))
+run_cost = RunCost(metrics)
+
+def _deadline(timeout: Optional[float]) -> Optional[float]:
+    return min(timeout or RUN_DEADLINE, RUN_DEADLINE) if RUN_DEADLINE > 0 else timeout
+
+async def _run_agent(
+    user_id: str,
+    session_id: str,
+    user_msg: types.Content,
+    timer: ToolTimer,
+    progress: dict[str, Any],
+    on_event: Optional[Callable[[Event, EventAggregator], Awaitable[None]]] = None,
+    streaming: bool = False,
+) -> EventAggregator:
+    # Both loop iterations and both sub-agents feed one aggregate, so shop_agent's
+    # products survive research_agent answering last
+    aggregate = EventAggregator()
+    # SSE streaming mode makes the model yield partial text chunks as they arrive
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE) if streaming else None
+    await _ensure_session(user_id, session_id)
+    # The session lock comes first so a turn waiting on its own session holds no run slot
+    async with session_locks.hold((APP_NAME, user_id, session_id)):
+        if _run_slots is not None:
+            await _run_slots.acquire()
+        try:
+            progress["started"] = time.perf_counter()
+            # A cancelled run skips the plugin's after-run callback; the scope cleans up for it
+            with metrics_plugin.scope():
+                async for event in runner.run_async(
+                    user_id=user_id,
+                    session_id=session_id,
+                    new_message=user_msg,
+                    run_config=run_config,
+                ):
+                    for call in event.get_function_calls():
+                        timer.start(call.id, call.name)
+                    for resp in event.get_function_responses():
+                        timer.stop(resp.id, resp.name)
+                    aggregate.add(event)
+                    if event.author and event.author != "user" and not event.partial and event.content and event.content.role == "model":
+                        progress["llm_calls"] += 1
+                    if on_event is not None:
+                        await on_event(event, aggregate)
+        finally:
+            if _run_slots is not None:
+                _run_slots.release()
+    return aggregate
 
 @app.post("/query")
-async def query(body: QueryIn):
+async def query(body: QueryIn, request: Request):
     if root_agent is None:
         raise HTTPException(status_code=500, detail="Agent not loaded")
-    runner = InMemoryRunner(agent=root_agent, app_name="adk-ecommerce-web")
+    user_id, session_id = _identify(body.user_id, body.session_id)
     user_msg = types.Content(role="user", parts=[types.Part(text=body.query)])
-    last_model_event_content: Optional[types.Content] = None
+    deadline = _deadline(body.timeout)
+    timer = ToolTimer()
+    progress: dict[str, Any] = {"started": None, "llm_calls": 0}
+    run = asyncio.create_task(_run_agent(user_id, session_id, user_msg, timer, progress))
     try:
-        for event in runner.run(
-            user_id=body.user_id or "user-1",
-            session_id=body.session_id or "session-001",
-            new_message=user_msg,
-        ):
-            if getattr(event, "author", None) and event.author != "user":
-                last_model_event_content = getattr(event, "content", None)
+        aggregate = await wait_for_client(request, run, deadline)
+    except (ClientGone, asyncio.TimeoutError) as e:
+        # wait_for_client cancelled the run: the model call or tool in progress stops here
+        reason = "disconnect" if isinstance(e, ClientGone) else "deadline"
+        started = progress["started"]
+        run_cost.cancelled_run(
+            "ecommerce", reason, started is not None,
+            time.perf_counter() - started if started is not None else 0.0, progress["llm_calls"], timer.pending,
+        )
+        if reason == "disconnect":
+            return Response(status_code=499)
+        raise HTTPException(status_code=504, detail=f"No answer within {deadline:g}s")
     except Exception as e:
         logging.exception("Agent run failed")
         raise HTTPException(status_code=500, detail=str(e))
-    text, html, products, page_urls = _extract_text_and_html(last_model_event_content)
-    return {"text": text, "html": html, "products": products, "page_urls": page_urls}
+    run_cost.finished("ecommerce", time.perf_counter() - progress["started"], progress["llm_calls"])
+    result = aggregate.result()
+    logging.debug("Aggregated run: %s", aggregate.summary())
+    # Pre-rendered bytes skip FastAPI's jsonable_encoder pass over the large html/text
+    return FastJSONResponse(
+        {**{key: result[key] for key in ("text", "html", "products", "page_urls")}, "session_id": session_id},
+        headers={"X-Session-Id": session_id},
+    )
+
+_ws_open = 0
+metrics.gauge("ecommerce_ws_connections", "Open chat WebSocket connections.", [], lambda: {(): _ws_open})
+
+def _event_text(event: Event) -> str:
+    parts = event.content.parts if event.content and event.content.parts else []
+    return "".join(p.text for p in parts if p.text and not p.thought)
+
+async def _ws_turn(websocket: WebSocket, user_id: str, session_id: str, query: str, timeout: Optional[float], progress: dict[str, Any]) -> None:
+    timer = ToolTimer()
+    sent = {"products": 0, "page_urls": 0}
 
+    async def forward(event: Event, aggregate: EventAggregator) -> None:
+        if not event.author or event.author == "user":
+            return
+        text = _event_text(event)
+        if text:
+            kind = "delta" if event.partial else "message"
+            await websocket.send_text(dumps_str({"type": kind, "author": event.author, "text": text}))
+        if event.partial:
+            return
+        # Only the items this event added; the final "done" frame carries the merged lists
+        for key, seen in (("products", aggregate.products.values()), ("page_urls", aggregate.page_urls)):
+            if len(seen) > sent[key]:
+                new = list(seen)[sent[key]:]
+                sent[key] += len(new)
+                await websocket.send_text(dumps_str({"type": key, key: new}))
 
+    deadline = _deadline(timeout)
+    user_msg = types.Content(role="user", parts=[types.Part(text=query)])
+    try:
+        aggregate = await asyncio.wait_for(
+            _run_agent(user_id, session_id, user_msg, timer, progress, on_event=forward, streaming=True), deadline
+        )
+    except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+        reason = "deadline" if isinstance(e, asyncio.TimeoutError) else progress.get("cancel_reason") or "shutdown"
+        started = progress["started"]
+        run_cost.cancelled_run(
+            "ecommerce", reason, started is not None,
+            time.perf_counter() - started if started is not None else 0.0, progress["llm_calls"], timer.pending,
+        )
+        if reason == "deadline":
+            with suppress(Exception):
+                await websocket.send_text(dumps_str({"type": "error", "status": 504, "error": f"No answer within {deadline:g}s"}))
+            return
+        if reason == "cancel":
+            with suppress(Exception):
+                await websocket.send_text(dumps_str({"type": "error", "status": 499, "error": "Cancelled"}))
+        raise
+    except Exception as e:
+        logging.exception("Agent run failed")
+        with suppress(Exception):  # the socket may be the thing that failed
+            await websocket.send_text(dumps_str({"type": "error", "status": 500, "error": str(e)}))
+        return
+    run_cost.finished("ecommerce", time.perf_counter() - progress["started"], progress["llm_calls"])
+    result = aggregate.result()
+    await websocket.send_text(dumps_str({"type": "done", **{key: result[key] for key in ("text", "html", "products", "page_urls")}}))
+
+@app.websocket("/ws")
+async def chat_ws(websocket: WebSocket):
+    """Chat over one connection bound to one session, streaming each turn as it runs.
+
+    Client frames: ``{"query": ..., "timeout"?: seconds}`` starts a turn (one at a
+    time), ``{"type": "cancel"}`` stops it. Server frames: ``session`` once, then per
+    turn ``delta`` (partial text), ``message`` (a sub-agent's complete text),
+    ``products`` / ``page_urls`` (new items only), and ``done`` with the aggregated
+    answer or ``error``. Closing the socket cancels the turn in progress.
+    """
+    global _ws_open
+    # Reconnecting clients pass the session_id from their first "session" frame
+    user_id, session_id = _identify(websocket.query_params.get("user_id"), websocket.query_params.get("session_id"))
+    if not (valid_session_id(session_id) and valid_session_id(user_id)):
+        await websocket.close(code=1008, reason="invalid session_id or user_id")
+        return
+    await websocket.accept()
+    _ws_open += 1
+    turn: Optional[asyncio.Task] = None
+    progress: dict[str, Any] = {}
+    try:
+        await websocket.send_text(dumps_str({"type": "session", "session_id": session_id}))
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            text = frame.get("text")
+            if text is None:  # a binary frame
+                await websocket.send_text(dumps_str({"type": "error", "status": 400, "error": "Expected a text frame"}))
+                continue
+            try:
+                message = json.loads(text)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                await websocket.send_text(dumps_str({"type": "error", "status": 400, "error": "Expected a JSON object"}))
+                continue
+            if message.get("type") == "cancel":
+                if turn is not None and not turn.done():
+                    progress["cancel_reason"] = "cancel"
+                    turn.cancel()
+                continue
+            query, timeout = message.get("query"), message.get("timeout")
+            if not isinstance(query, str) or not query.strip():
+                await websocket.send_text(dumps_str({"type": "error", "status": 400, "error": "query is required"}))
+                continue
+            if turn is not None and not turn.done():
+                await websocket.send_text(dumps_str({"type": "error", "status": 409, "error": "A turn is already running"}))
+                continue
+            if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0:
+                timeout = None
+            progress = {"started": None, "llm_calls": 0}
+            turn = asyncio.create_task(_ws_turn(websocket, user_id, session_id, query, timeout, progress))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _ws_open -= 1
+        if turn is not None and not turn.done():
+            # Nobody is left to read the answer: stop the model call or tool in progress
+            progress["cancel_reason"] = "disconnect"
+            turn.cancel()
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    # Prometheus text format (same series as the root gateway's /metrics)
+    return PlainTextResponse(metrics.render(), media_type=metrics.content_type)
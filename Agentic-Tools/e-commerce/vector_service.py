@@ -1,13 +1,93 @@
 from __future__ import annotations
 
 import os
+import asyncio
 import json
-import requests
-from fastapi import FastAPI, HTTPException
+import logging
+import sys
+import time
+import unicodedata
+from contextlib import asynccontextmanager
+from pathlib import Path
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import Any, Optional
 
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(_REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(_REPO_ROOT))
+from gateway.cache import SWRCache
+from gateway.metrics import MetricsRegistry
+from gateway.search import engine_from_env
+from gateway.upstream import MicroBatcher, UpstreamError, upstream_from_env
+
+logger = logging.getLogger("adk_practice.web.vector")
+
+# One URL, or several equivalent replicas separated by commas
 UPSTREAM_VECTOR_URL = os.getenv("UPSTREAM_VECTOR_URL")
+# auto: proxy to UPSTREAM_VECTOR_URL when it is set, otherwise search in-process
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto").strip().lower()
+LOCAL = VECTOR_BACKEND == "local" or (VECTOR_BACKEND == "auto" and not UPSTREAM_VECTOR_URL)
+MAX_ROWS = 100
+# Cache key and invalidation name for requests without dataset_id (the local engine's default too)
+DEFAULT_DATASET = os.getenv("VECTOR_DEFAULT_DATASET", "default")
+
+ENGINE = None
+metrics = MetricsRegistry()
+UPSTREAM = upstream_from_env(UPSTREAM_VECTOR_URL, metrics) if UPSTREAM_VECTOR_URL and not LOCAL else None
+# /search/batch: max items per request and items in flight (a request may ask for less)
+BATCH_MAX_ITEMS = int(os.getenv("VECTOR_BATCH_MAX_ITEMS", "100"))
+BATCH_PARALLELISM = int(os.getenv("VECTOR_BATCH_PARALLELISM", "16"))
+# Result cache: fresh for VECTOR_CACHE_TTL, then served stale while one background refresh runs for
+# VECTOR_CACHE_SWR more seconds; while the upstream fails, answers up to VECTOR_STALE_SECONDS old are served
+CACHE_MAX_ENTRIES = int(os.getenv("VECTOR_CACHE_MAX_ENTRIES", "10000"))
+STALE_SECONDS = float(os.getenv("VECTOR_STALE_SECONDS", "3600"))
+# With the cache off (0 entries), this many last good answers are still kept for stale-if-error only
+STALE_MAX_ENTRIES = int(os.getenv("VECTOR_STALE_MAX_ENTRIES", "1000"))
+_cache_on = CACHE_MAX_ENTRIES > 0
+SEARCH_CACHE = SWRCache(
+    max_entries=CACHE_MAX_ENTRIES if _cache_on else STALE_MAX_ENTRIES,
+    # ttl=swr=0: every search goes upstream, the entry only answers while the upstream fails
+    ttl=float(os.getenv("VECTOR_CACHE_TTL", "60")) if _cache_on else 0.0,
+    swr=float(os.getenv("VECTOR_CACHE_SWR", "300")) if _cache_on else 0.0,
+    stale_if_error=STALE_SECONDS,
+    serve_stale=lambda e: isinstance(e, UpstreamError) and e.status >= 500,
+) if _cache_on or (STALE_SECONDS > 0 and STALE_MAX_ENTRIES > 0) else None
+if SEARCH_CACHE is None and not LOCAL:
+    logger.warning("Search cache and last-good fallback are off; upstream failures reach clients as errors")
+if SEARCH_CACHE is not None:
+    metrics.gauge(
+        "vector_search_cache_lookups", "Search cache lookups by outcome (cumulative).", ["state"],
+        lambda: {(state,): float(n) for state, n in SEARCH_CACHE.counts.items()},
+    )
+    metrics.gauge("vector_search_cache_entries", "Searches held in the result cache.", [], lambda: {(): float(len(SEARCH_CACHE._data))})
+X_CACHE = {"hit": "HIT", "miss": "MISS", "stale": "STALE", "stale_if_error": "STALE"}
+
+
+async def _send_batch(payloads: list[dict[str, Any]]) -> list[Any]:
+    """One POST <upstream>/batch {"requests": [...]} -> {"results": [...]}, answers in request order.
+
+    An answer shaped {"error": ..., "status": ...} fails only its own request.
+    """
+    data = await UPSTREAM.post_json({"requests": payloads}, "/batch")
+    answers = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(answers, list):
+        raise UpstreamError(502, "Upstream batch response has no results list")
+    return [
+        UpstreamError(int(a.get("status") or 502), a["error"]) if isinstance(a, dict) and "error" in a else a
+        for a in answers
+    ]
+
+
+# With VECTOR_UPSTREAM_BATCH=1 the upstream takes POST <url>/batch, and concurrent searches
+# (a /search/batch fan-out or parallel /search calls) are sent together
+BATCHER = MicroBatcher(
+    _send_batch,
+    max_items=int(os.getenv("VECTOR_UPSTREAM_BATCH_MAX", "32")),
+    linger=float(os.getenv("VECTOR_UPSTREAM_BATCH_LINGER_MS", "2")) / 1000,
+) if UPSTREAM is not None and os.getenv("VECTOR_UPSTREAM_BATCH", "0").lower() in ("1", "true", "yes") else None
 
 
 class SearchRequest(BaseModel):
@@ -23,39 +103,211 @@ class SearchRequest(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
 
 
-app = FastAPI(title="Vector Search Proxy")
+class SearchBatchItem(SearchRequest):
+    id: Optional[str] = None  # echoed back so clients can match results
 
 
-@app.post("/search")
-def search(req: SearchRequest):
-    if not UPSTREAM_VECTOR_URL:
-        raise HTTPException(status_code=500, detail="UPSTREAM_VECTOR_URL is not configured")
+class SearchBatchIn(BaseModel):
+    items: list[SearchBatchItem] = Field(min_length=1)
+    parallelism: Optional[int] = Field(default=None, ge=1)
+
+
+class DatasetIn(BaseModel):
+    documents: list[dict[str, Any]]
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    global ENGINE
+    if LOCAL:
+        # VECTOR_CATALOG_DIR catalogs are indexed before the first request is served
+        ENGINE = await run_in_threadpool(engine_from_env)
+    yield
+    if BATCHER is not None:
+        await BATCHER.close()
+    if SEARCH_CACHE is not None:
+        await SEARCH_CACHE.close()
+    if UPSTREAM is not None:
+        await UPSTREAM.close()
 
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "query": req.query,
-        "rows": req.rows,
+
+app = FastAPI(title="Vector Search Proxy", lifespan=lifespan)
+
+
+def canonical(req: SearchRequest) -> tuple[str, dict[str, Any]]:
+    """(dataset, upstream payload) with defaults filled in and the query whitespace/Unicode-normalized.
+
+    Requests that differ only in spelling-neutral ways share a payload, and so a cache entry.
+    """
+    return req.dataset_id or DEFAULT_DATASET, {
+        "query": " ".join(unicodedata.normalize("NFKC", req.query).split()),
+        "rows": req.rows if req.rows is not None else 10,
         "dataset_id": req.dataset_id,
-        "use-dense": req.use_dense,
-        "use-sparse": req.use_sparse,
-        "use_rerank": req.use_rerank,
-        "rrf_alpha": req.rrf_alpha,
+        "use-dense": req.use_dense is not False,
+        "use-sparse": req.use_sparse is not False,
+        "use_rerank": req.use_rerank is not False,
+        "rrf_alpha": round(0.5 if req.rrf_alpha is None else req.rrf_alpha, 4),
+    }
+
+
+def _local_search(payload: dict[str, Any]) -> dict[str, Any]:
+    if not (payload["use-dense"] or payload["use-sparse"]):
+        raise HTTPException(status_code=400, detail="Enable use-dense, use-sparse or both")
+    started = time.perf_counter()
+    try:
+        results = ENGINE.search(
+            payload["dataset_id"],
+            payload["query"],
+            rows=min(max(payload["rows"], 1), MAX_ROWS),
+            use_dense=payload["use-dense"],
+            use_sparse=payload["use-sparse"],
+            use_rerank=payload["use_rerank"],
+            rrf_alpha=payload["rrf_alpha"],
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {
+        "results": results,
+        "dataset_id": payload["dataset_id"] or ENGINE.default_dataset,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        "backend": "local",
     }
+
+
+async def _fetch(payload: dict[str, Any]) -> Any:
+    if LOCAL:
+        # CPU-bound; keep it off the event loop
+        return await run_in_threadpool(_local_search, payload)
+    if UPSTREAM is None:
+        raise HTTPException(status_code=500, detail="UPSTREAM_VECTOR_URL is not configured")
+    if BATCHER is not None:
+        return await BATCHER.submit(payload)
+    return await UPSTREAM.post_json(payload)
+
+
+def _require_local() -> None:
+    if not LOCAL:
+        raise HTTPException(status_code=409, detail="Datasets are managed upstream (VECTOR_BACKEND=upstream)")
+
+
+async def _search_one(req: SearchRequest) -> tuple[Any, str, float]:
+    """(result, cache state, age in seconds); raises HTTPException."""
+    dataset, payload = canonical(req)
     try:
-        r = requests.post(UPSTREAM_VECTOR_URL, headers=headers, data=json.dumps(payload), timeout=20)
-        r.raise_for_status()
-        return r.json()
-    except requests.Timeout:
-        raise HTTPException(status_code=504, detail="Upstream vector search timeout")
-    except requests.HTTPError as e:
-        detail = None
+        if SEARCH_CACHE is None:
+            return await _fetch(payload), "miss", 0.0
+        key = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return await SEARCH_CACHE.get_or_fetch(key, dataset, lambda: _fetch(payload))
+    except UpstreamError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+
+
+@app.post("/search")
+async def search(req: SearchRequest, response: Response):
+    data, state, age = await _search_one(req)
+    response.headers["X-Cache"] = X_CACHE[state]
+    if state != "miss":
+        response.headers["Age"] = str(int(age))
+    return data
+
+
+@app.post("/search/batch")
+async def search_batch(body: SearchBatchIn):
+    """Run many searches in one request; results come back in item order.
+
+    Each record has index, id, status ("ok" | "error") and either result
+    plus cache (HIT/MISS/STALE) or code/error, so one bad item does not fail
+    the others. Items share the /search cache and run concurrently, with at
+    most ``parallelism`` in flight (capped by VECTOR_BATCH_PARALLELISM).
+    With VECTOR_UPSTREAM_BATCH=1 the cache misses go upstream as batch calls,
+    so each of those carries at most ``parallelism`` of this request's items.
+    """
+    if len(body.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    started = time.perf_counter()
+    slots = asyncio.Semaphore(min(body.parallelism or BATCH_PARALLELISM, BATCH_PARALLELISM))
+
+    async def one(index: int, item: SearchBatchItem) -> dict[str, Any]:
+        record: dict[str, Any] = {"index": index, "id": item.id}
         try:
-            detail = r.json()
-        except Exception:
-            detail = r.text if 'r' in locals() else str(e)
-        raise HTTPException(status_code=r.status_code if 'r' in locals() else 502, detail=detail)
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+            async with slots:
+                data, state, _ = await _search_one(item)
+            record.update(status="ok", cache=X_CACHE[state], result=data)
+        except HTTPException as e:
+            record.update(status="error", code=e.status_code, error=e.detail)
+        except Exception as e:
+            logger.exception("Batch search item %s failed", index)
+            record.update(status="error", code=500, error=str(e))
+        return record
+
+    records = await asyncio.gather(*(one(i, item) for i, item in enumerate(body.items)))
+    ok = sum(r["status"] == "ok" for r in records)
+    return {
+        "results": records,
+        "items": len(records),
+        "ok": ok,
+        "errors": len(records) - ok,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _invalidate(dataset_id: Optional[str]) -> int:
+    return SEARCH_CACHE.invalidate(dataset_id) if SEARCH_CACHE is not None else 0
+
+
+@app.get("/datasets")
+def datasets():
+    _require_local()
+    return ENGINE.stats()
+
+
+@app.put("/datasets/{dataset_id}")
+async def put_dataset(dataset_id: str, body: DatasetIn):
+    """Index (or replace) a catalog in the product JSON shape the agents emit."""
+    _require_local()
+    index = await run_in_threadpool(ENGINE.load, dataset_id, body.documents)
+    return {
+        "dataset_id": dataset_id,
+        "documents": len(index),
+        "build_ms": round(index.build_seconds * 1000, 1),
+        "cache_invalidated": _invalidate(dataset_id),
+    }
+
+
+@app.delete("/datasets/{dataset_id}")
+async def delete_dataset(dataset_id: str):
+    _require_local()
+    if not ENGINE.drop(dataset_id):
+        raise HTTPException(status_code=404, detail=f"Unknown dataset {dataset_id!r}")
+    return {"dataset_id": dataset_id, "deleted": True, "cache_invalidated": _invalidate(dataset_id)}
+
+
+@app.post("/datasets/{dataset_id}/invalidate")
+async def invalidate_dataset(dataset_id: str):
+    """Forget cached searches for one dataset, e.g. after the upstream catalog changed."""
+    return {"dataset_id": dataset_id, "invalidated": _invalidate(dataset_id)}
+
+
+@app.delete("/cache")
+async def clear_cache():
+    return {"invalidated": _invalidate(None)}
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "backend": "local" if LOCAL else "upstream",
+        "upstreams": UPSTREAM.stats() if UPSTREAM is not None else {},
+        "cache": SEARCH_CACHE.stats() if SEARCH_CACHE is not None else None,
+        "upstream_batches": BATCHER.stats() if BATCHER is not None else None,
+        "search": ENGINE.stats() if ENGINE is not None else None,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    # Prometheus text format: per-upstream attempts, latency, retries and circuit state
+    return PlainTextResponse(metrics.render(), media_type=metrics.content_type)
 
 
 if __name__ == "__main__":
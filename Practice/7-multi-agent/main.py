@@ -3,6 +3,7 @@ from __future__ import annotations
 import asyncio
 import sys
 import uuid
+from pathlib import Path
 from typing import Optional
 
 # Suppress noisy Pydantic shadow warnings
@@ -27,6 +28,15 @@ try:
     from google.adk.sessions import InMemorySessionService  # type: ignore
     from google.genai import types  # type: ignore
     _ADK_AVAILABLE = True
+
+    # Prefer the repo's bounded in-memory store (idle TTL, memory budget, event cap)
+    _REPO_ROOT = Path(__file__).resolve().parents[2]
+    if str(_REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(_REPO_ROOT))
+    try:
+        from gateway.sessions import BoundedSessionService as InMemorySessionService  # type: ignore  # noqa: F811
+    except ImportError:
+        pass
 except Exception:  # pragma: no cover
     _ADK_AVAILABLE = False
 
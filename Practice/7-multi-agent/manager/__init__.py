@@ -7,6 +7,11 @@ try:
     from google.adk.sessions import InMemorySessionService  # type: ignore
     from google.adk.runners import Runner  # type: ignore
 
+    try:  # bounded variant (idle TTL, memory budget, event cap) when the repo's gateway is importable
+        from gateway.sessions import BoundedSessionService as InMemorySessionService  # type: ignore  # noqa: F811
+    except ImportError:
+        pass
+
     APP_NAME = "manager"
 
     def get_runner(user_id: str = "user-1", session_id: str = "session-001"):
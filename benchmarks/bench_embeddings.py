@@ -0,0 +1,180 @@
+"""Embedding store (gateway/embeddings.py): memory, disk and recall per quantization level.
+
+The script generates ``--rows`` clustered unit vectors of ``--dim``
+dimensions, then ``--queries`` queries near them. The exact float32 top-10
+for each query is the ground truth. For each dtype (float32, float16, int8)
+it writes an EmbeddingStore in ``--segments`` appends and reports:
+
+- build time and bytes on disk
+- recall@10 against the exact top-10, and p50 query latency (brute force)
+- memory per worker: ``--workers`` processes open the store at the same
+  time and score every query, like uvicorn workers would. RSS, PSS
+  (shared pages split between the processes that map them) and private
+  anonymous memory come from /proc/self/smaps_rollup (Linux only), as the
+  growth over each worker's own baseline.
+
+The "ram" row is the old layout: every worker holds its own float32 copy.
+
+Run from the repo root:
+    py benchmarks/bench_embeddings.py
+    py benchmarks/bench_embeddings.py --rows 1000000 --dim 256 --workers 8
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from gateway.embeddings import DTYPES, EmbeddingStore  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def clustered(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def smaps() -> dict[str, int]:
+    """Rss / Pss / Anonymous of this process, in bytes."""
+    out = {}
+    for line in Path("/proc/self/smaps_rollup").read_text().splitlines()[1:]:
+        name, value = line.split(":", 1)
+        out[name] = int(value.split()[0]) * 1024
+    return {"rss": out["Rss"], "pss": out["Pss"], "anon": out["Anonymous"]}
+
+
+def worker(root: str, mode: str, queries: np.ndarray, barrier: Any, results: Any) -> None:
+    before = smaps()
+    store = EmbeddingStore(root)
+    if mode == "ram":
+        matrix = np.concatenate([np.asarray(s.vectors, dtype=np.float32) for s in store.segments])
+        for q in queries:
+            matrix @ q
+    else:
+        for q in queries:
+            store.scores(q)
+    barrier.wait()  # every worker has its data mapped before anyone measures
+    after = smaps()
+    results.put({key: after[key] - before[key] for key in after})
+    barrier.wait()
+
+
+def memory(root: Path, mode: str, queries: np.ndarray, workers: int) -> dict[str, float]:
+    ctx = mp.get_context("spawn")
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(str(root), mode, queries, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    deltas = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return {f"{key}_mb_per_worker": statistics.fmean(d[key] for d in deltas) / MB for key in deltas[0]}
+
+
+def run(args: argparse.Namespace, workdir: Path) -> list[dict[str, Any]]:
+    vectors = clustered(args.rows, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, args.rows, args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    truth = exact_top(vectors, queries, 10)
+    ids = [str(i) for i in range(args.rows)]
+    step = -(-args.rows // args.segments)
+
+    rows = []
+    for dtype in args.dtypes:
+        root = workdir / dtype
+        started = time.perf_counter()
+        store = EmbeddingStore.create(root, args.dim, dtype)
+        for start in range(0, args.rows, step):
+            store.append(ids[start:start + step], vectors[start:start + step])
+        build = time.perf_counter() - started
+
+        latencies, recalls = [], []
+        for q, want in zip(queries, truth):
+            t = time.perf_counter()
+            found = store.search(q, 10)
+            latencies.append(time.perf_counter() - t)
+            recalls.append(len({int(i) for i, _ in found} & set(want.tolist())) / 10)
+        row = {
+            "layout": dtype,
+            "build_s": build,
+            "disk_mb": store.disk_bytes() / MB,
+            "recall_at_10": statistics.fmean(recalls),
+            "latency_ms_p50": statistics.median(latencies) * 1000,
+        }
+        if args.workers:
+            row.update(memory(root, "mmap", queries, args.workers))
+        rows.append(row)
+        if dtype == "float32":
+            latencies = []
+            for q in queries:
+                t = time.perf_counter()
+                scores = vectors @ q
+                top = np.argpartition(-scores, 9)[:10]
+                top[np.argsort(-scores[top])]
+                latencies.append(time.perf_counter() - t)
+            rows.append({"layout": "ram (float32)", "build_s": None, "disk_mb": None, "recall_at_10": 1.0,
+                         "latency_ms_p50": statistics.median(latencies) * 1000,
+                         **(memory(root, "ram", queries, args.workers) if args.workers else {})})
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--dim", type=int, default=128)
+    ap.add_argument("--clusters", type=int, default=512)
+    ap.add_argument("--segments", type=int, default=4, help="appends that write the store")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--workers", type=int, default=4, help="processes sharing the store; 0 skips the memory runs")
+    ap.add_argument("--dtypes", nargs="+", choices=sorted(DTYPES), default=["float32", "float16", "int8"])
+    ap.add_argument("--dir", help="where to write the stores (default: a temporary directory)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", help="write results here")
+    args = ap.parse_args()
+
+    workdir = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="bench_embeddings-"))
+    try:
+        rows = run(args, workdir)
+    finally:
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def cell(value: Any, fmt: str) -> str:
+        return format(value, fmt) if value is not None else format("-", f">{fmt.split('.')[0]}")
+
+    print(f"{args.rows} x {args.dim} vectors in {args.segments} segments, {args.queries} queries, {args.workers} workers")
+    print(f"{'layout':<15}{'build s':>8}{'disk MB':>9}{'recall@10':>11}{'p50 ms':>8}"
+          f"{'RSS MB/w':>10}{'PSS MB/w':>10}{'anon MB/w':>11}")
+    for r in rows:
+        print(f"{r['layout']:<15}{cell(r['build_s'], '8.2f')}{cell(r['disk_mb'], '9.1f')}{r['recall_at_10']:>11.3f}"
+              f"{cell(r['latency_ms_p50'], '8.2f')}{cell(r.get('rss_mb_per_worker'), '10.1f')}"
+              f"{cell(r.get('pss_mb_per_worker'), '10.1f')}{cell(r.get('anon_mb_per_worker'), '11.1f')}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "results": rows}, indent=2))
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Orchestration overhead of each agent tree, with a deterministic scripted model.
+
+Every LlmAgent in a tree gets its own ScriptedLlm. It answers instantly (or
+after --model-latency-ms) and walks the topology the way the prompts ask
+the real model to:
+
+- LLM orchestrators (agents with sub_agents and ``transfer_to_agent``) hand
+  off to their children. "all" visits every child in order, and each child
+  transfers back to its parent (brand-SEO root, comparison/critic). "one"
+  delegates to the first child, which answers (Practice/7 manager).
+- Leaves answer with a fixed-size text; output_key agents write it to state.
+- Workflow agents (LoopAgent) run as configured, e.g. max_iterations.
+
+Real tools (Selenium, google_search) are never called. Built-in tools are only
+declared, so this measures the framework, not the tools. ADK's own transfer
+rules still apply. For example, an agent with google_search on a model that
+cannot mix built-in tools with function calling gets no transfer_to_agent,
+so the turn ends there. The "ends at" column shows where each run stops.
+
+Per run it reports:
+- LLM calls issued
+- events produced
+- bytes written to state (state_delta) and to session events
+- wall time minus time spent inside the model, i.e. ADK's own overhead
+
+Run from the repo root:
+    py benchmarks/bench_orchestration.py --runs 30
+    py benchmarks/bench_orchestration.py --trees brand-seo,manager --model-latency-ms 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Any, AsyncGenerator, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# Keep tool gates closed and telemetry quiet; nothing here should reach the network
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ["GOOGLE_CSE_ID"] = ""
+os.environ["GOOGLE_SEARCH_API_KEY"] = ""
+
+from google.adk.agents import BaseAgent, LlmAgent  # noqa: E402
+from google.adk.models.base_llm import BaseLlm  # noqa: E402
+from google.adk.models.llm_request import LlmRequest  # noqa: E402
+from google.adk.models.llm_response import LlmResponse  # noqa: E402
+from google.adk.runners import Runner  # noqa: E402
+from google.adk.sessions import InMemorySessionService  # noqa: E402
+from google.genai import types  # noqa: E402
+from pydantic import PrivateAttr  # noqa: E402
+
+from gateway.agents import load_module  # noqa: E402
+
+# tree name -> (loader, delegation policy for LLM orchestrators)
+TREES: dict[str, tuple[str, str]] = {
+    "ecommerce": ("Agentic-Tools/e-commerce/agent.py", "all"),
+    "youtube-shorts": ("Agentic-Tools/youtube_shorts/__init__.py:agent", "all"),
+    "brand-seo": ("brand-SEO/agent.py", "all"),
+    "manager": ("Practice/7-multi-agent/manager/__init__.py", "one"),
+}
+
+
+class Script:
+    """Shared per-run bookkeeping for every ScriptedLlm in a tree."""
+
+    def __init__(self, latency: float, reply_chars: int):
+        self.latency = latency
+        self.reply_chars = reply_chars
+        self.reset()
+
+    def reset(self) -> None:
+        self.visited: dict[str, list[str]] = {}
+        self.llm_calls = 0
+        self.model_seconds = 0.0
+
+
+class ScriptedLlm(BaseLlm):
+    """Deterministic stand-in for one agent's model."""
+
+    agent_name: str = ""
+    children: list[str] = []
+    parent: Optional[str] = None  # LlmAgent parent this agent reports back to
+    policy: str = "all"
+    _script: Script = PrivateAttr()
+
+    def bind(self, script: Script) -> "ScriptedLlm":
+        self._script = script
+        return self
+
+    @staticmethod
+    def _transfer(target: str) -> types.Part:
+        return types.Part(function_call=types.FunctionCall(name="transfer_to_agent", args={"agent_name": target}))
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        script = self._script
+        started = time.perf_counter()
+        if script.latency:
+            await asyncio.sleep(script.latency)
+        script.llm_calls += 1
+        can_transfer = "transfer_to_agent" in llm_request.tools_dict
+
+        parts: list[types.Part] = []
+        visited = script.visited.setdefault(self.agent_name, [])
+        pending = [c for c in self.children if c not in visited] if can_transfer else []
+        if self.policy == "one" and visited:
+            pending = []
+        if pending:
+            visited.append(pending[0])
+            parts.append(self._transfer(pending[0]))
+        else:
+            body = f"{self.agent_name}: " + "lorem ipsum " * (script.reply_chars // 12)
+            parts.append(types.Part(text=body[: script.reply_chars]))
+            if self.parent and can_transfer:
+                parts.append(self._transfer(self.parent))
+        response = LlmResponse(
+            content=types.Content(role="model", parts=parts),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=10, candidates_token_count=10, total_token_count=20
+            ),
+        )
+        script.model_seconds += time.perf_counter() - started
+        yield response
+
+
+def load_tree(name: str) -> BaseAgent:
+    spec, _ = TREES[name]
+    path, _, submodule = spec.partition(":")
+    mod = load_module(ROOT / path, f"bench_{name.replace('-', '_')}")
+    if submodule:
+        mod = importlib.import_module(f"{mod.__name__}.{submodule}")
+    root = getattr(mod, "root_agent", None)
+    if root is None:
+        raise RuntimeError(f"{path} has no root_agent")
+    return root
+
+
+def script_tree(root: BaseAgent, script: Script, policy: str) -> int:
+    """Swap every LlmAgent's model for a ScriptedLlm; returns how many were swapped."""
+    swapped = 0
+
+    def walk(agent: BaseAgent, parent: Optional[BaseAgent]) -> None:
+        nonlocal swapped
+        if isinstance(agent, LlmAgent):
+            # Keep the original model name so built-in tools (google_search) still accept it
+            name = agent.model if isinstance(agent.model, str) and agent.model else "gemini-2.0-flash"
+            reports_back = isinstance(parent, LlmAgent) and policy == "all" and not agent.disallow_transfer_to_parent
+            agent.model = ScriptedLlm(
+                model=name,
+                agent_name=agent.name,
+                children=[c.name for c in agent.sub_agents],
+                parent=parent.name if reports_back else None,
+                policy=policy,
+            ).bind(script)
+            swapped += 1
+        for child in agent.sub_agents:
+            walk(child, agent)
+
+    walk(root, None)
+    return swapped
+
+
+async def run_tree(name: str, runs: int, warmup: int, latency: float, reply_chars: int) -> dict[str, Any]:
+    root = load_tree(name)
+    script = Script(latency, reply_chars)
+    llm_agents = script_tree(root, script, TREES[name][1])
+    sessions = InMemorySessionService()
+    runner = Runner(agent=root, app_name=f"bench-{name}", session_service=sessions)
+
+    samples: list[dict[str, float]] = []
+    for i in range(warmup + runs):
+        script.reset()
+        session = await sessions.create_session(app_name=runner.app_name, user_id="bench", session_id=f"s{i}")
+        message = types.Content(role="user", parts=[types.Part(text=f"benchmark request {i}")])
+        events = state_bytes = event_bytes = 0
+        authors: set[str] = set()
+        last_author = ""
+        started = time.perf_counter()
+        async for event in runner.run_async(user_id="bench", session_id=session.id, new_message=message):
+            if event.partial:
+                continue
+            events += 1
+            authors.add(event.author)
+            last_author = event.author
+            event_bytes += len(event.model_dump_json(exclude_none=True))
+            if event.actions and event.actions.state_delta:
+                state_bytes += len(json.dumps(event.actions.state_delta, default=str))
+        wall = time.perf_counter() - started
+        final = await sessions.get_session(app_name=runner.app_name, user_id="bench", session_id=session.id)
+        if i < warmup:
+            continue
+        samples.append({
+            "llm_calls": script.llm_calls,
+            "events": events,
+            "agents": len(authors),
+            "last_author": last_author,
+            "state_bytes": state_bytes,
+            "event_bytes": event_bytes,
+            "final_state_bytes": len(json.dumps(final.state, default=str)) if final else 0,
+            "wall_ms": wall * 1000,
+            "overhead_ms": (wall - script.model_seconds) * 1000,
+        })
+
+    overhead = sorted(s["overhead_ms"] for s in samples)
+    first = samples[0]
+    return {
+        "tree": name,
+        "llm_agents": llm_agents,
+        "llm_calls": first["llm_calls"],
+        "events": first["events"],
+        "agents_seen": first["agents"],
+        "ends_at": first["last_author"],
+        "state_bytes": first["state_bytes"],
+        "event_bytes": first["event_bytes"],
+        "final_state_bytes": first["final_state_bytes"],
+        "wall_ms_p50": statistics.median(s["wall_ms"] for s in samples),
+        "overhead_ms_p50": statistics.median(overhead),
+        "overhead_ms_p95": overhead[min(len(overhead) - 1, int(0.95 * len(overhead)))],
+        "overhead_ms_per_llm_call": statistics.median(overhead) / max(first["llm_calls"], 1),
+        "deterministic": all(s["llm_calls"] == first["llm_calls"] and s["events"] == first["events"] for s in samples),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--trees", default=",".join(TREES), help="comma-separated: " + ", ".join(TREES))
+    ap.add_argument("--runs", type=int, default=30)
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--model-latency-ms", type=float, default=0.0, help="simulated model latency (excluded from overhead)")
+    ap.add_argument("--reply-chars", type=int, default=600, help="size of each scripted answer")
+    ap.add_argument("--json", help="write results here")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    warnings.filterwarnings("ignore")
+    names = [t.strip() for t in args.trees.split(",") if t.strip()]
+    unknown = [t for t in names if t not in TREES]
+    if unknown:
+        ap.error(f"unknown tree(s): {', '.join(unknown)}")
+
+    rows = []
+    for name in names:
+        rows.append(asyncio.run(run_tree(name, args.runs, args.warmup, args.model_latency_ms / 1000, args.reply_chars)))
+        logging.getLogger().setLevel(logging.WARNING)  # agent modules call basicConfig(INFO) on import
+
+    print(f"{'tree':<16}{'llm agents':>11}{'llm calls':>10}{'events':>8}{'state B':>9}{'event B':>9}"
+          f"{'overhead p50 ms':>17}{'p95 ms':>9}{'ms/llm call':>13}  ends at")
+    for r in rows:
+        print(f"{r['tree']:<16}{r['llm_agents']:>11}{r['llm_calls']:>10}{r['events']:>8}{r['state_bytes']:>9}{r['event_bytes']:>9}"
+              f"{r['overhead_ms_p50']:>17.2f}{r['overhead_ms_p95']:>9.2f}{r['overhead_ms_per_llm_call']:>13.2f}  {r['ends_at']}"
+              + ("" if r["deterministic"] else "   (non-deterministic!)"))
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "results": rows}, indent=2))
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Bytes on the wire and serialization time for /query responses.
+
+Builds /query-shaped payloads (text, html, images, products, page_urls) at a
+few sizes. The text comes from the fake Gemini used by the load test, so it
+looks like model output. For each size it compares:
+
+- serialization: the default FastAPI path (``jsonable_encoder`` then
+  ``json.dumps``) against ``gateway.serialization.dumps`` (orjson if
+  installed, else pydantic-core);
+- encodings: identity, gzip 1/6/9 and brotli 5/11 (when installed), giving
+  the size, the compression time and the transfer time at --mbps.
+
+``--http`` also sends the large payload through the real CompressionMiddleware
+and FastJSONResponse in an ASGI app, to check what a client actually receives.
+
+Run from the repo root:
+    py benchmarks/bench_payloads.py --mbps 10
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from fake_backends import FakeGemini  # noqa: E402
+from gateway.compression import CompressionMiddleware, brotli  # noqa: E402
+from gateway.serialization import JSON_BACKEND, FastJSONResponse, dumps  # noqa: E402
+
+SIZES = {"small": 1, "medium": 12, "large": 80}  # model replies concatenated per payload
+
+
+def make_payload(replies: int) -> dict[str, Any]:
+    model = FakeGemini(image_base="https://images.example.com", images=8)
+    text = "\n\n".join(model._reply(f"compare trail running shoes under $150, part {i}", "gemini") for i in range(replies))
+    html = "".join(
+        f'<div class="card"><h3>Result {i}</h3><p>{text[i * 97:(i + 1) * 97]}</p>'
+        f'<a href="https://shop.example.com/p/{i}">View product</a></div>\n'
+        for i in range(replies * 10)
+    )
+    return {
+        "text": text,
+        "html": html,
+        "images": [f"https://images.example.com/img/{i}.jpg" for i in range(replies * 4)],
+        "products": [
+            {"item_number": f"SKU-{i:05d}", "title": f"Trail shoe model {i}", "product_url": f"https://shop.example.com/p/{i}",
+             "seller_or_brand": "Example", "price": f"${80 + i % 70}.99", "key_specs": ["grip", "drop 6mm", "290 g"]}
+            for i in range(replies * 3)
+        ],
+        "page_urls": [f"https://reviews.example.com/article/{i}" for i in range(replies * 2)],
+    }
+
+
+def default_path(data: Any) -> bytes:
+    """What FastAPI does with a returned dict: jsonable_encoder, then JSONResponse.render."""
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    """Median milliseconds over ``repeat`` calls, plus the last result."""
+    samples, out = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), out
+
+
+def encoders() -> list[tuple[str, Callable[[bytes], bytes]]]:
+    out: list[tuple[str, Callable[[bytes], bytes]]] = [("identity", lambda b: b)]
+    for level in (1, 6, 9):
+        out.append((f"gzip-{level}", lambda b, level=level: zlib.compress(b, level, wbits=31)))
+    if brotli is not None:
+        for quality in (5, 11):
+            out.append((f"br-{quality}", lambda b, quality=quality: brotli.compress(b, quality=quality)))
+    return out
+
+
+async def through_app(payload: dict[str, Any]) -> list[tuple[str, str, int]]:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/payload")
+    async def get_payload():
+        return FastJSONResponse(payload)
+
+    rows = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for accept in ("identity", "gzip", "br, gzip"):
+            async with client.stream("GET", "/payload", headers={"Accept-Encoding": accept}) as r:
+                wire = b"".join([chunk async for chunk in r.aiter_raw()])
+                body = json.loads(_decode(wire, r.headers.get("content-encoding")))
+            rows.append((accept, r.headers.get("content-encoding") or "identity", len(wire)))
+            assert body == payload, "round trip changed the payload"
+    return rows
+
+
+def _decode(wire: bytes, encoding: str | None) -> bytes:
+    if encoding == "gzip":
+        return zlib.decompress(wire, wbits=31)
+    if encoding == "br":
+        return brotli.decompress(wire)
+    return wire
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--mbps", type=float, default=10.0, help="client bandwidth for the transfer estimate")
+    ap.add_argument("--http", action="store_true", help="also send the large payload through the ASGI middleware")
+    args = ap.parse_args()
+
+    print(f"JSON backend: {JSON_BACKEND}; brotli: {'yes' if brotli is not None else 'not installed'}\n")
+    print(f"{'payload':<8}{'default ms':>12}{'fast ms':>10}{'speedup':>9}")
+    bodies: dict[str, bytes] = {}
+    payloads: dict[str, dict[str, Any]] = {}
+    for name, replies in SIZES.items():
+        payload = payloads[name] = make_payload(replies)
+        slow_ms, slow = timed(lambda: default_path(payload), args.repeat)
+        fast_ms, fast = timed(lambda: dumps(payload), args.repeat)
+        assert json.loads(slow) == json.loads(fast), "serializers disagree"
+        bodies[name] = fast
+        print(f"{name:<8}{slow_ms:>12.3f}{fast_ms:>10.3f}{slow_ms / fast_ms:>8.1f}x")
+
+    print(f"\n{'payload':<8}{'encoding':<10}{'bytes':>10}{'ratio':>8}{'encode ms':>11}{'transfer ms':>13}{'total ms':>10}")
+    for name, body in bodies.items():
+        for enc_name, encode in encoders():
+            enc_ms, out = timed(lambda: encode(body), max(5, args.repeat // 5))
+            transfer_ms = len(out) * 8 / (args.mbps * 1e6) * 1000
+            print(f"{name:<8}{enc_name:<10}{len(out):>10}{len(out) / len(body):>8.2f}{enc_ms:>11.3f}"
+                  f"{transfer_ms:>13.2f}{enc_ms + transfer_ms:>10.2f}")
+        print()
+
+    if args.http:
+        print("Through CompressionMiddleware + FastJSONResponse (large payload):")
+        for accept, encoding, size in asyncio.run(through_app(payloads["large"])):
+            print(f"  Accept-Encoding: {accept:<10} -> {encoding:<9}{size:>10} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Local hybrid product search (gateway/search.py): latency and retrieval quality.
+
+It builds a synthetic catalog of ``--docs`` products: brand, series, model code,
+feature, category and colour, with SKUs and spec lists. Then it asks labelled
+queries, each with one known target product:
+
+- model: brand + model code ("Sonex QX-41 headphones")
+- typo: the title with one typo per word, and a word dropped
+- sku: the item number on its own
+
+Modes: sparse (BM25), dense (char n-gram LSA), hybrid (RRF of both) and
+hybrid+rerank. For each it reports hit@10, MRR and p50/p95 latency, plus the
+build time and index size.
+
+Run from the repo root:
+    py benchmarks/bench_search.py
+    py benchmarks/bench_search.py --docs 100000 --queries 300
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from gateway.search import HybridIndex  # noqa: E402
+
+BRANDS = ["Sonex", "Aurelia", "Kinetic", "Norvik", "Pulsar", "Veltro", "Castell", "Orbis", "Lumina", "Tessar",
+          "Harmon", "Zephyr", "Quanta", "Marlow", "Ridgeway", "Solace", "Vantage", "Eclipse", "Nimbus", "Arcadia"]
+SERIES = ["Pro", "Air", "Max", "Lite", "Ultra", "Studio", "Go", "Edge", "Core", "Flex", "Prime", "One"]
+CATEGORIES = {
+    "headphones": ["wireless", "noise cancelling", "over-ear", "bluetooth", "foldable"],
+    "earbuds": ["true wireless", "waterproof", "noise cancelling", "sport", "hybrid ANC"],
+    "laptop": ["14-inch", "OLED", "lightweight", "gaming", "2-in-1"],
+    "mouse": ["ergonomic", "wireless", "silent", "gaming", "vertical"],
+    "keyboard": ["mechanical", "low-profile", "wireless", "backlit", "compact"],
+    "monitor": ["4K", "curved", "144Hz", "USB-C", "IPS"],
+    "camera": ["mirrorless", "full-frame", "4K video", "compact", "action"],
+    "speaker": ["portable", "smart", "waterproof", "bookshelf", "party"],
+    "smartwatch": ["GPS", "AMOLED", "fitness", "LTE", "solar"],
+    "router": ["Wi-Fi 6", "mesh", "tri-band", "gaming", "travel"],
+}
+COLORS = ["black", "white", "silver", "navy", "graphite", "sage", "rose", "midnight"]
+
+
+def synthetic_catalog(n: int, seed: int = 7) -> list[dict[str, Any]]:
+    """Deterministic fake product catalog in the agents' product JSON shape."""
+    rnd = random.Random(seed)
+    docs = []
+    for i in range(n):
+        brand = rnd.choice(BRANDS)
+        category = rnd.choice(list(CATEGORIES))
+        feature = rnd.choice(CATEGORIES[category])
+        model = f"{rnd.choice('ABCDEFGHJKLMNPQRSTVWXZ')}{rnd.choice('ABCDEFGHJKLMNPQRSTVWXZ')}-{rnd.randint(10, 999)}"
+        docs.append({
+            "item_number": f"SKU-{i:07d}",
+            "title": f"{brand} {rnd.choice(SERIES)} {model} {feature} {category} ({rnd.choice(COLORS)})",
+            "seller_or_brand": brand,
+            "category": category,
+            "price": f"${rnd.randint(19, 2499)}.99",
+            "key_specs": rnd.sample(CATEGORIES[category], 2),
+            "product_url": f"https://shop.example.com/p/{i}",
+        })
+    return docs
+
+
+def _typo(word: str, rnd: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rnd.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:] if rnd.random() < 0.5 else word[:i] + word[i + 1:]
+
+
+def labelled_queries(docs: list[dict[str, Any]], n: int, seed: int = 11) -> list[tuple[str, str, str]]:
+    """(kind, query, target item_number) triples."""
+    rnd = random.Random(seed)
+    out = []
+    for doc in rnd.sample(docs, min(n, len(docs))):
+        words = doc["title"].replace("(", "").replace(")", "").split()
+        kind = rnd.choice(["model", "typo", "sku"])
+        if kind == "model":
+            query = f"{doc['seller_or_brand']} {words[2]} {doc['category']}"
+        elif kind == "typo":
+            kept = [w for i, w in enumerate(words) if i != rnd.randrange(len(words))]
+            query = " ".join(_typo(w, rnd) for w in kept)
+        else:
+            query = doc["item_number"]
+        out.append((kind, query, doc["item_number"]))
+    return out
+
+
+MODES = {
+    "sparse": dict(use_dense=False, use_sparse=True, use_rerank=False),
+    "dense": dict(use_dense=True, use_sparse=False, use_rerank=False),
+    "hybrid": dict(use_dense=True, use_sparse=True, use_rerank=False),
+    "hybrid+rerank": dict(use_dense=True, use_sparse=True, use_rerank=True),
+}
+
+
+def index_bytes(index: HybridIndex) -> int:
+    total = 0
+    if index.sparse is not None:
+        p = index.sparse.postings
+        total += p.data.nbytes + p.indices.nbytes + p.indptr.nbytes
+    if index.dense is not None:
+        total += index.dense.projection.nbytes if index.dense.projection is not None else 0
+        total += index.dense.matrix.nbytes if index.dense.matrix is not None else 0
+    return total
+
+
+def evaluate(index: HybridIndex, queries: list[tuple[str, str, str]], mode: str, rows: int) -> dict[str, Any]:
+    latencies: list[float] = []
+    hits: dict[str, list[float]] = {}
+    for kind, query, target in queries:
+        started = time.perf_counter()
+        results = index.search(query, rows=rows, **MODES[mode])
+        latencies.append(time.perf_counter() - started)
+        ids = [r["id"] for r in results]
+        rank = ids.index(target) + 1 if target in ids else None
+        hits.setdefault(kind, []).append(1.0 / rank if rank else 0.0)
+    latencies.sort()
+    every = [h for values in hits.values() for h in values]
+    return {
+        "mode": mode,
+        "hit_at_k": sum(h > 0 for h in every) / len(every),
+        "mrr": statistics.fmean(every),
+        "hit_at_k_by_kind": {kind: sum(h > 0 for h in values) / len(values) for kind, values in sorted(hits.items())},
+        "latency_ms_p50": statistics.median(latencies) * 1000,
+        "latency_ms_p95": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=20000)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--rows", type=int, default=10)
+    ap.add_argument("--dense-dim", type=int, default=128)
+    ap.add_argument("--json", help="write results here")
+    args = ap.parse_args()
+
+    docs = synthetic_catalog(args.docs)
+    index = HybridIndex(docs, dense_dim=args.dense_dim)
+    queries = labelled_queries(docs, args.queries)
+    for mode in MODES:  # warm-up
+        index.search(queries[0][1], rows=args.rows, **MODES[mode])
+    rows = [evaluate(index, queries, mode, args.rows) for mode in MODES]
+
+    print(f"{args.docs} products, built in {index.build_seconds:.1f} s, index {index_bytes(index) / 2**20:.1f} MB, "
+          f"{len(queries)} queries, hit@{args.rows}")
+    kinds = sorted(rows[0]["hit_at_k_by_kind"])
+    print(f"{'mode':<15}{'hit@k':>7}{'MRR':>7}" + "".join(f"{k:>8}" for k in kinds) + f"{'p50 ms':>9}{'p95 ms':>9}")
+    for r in rows:
+        print(f"{r['mode']:<15}{r['hit_at_k']:>7.2f}{r['mrr']:>7.2f}"
+              + "".join(f"{r['hit_at_k_by_kind'][k]:>8.2f}" for k in kinds)
+              + f"{r['latency_ms_p50']:>9.2f}{r['latency_ms_p95']:>9.2f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "build_s": index.build_seconds, "results": rows}, indent=2))
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
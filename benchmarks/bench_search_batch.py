@@ -0,0 +1,110 @@
+"""vector_service: N related lookups as N sequential /search calls vs one /search/batch.
+
+An agent that needs a brand, a model and an accessory lookup used to make
+three calls in a row. The script sends groups of ``--sizes`` searches to
+vector_service (over ASGI) with a FakeVectorSearch upstream that answers
+after ``--latency-ms``:
+
+- sequential: one POST /search after another
+- batch: one POST /search/batch; the items fan out concurrently upstream
+- batch+upstream: the same, with VECTOR_UPSTREAM_BATCH on, so the items
+  reach the upstream as one POST /search/batch
+
+Every query is unique and the result cache is off, so each item is a real
+upstream search. Reported per group: p50/p95 wall time and upstream HTTP
+calls.
+
+Run from the repo root:
+    py benchmarks/bench_search_batch.py
+    py benchmarks/bench_search_batch.py --sizes 4 16 64 --groups 50 --latency-ms 40
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "Agentic-Tools" / "e-commerce"))
+
+import httpx  # noqa: E402
+
+from fake_backends import FakeVectorSearch  # noqa: E402
+from gateway.upstream import MicroBatcher  # noqa: E402
+
+MODES = ("sequential", "batch", "batch+upstream")
+_ids = itertools.count()
+
+
+async def group(client: httpx.AsyncClient, mode: str, size: int) -> float:
+    items = [{"query": f"lookup {next(_ids)}", "rows": 10} for _ in range(size)]
+    started = time.perf_counter()
+    if mode == "sequential":
+        for item in items:
+            r = await client.post("/search", json=item)
+            r.raise_for_status()
+    else:
+        r = await client.post("/search/batch", json={"items": items})
+        r.raise_for_status()
+        assert r.json()["ok"] == size, r.json()
+    return time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    upstream = FakeVectorSearch(args.latency_ms, args.latency_ms / 10)
+    url = await upstream.start(args.port)
+    os.environ.update(UPSTREAM_VECTOR_URL=url, VECTOR_BACKEND="upstream", VECTOR_CACHE_MAX_ENTRIES="0",
+                      VECTOR_BATCH_PARALLELISM=str(max(args.sizes)))
+    import vector_service
+
+    rows = []
+    try:
+        async with vector_service.lifespan(vector_service.app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=vector_service.app), base_url="http://bench") as client:
+                for size in args.sizes:
+                    for mode in MODES:
+                        vector_service.BATCHER = MicroBatcher(vector_service._send_batch, max_items=size) if mode == "batch+upstream" else None
+                        await group(client, mode, size)  # warm-up: connections, first-call imports
+                        calls_before = upstream.calls + upstream.batch_calls
+                        walls = sorted([await group(client, mode, size) for _ in range(args.groups)])
+                        rows.append({
+                            "size": size,
+                            "mode": mode,
+                            "wall_ms_p50": statistics.median(walls) * 1000,
+                            "wall_ms_p95": walls[min(len(walls) - 1, int(0.95 * len(walls)))] * 1000,
+                            "upstream_calls_per_group": (upstream.calls + upstream.batch_calls - calls_before) / args.groups,
+                        })
+    finally:
+        await upstream.close()
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[3, 8, 32], help="searches per group")
+    ap.add_argument("--groups", type=int, default=30)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--port", type=int, default=18714)
+    ap.add_argument("--json", help="write results here")
+    args = ap.parse_args()
+
+    rows = asyncio.run(run(args))
+    print(f"{args.groups} groups per size, upstream latency {args.latency_ms:g} ms, result cache off")
+    print(f"{'size':>5}  {'mode':<16}{'p50 ms':>9}{'p95 ms':>9}{'upstream calls':>16}")
+    for r in rows:
+        print(f"{r['size']:>5}  {r['mode']:<16}{r['wall_ms_p50']:>9.1f}{r['wall_ms_p95']:>9.1f}{r['upstream_calls_per_group']:>16.1f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "results": rows}, indent=2))
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Session contention: concurrent turns, and the SQLite store under parallel load.
+
+Turns: ``--clients`` concurrent clients each send ``--turns`` messages through one
+Runner on the default in-memory store. A scripted model answers after
+``--model-latency-ms``, echoing the last user message it was shown. Each layout
+runs under three ways of guarding a session:
+
+- none: what both apps did before. Nothing stops two turns on one session from
+  interleaving.
+- global: one lock for every turn. This is correct, but it serializes all
+  sessions.
+- session: ``gateway.sessions.SessionLocks``. Turns on one session queue;
+  different sessions run in parallel.
+
+The layouts are "distinct" (a session per client, as with server-issued ids)
+and "shared" (every client on one session, like the old ``session-001``
+default). A turn is "interleaved" when another turn's events land inside it,
+or when the model answered a message from another turn. Either one corrupts
+the conversation.
+
+Store: ``--threads`` threads take short turns (load + append) on small sessions.
+Meanwhile two threads keep reloading sessions of ``--big-events`` events. The
+run uses ``SQLiteSessionStore(shards=1)`` (one connection and lock, as before)
+and then ``--shards`` lock stripes. With one lock, a short turn waits behind
+whichever big load holds it.
+
+Run from the repo root:
+    py benchmarks/bench_sessions.py
+    py benchmarks/bench_sessions.py --clients 32 --turns 3 --model-latency-ms 50 --shards 16
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from pathlib import Path
+from typing import Any, AsyncGenerator
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from google.adk.agents import LlmAgent  # noqa: E402
+from google.adk.models.base_llm import BaseLlm  # noqa: E402
+from google.adk.models.llm_request import LlmRequest  # noqa: E402
+from google.adk.models.llm_response import LlmResponse  # noqa: E402
+from google.adk.runners import Runner  # noqa: E402
+from google.genai import types  # noqa: E402
+
+from gateway.sessions import BoundedSessionService, SessionLocks, SQLiteSessionStore  # noqa: E402
+
+APP = "bench-sessions"
+GUARDS = ("none", "global", "session")
+
+
+class EchoLlm(BaseLlm):
+    """Answers "re: <last user message it saw>" after a fixed latency."""
+
+    model: str = "echo"
+    latency: float = 0.0
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self.latency)
+        last = next((c for c in reversed(llm_request.contents) if c.role == "user" and c.parts and c.parts[0].text), None)
+        text = "re: " + (last.parts[0].text if last else "")
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def interleaved_turns(events: list) -> int:
+    """Turns whose events are not contiguous, or whose answer is for another turn's message."""
+    asked: dict[str, str] = {}
+    bad: set[str] = set()
+    seen: set[str] = set()
+    previous = None
+    for event in events:
+        inv = event.invocation_id
+        if inv != previous and inv in seen:
+            bad.add(inv)  # this turn resumed after another turn's events
+        seen.add(inv)
+        previous = inv
+        text = event.content.parts[0].text if event.content and event.content.parts else None
+        if event.author == "user":
+            asked[inv] = text
+        elif text is not None and text != f"re: {asked.get(inv)}":
+            bad.add(inv)
+    return len(bad)
+
+
+async def run_turns(layout: str, guard: str, clients: int, turns: int, latency: float) -> dict[str, Any]:
+    service = BoundedSessionService(idle_ttl=0, max_bytes=0, max_events=0)
+    runner = Runner(agent=LlmAgent(name="echo", model=EchoLlm(latency=latency), instruction="echo"), app_name=APP, session_service=service)
+    session_locks = SessionLocks()
+    global_lock = asyncio.Lock()
+    sessions = [f"s{c}" if layout == "distinct" else "s0" for c in range(clients)]
+    for sid in set(sessions):
+        await service.create_session(app_name=APP, user_id="u", session_id=sid)
+
+    def guarded(sid: str):
+        if guard == "global":
+            return global_lock
+        if guard == "session":
+            return session_locks.hold((APP, "u", sid))
+        return contextlib.nullcontext()
+
+    latencies: list[float] = []
+
+    async def client(c: int) -> None:
+        for t in range(turns):
+            started = time.perf_counter()
+            message = types.Content(role="user", parts=[types.Part(text=f"client {c} turn {t}")])
+            async with guarded(sessions[c]):
+                async for _ in runner.run_async(user_id="u", session_id=sessions[c], new_message=message):
+                    pass
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    wall = time.perf_counter() - started
+    interleaved = 0
+    for sid in set(sessions):
+        session = await service.get_session(app_name=APP, user_id="u", session_id=sid)
+        interleaved += interleaved_turns(session.events)
+    latencies.sort()
+    return {
+        "layout": layout,
+        "guard": guard,
+        "turns": clients * turns,
+        "wall_s": wall,
+        "turns_per_s": clients * turns / wall,
+        "latency_ms_p50": statistics.median(latencies) * 1000,
+        "latency_ms_p95": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+        "interleaved": interleaved,
+    }
+
+
+def run_store(shards: int, threads: int, ops: int, big_events: int, event_bytes: int) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSessionStore(Path(tmp) / "sessions.sqlite3", shards=shards)
+        payload = json.dumps({"text": "x" * event_bytes})
+        # Two long conversations keep being reloaded while short ones take turns
+        for sid, count in [("big0", big_events), ("big1", big_events)] + [(f"s{t}", 10) for t in range(threads)]:
+            store.create(APP, "u", sid, {}, 1.0)
+            for e in range(count):
+                store.append(APP, "u", sid, 1.0 + e, {}, 2.0 + e, payload)
+        stop = threading.Event()
+        latencies: list[float] = []
+
+        def reload_big(sid: str) -> None:
+            while not stop.is_set():
+                store.load(APP, "u", sid)
+
+        def short_turns(sid: str) -> None:
+            for _ in range(ops):
+                started = time.perf_counter()
+                _, updated, _ = store.load(APP, "u", sid)
+                store.append(APP, "u", sid, updated, {}, updated + 1, payload)
+                latencies.append(time.perf_counter() - started)
+                time.sleep(0.002)  # think time between turns
+
+        big = [threading.Thread(target=reload_big, args=(f"big{b}",)) for b in range(2)]
+        short = [threading.Thread(target=short_turns, args=(f"s{t}",)) for t in range(threads)]
+        for th in big:
+            th.start()
+        started = time.perf_counter()
+        for th in short:
+            th.start()
+        for th in short:
+            th.join()
+        wall = time.perf_counter() - started
+        stop.set()
+        for th in big:
+            th.join()
+        store.close()
+    latencies.sort()
+    return {
+        "shards": shards,
+        "cycles": threads * ops,
+        "wall_s": wall,
+        "latency_ms_p50": statistics.median(latencies) * 1000,
+        "latency_ms_p95": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--turns", type=int, default=3, help="turns per client")
+    ap.add_argument("--model-latency-ms", type=float, default=20.0)
+    ap.add_argument("--threads", type=int, default=4, help="store benchmark threads taking short turns")
+    ap.add_argument("--shards", type=int, default=8)
+    ap.add_argument("--ops", type=int, default=100, help="short turns per thread")
+    ap.add_argument("--big-events", type=int, default=2000, help="events in each long session being reloaded")
+    ap.add_argument("--event-bytes", type=int, default=2000)
+    ap.add_argument("--json", help="write results here")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, force=True)  # ADK warns about the echo model's missing token usage
+    warnings.filterwarnings("ignore")
+
+    asyncio.run(run_turns("distinct", "none", 2, 1, 0.0))  # warm-up: first-run imports and caches
+    turn_rows = [
+        asyncio.run(run_turns(layout, guard, args.clients, args.turns, args.model_latency_ms / 1000))
+        for layout in ("distinct", "shared")
+        for guard in GUARDS
+    ]
+    print(f"{args.clients} clients x {args.turns} turns, model latency {args.model_latency_ms:g} ms")
+    print(f"{'layout':<10}{'guard':<9}{'turns/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'interleaved':>13}")
+    for r in turn_rows:
+        print(f"{r['layout']:<10}{r['guard']:<9}{r['turns_per_s']:>9.1f}{r['latency_ms_p50']:>9.1f}"
+              f"{r['latency_ms_p95']:>9.1f}{r['interleaved']:>8}/{r['turns']}")
+
+    store_rows = [
+        run_store(shards, args.threads, args.ops, args.big_events, args.event_bytes)
+        for shards in dict.fromkeys((1, args.shards))
+    ]
+    print(f"\nSQLite store: {args.threads} threads taking short turns while 2 sessions of {args.big_events} events reload")
+    print(f"{'shards':>6}{'p50 ms':>9}{'p95 ms':>9}{'wall s':>8}")
+    for r in store_rows:
+        print(f"{r['shards']:>6}{r['latency_ms_p50']:>9.2f}{r['latency_ms_p95']:>9.2f}{r['wall_s']:>8.2f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "turns": turn_rows, "store": store_rows}, indent=2))
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Compare /img originals against resized WebP thumbnails.
+
+Serves generated multi-megabyte JPEGs from a local upstream and fetches a
+12-image gallery through the root app's /img route, the way the index() UI
+does: originals vs. ``w=320&h=280&fmt=webp`` (2x the 160x140 tiles).
+Reports bytes transferred and p95 latency for cold and warm caches, plus an
+estimated gallery render time at a given client bandwidth. Originals run
+first, so the thumbnail "cold" numbers are resize cost on cached sources.
+
+Run from the repo root (needs Pillow):
+    py benchmarks/bench_thumbnails.py --images 12 --rounds 5 --mbps 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx
+from aiohttp import web
+from PIL import Image
+
+
+def make_photo(seed: int, size: tuple[int, int] = (3000, 2000)) -> bytes:
+    """A noisy gradient compresses like a photo (a few MB as quality-95 JPEG)."""
+    w, h = size
+    base = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+    noise = Image.effect_noise((w, h), 60 + seed).convert("RGB")
+    im = Image.blend(base, noise, 0.5)
+    out = BytesIO()
+    im.save(out, "JPEG", quality=95)
+    return out.getvalue()
+
+
+async def start_upstream(bodies: list[bytes], port: int) -> web.AppRunner:
+    async def handler(request: web.Request) -> web.Response:
+        i = int(request.match_info["i"])
+        return web.Response(body=bodies[i], content_type="image/jpeg", headers={"ETag": f'"img-{i}"'})
+
+    app = web.Application()
+    app.router.add_get("/photo/{i}.jpg", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def p95(values: list[float]) -> float:
+    return statistics.quantiles(values, n=20)[18] if len(values) > 1 else values[0]
+
+
+async def gallery(client: httpx.AsyncClient, urls: list[str], query: str, parallel: int) -> tuple[list[float], int, float]:
+    """Fetch every image with browser-like parallelism; return latencies, bytes, wall time."""
+    sem = asyncio.Semaphore(parallel)
+    latencies: list[float] = []
+    total = 0
+
+    async def one(u: str) -> None:
+        nonlocal total
+        async with sem:
+            started = time.perf_counter()
+            r = await client.get("/img", params={"u": u, **dict(p.split("=") for p in query.split("&") if p)})
+            r.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+            total += len(r.content)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(u) for u in urls))
+    return latencies, total, (time.perf_counter() - started) * 1000
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images", type=int, default=12)
+    ap.add_argument("--rounds", type=int, default=5, help="warm-cache rounds per variant")
+    ap.add_argument("--parallel", type=int, default=6, help="concurrent fetches (browsers use ~6 per host)")
+    ap.add_argument("--mbps", type=float, default=20.0, help="client bandwidth for the render estimate")
+    ap.add_argument("--port", type=int, default=8799)
+    args = ap.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="img-bench-")
+    os.environ["IMG_CACHE_DIR"] = cache_dir
+    import main as gateway  # noqa: E402  (reads IMG_* env at import)
+
+    print(f"Generating {args.images} source photos...")
+    bodies = [make_photo(i) for i in range(args.images)]
+    print(f"Average source size: {statistics.mean(map(len, bodies)) / 1e6:.2f} MB")
+    upstream = await start_upstream(bodies, args.port)
+    urls = [f"http://127.0.0.1:{args.port}/photo/{i}.jpg" for i in range(args.images)]
+
+    variants = [("original", ""), ("thumb 320x280 webp", "w=320&h=280&fmt=webp")]
+    rows = []
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app), base_url="http://bench", timeout=60) as client:
+            for name, query in variants:
+                cold, cold_bytes, cold_wall = await gallery(client, urls, query, args.parallel)
+                warm: list[float] = []
+                warm_walls: list[float] = []
+                for _ in range(args.rounds):
+                    lat, warm_bytes, wall = await gallery(client, urls, query, args.parallel)
+                    warm.extend(lat)
+                    warm_walls.append(wall)
+                transfer_ms = warm_bytes * 8 / (args.mbps * 1e6) * 1000
+                rows.append((name, warm_bytes, p95(cold), cold_wall, p95(warm), statistics.median(warm_walls), transfer_ms))
+    finally:
+        await gateway.IMAGES.close()
+        await upstream.cleanup()
+
+    print()
+    print(f"{'variant':<22}{'bytes/gallery':>15}{'p95 cold ms':>13}{'cold wall ms':>14}{'p95 warm ms':>13}{'warm wall ms':>14}{'render @%gMbps ms' % args.mbps:>20}")
+    for name, nbytes, pc, cw, pw, ww, tx in rows:
+        print(f"{name:<22}{nbytes:>15,}{pc:>13.1f}{cw:>14.1f}{pw:>13.1f}{ww:>14.1f}{ww + tx:>20.1f}")
+    base, thumb = rows[0], rows[1]
+    print()
+    print(f"Bytes saved: {100 * (1 - thumb[1] / base[1]):.1f}%  "
+          f"estimated render time: {base[5] + base[6]:.0f} ms -> {thumb[5] + thumb[6]:.0f} ms")
+    print(f"Cache dir: {cache_dir}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""vector_service upstream path: the old blocking proxy vs the pooled async client.
+
+A FakeVectorSearch upstream answers after ``--latency-ms``. The same
+``--requests`` searches (over ``--distinct`` queries, at ``--concurrency``)
+go through two apps via ASGI:
+
+- legacy: the previous /search, a sync route that calls ``requests.post``
+  with a fresh connection per call and a 20 s timeout. It runs in
+  FastAPI's thread pool.
+- pooled: the current vector_service (``gateway.upstream.UpstreamClient``):
+  keep-alive pool, jittered retries, circuit breaker and stale fallback.
+  The result cache is off, so every search reaches the client.
+- cached: the same, with the result cache on (``gateway.cache.SWRCache``,
+  60 s fresh + 300 s stale-while-revalidate).
+
+Phases: "healthy", then "outage", where the upstream answers 503 to
+everything. For each phase the script reports answered requests, p50/p95
+latency and upstream calls made. During an outage the pooled client stops
+calling the upstream once its breaker opens, and it serves the last good
+result for queries it has seen.
+
+Run from the repo root:
+    py benchmarks/bench_upstream.py
+    py benchmarks/bench_upstream.py --requests 2000 --concurrency 64 --latency-ms 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "Agentic-Tools" / "e-commerce"))
+
+import httpx  # noqa: E402
+import requests  # noqa: E402
+from fastapi import FastAPI, HTTPException  # noqa: E402
+
+from fake_backends import FakeVectorSearch  # noqa: E402
+from gateway.cache import SWRCache  # noqa: E402
+
+
+def legacy_app(url: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/search")
+    def search(body: dict[str, Any]):
+        try:
+            r = requests.post(url, headers={"Content-Type": "application/json"}, data=json.dumps(body), timeout=20)
+            r.raise_for_status()
+            return r.json()
+        except requests.Timeout:
+            raise HTTPException(status_code=504, detail="Upstream vector search timeout")
+        except requests.HTTPError:
+            raise HTTPException(status_code=r.status_code, detail=r.text)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=str(e))
+
+    return app
+
+
+async def phase(app: Any, upstream: FakeVectorSearch, name: str, args: argparse.Namespace) -> dict[str, Any]:
+    calls_before = upstream.calls
+    latencies: list[float] = []
+    answered = 0
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(client: httpx.AsyncClient, i: int) -> None:
+        nonlocal answered
+        async with sem:
+            started = time.perf_counter()
+            r = await client.post("/search", json={"query": f"q{i % args.distinct}", "rows": 10})
+            latencies.append(time.perf_counter() - started)
+            answered += r.status_code == 200
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(args.requests)))
+        wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "phase": name,
+        "answered": answered / args.requests,
+        "req_per_s": args.requests / wall,
+        "latency_ms_p50": statistics.median(latencies) * 1000,
+        "latency_ms_p95": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+        "upstream_calls": upstream.calls - calls_before,
+    }
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    upstream = FakeVectorSearch(args.latency_ms, args.latency_ms / 10)
+    url = await upstream.start(args.port)
+    # Result caching off (stale-if-error stays on) so every search exercises the client
+    os.environ.update(UPSTREAM_VECTOR_URL=url, VECTOR_BACKEND="upstream", VECTOR_CACHE_TTL="0", VECTOR_CACHE_SWR="0")
+    import vector_service
+
+    uncached = vector_service.SEARCH_CACHE
+    cached = SWRCache(ttl=60, swr=300, stale_if_error=uncached.stale_if_error, serve_stale=uncached.serve_stale)
+    rows = []
+    try:
+        for label, app in (("legacy", legacy_app(url)), ("pooled", vector_service.app), ("cached", vector_service.app)):
+            vector_service.SEARCH_CACHE = cached if label == "cached" else uncached
+            for breaker in vector_service.UPSTREAM.breakers.values():
+                breaker.success()  # each client starts from a healthy upstream
+            async with vector_service.lifespan(app) if app is vector_service.app else contextlib.nullcontext():
+                upstream.mode = "ok"
+                rows.append({"client": label, **await phase(app, upstream, "healthy", args)})
+                upstream.mode = "error"
+                rows.append({"client": label, **await phase(app, upstream, "outage", args)})
+    finally:
+        await upstream.close()
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--distinct", type=int, default=50, help="distinct queries (the stale fallback covers these)")
+    ap.add_argument("--latency-ms", type=float, default=10.0)
+    ap.add_argument("--port", type=int, default=18713)
+    ap.add_argument("--json", help="write results here")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, force=True)  # one warning per failed upstream attempt otherwise
+    rows = asyncio.run(run(args))
+    print(f"{args.requests} searches at concurrency {args.concurrency}, upstream latency {args.latency_ms:g} ms")
+    print(f"{'client':<8}{'phase':<9}{'answered':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'upstream calls':>16}")
+    for r in rows:
+        print(f"{r['client']:<8}{r['phase']:<9}{r['answered']:>9.0%}{r['req_per_s']:>8.0f}{r['latency_ms_p50']:>9.1f}"
+              f"{r['latency_ms_p95']:>9.1f}{r['upstream_calls']:>16}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "results": rows}, indent=2))
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
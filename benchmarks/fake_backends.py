@@ -0,0 +1,264 @@
+"""Offline stand-ins for the services the agents call.
+
+- FakeGemini speaks enough of the Gemini REST API (``:generateContent`` and
+  ``:streamGenerateContent?alt=sse``) for google-genai to talk to it. Point
+  a process at it with GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:<port> and
+  any GOOGLE_API_KEY. Replies echo the prompt and carry a fenced products
+  JSON block plus markdown images, so the gateway's ``_extract_text_and_html``
+  and the /img proxy see realistic output.
+- FakeImages serves generated JPEGs at ``/img/<n>.jpg`` with an ETag.
+- FakeVectorSearch answers vector_service's upstream ``POST /search`` (and
+  ``/search/batch``, one latency for the whole batch) after a set latency.
+  Setting ``.mode = "error"`` makes it return 503s, as an overloaded
+  upstream would.
+
+Run both for manual testing:
+    py benchmarks/fake_backends.py --model-port 8711 --image-port 8712
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+from io import BytesIO
+
+from aiohttp import web
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional
+    Image = None  # type: ignore[assignment]
+
+# 1x1 transparent PNG, used when Pillow is missing
+_TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class FakeGemini:
+    """Scripted Gemini endpoint with configurable latency."""
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 10.0, chunks: int = 4, image_base: str = "", images: int = 4):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chunks = max(1, chunks)
+        self.image_base = image_base.rstrip("/")
+        self.images = images
+        self.calls = 0
+        self.stream_calls = 0
+        self._runner: web.AppRunner | None = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(r"/{version}/models/{model}:generateContent", self._generate)
+        app.router.add_post(r"/{version}/models/{model}:streamGenerateContent", self._stream)
+        return app
+
+    async def start(self, port: int, host: str = "127.0.0.1") -> str:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _delay(self) -> None:
+        await asyncio.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+    @staticmethod
+    def _prompt(body: dict) -> str:
+        for content in reversed(body.get("contents") or []):
+            for part in content.get("parts") or []:
+                if part.get("text"):
+                    return part["text"]
+        return ""
+
+    def _reply(self, prompt: str, model: str) -> str:
+        topic = re.sub(r"\s+", " ", prompt).strip()[:80] or "your request"
+        products = [
+            {
+                "item_number": f"SKU-{i:04d}",
+                "title": f"{topic} option {i}",
+                "product_url": f"https://shop.example.com/p/{i}",
+                "seller_or_brand": "Example",
+                "price": f"${19 + i}.99",
+                "key_specs": ["spec a", "spec b"],
+            }
+            for i in range(3)
+        ]
+        lines = [f"Summary for: {topic}", "", "Detailed findings:", "- point one", "- point two", ""]
+        if self.image_base:
+            lines += [f"![product {i}]({self.image_base}/img/{i}.jpg)" for i in range(self.images)] + [""]
+        lines += ["```json", json.dumps({"products": products, "page_urls": ["https://example.com/review"]}), "```"]
+        return "\n".join(lines)
+
+    @staticmethod
+    def _response(text: str, model: str, prompt_tokens: int, final: bool) -> dict:
+        candidate: dict = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        out: dict = {"candidates": [candidate], "modelVersion": model}
+        if final:
+            candidate["finishReason"] = "STOP"
+            completion = max(1, len(text) // 4)
+            out["usageMetadata"] = {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": completion,
+                "totalTokenCount": prompt_tokens + completion,
+            }
+        return out
+
+    async def _generate(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        body = await request.json()
+        model = request.match_info["model"]
+        await self._delay()
+        text = self._reply(self._prompt(body), model)
+        return web.json_response(self._response(text, model, len(json.dumps(body)) // 4, final=True))
+
+    async def _stream(self, request: web.Request) -> web.StreamResponse:
+        self.calls += 1
+        self.stream_calls += 1
+        body = await request.json()
+        model = request.match_info["model"]
+        text = self._reply(self._prompt(body), model)
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        step = -(-len(text) // self.chunks)
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        for i, piece in enumerate(pieces):
+            # Spread the latency over the chunks, like a model emitting tokens
+            await asyncio.sleep(self.latency_ms / 1000 / len(pieces))
+            final = i == len(pieces) - 1
+            frame = self._response(piece, model, len(json.dumps(body)) // 4, final=final)
+            await resp.write(f"data: {json.dumps(frame)}\r\n\r\n".encode())
+        await resp.write_eof()
+        return resp
+
+
+def make_jpeg(seed: int, size: tuple[int, int] = (800, 600)) -> bytes:
+    if Image is None:
+        return _TINY_PNG
+    im = Image.effect_noise(size, 40 + seed).convert("RGB")
+    out = BytesIO()
+    im.save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+
+class FakeImages:
+    """Serves ``count`` generated images at /img/<n>.jpg."""
+
+    def __init__(self, count: int = 4, size: tuple[int, int] = (800, 600)):
+        self.bodies = [make_jpeg(i, size) for i in range(count)]
+        self.content_type = "image/jpeg" if Image is not None else "image/png"
+        self.hits = 0
+        self._runner: web.AppRunner | None = None
+
+    async def _handler(self, request: web.Request) -> web.Response:
+        self.hits += 1
+        i = int(request.match_info["n"]) % len(self.bodies)
+        etag = f'"fake-{i}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=self.bodies[i], content_type=self.content_type, headers={"ETag": etag})
+
+    async def start(self, port: int, host: str = "127.0.0.1") -> str:
+        app = web.Application()
+        app.router.add_get(r"/img/{n:\d+}.jpg", self._handler)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class FakeVectorSearch:
+    """Upstream for vector_service: echoes the query back as ``rows`` results."""
+
+    def __init__(self, latency_ms: float = 5.0, jitter_ms: float = 1.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.mode = "ok"
+        self.calls = 0
+        self.batch_calls = 0
+        self._runner: web.AppRunner | None = None
+
+    @staticmethod
+    def _answer(body: dict) -> dict:
+        if not body.get("query"):
+            return {"error": "query is required", "status": 422}
+        rows = int(body.get("rows") or 10)
+        return {"results": [{"id": f"{body['query']}-{i}", "score": 1.0 / (i + 1)} for i in range(rows)]}
+
+    async def _delay(self) -> None:
+        await asyncio.sleep(max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000)
+
+    async def _search(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        body = await request.json()
+        await self._delay()
+        if self.mode == "error":
+            return web.json_response({"error": "overloaded"}, status=503)
+        answer = self._answer(body)
+        return web.json_response(answer, status=answer.get("status", 200))
+
+    async def _batch(self, request: web.Request) -> web.Response:
+        self.batch_calls += 1
+        body = await request.json()
+        await self._delay()
+        if self.mode == "error":
+            return web.json_response({"error": "overloaded"}, status=503)
+        return web.json_response({"results": [self._answer(r) for r in body.get("requests", [])]})
+
+    async def start(self, port: int, host: str = "127.0.0.1") -> str:
+        app = web.Application()
+        app.router.add_post("/search", self._search)
+        app.router.add_post("/search/batch", self._batch)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}/search"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    images = FakeImages(args.images)
+    image_base = await images.start(args.image_port)
+    model = FakeGemini(args.latency_ms, args.jitter_ms, image_base=image_base, images=args.images)
+    model_base = await model.start(args.model_port)
+    vector = FakeVectorSearch()
+    vector_url = await vector.start(args.vector_port)
+    print(f"GOOGLE_GEMINI_BASE_URL={model_base}  (images at {image_base}/img/<n>.jpg)")
+    print(f"UPSTREAM_VECTOR_URL={vector_url}; Ctrl+C to stop")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await model.close()
+        await images.close()
+        await vector.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model-port", type=int, default=8711)
+    ap.add_argument("--image-port", type=int, default=8712)
+    ap.add_argument("--vector-port", type=int, default=8713)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--jitter-ms", type=float, default=10.0)
+    ap.add_argument("--images", type=int, default=4)
+    try:
+        asyncio.run(_serve(ap.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,304 @@
+"""HTTP load test for the gateway (main.py) and the standalone e-commerce app.
+
+Everything runs locally with no network. The apps are started with uvicorn as
+subprocesses and point at stand-in backends from fake_backends.py:
+- a fake Gemini endpoint, wired in through GOOGLE_GEMINI_BASE_URL
+- a fake image host for /img
+
+For each scenario the harness sweeps concurrency levels with closed-loop
+clients. It reports throughput, p50/p95/p99 latency, status codes, event-loop
+lag (from the app's ``event_loop_lag_seconds`` histogram on /metrics) and
+process RSS.
+
+Scenarios:
+    gateway:ecommerce   POST /query mode=ecommerce   (LoopAgent: shop -> research, x2)
+    gateway:brand-seo   POST /query mode=brand-seo
+    gateway:stream      POST /query/stream mode=ecommerce (SSE model streaming)
+    gateway:img         GET /img thumbnails (w=320&h=280&fmt=webp)
+    ecommerce:query     POST /query on Agentic-Tools/e-commerce/agent.py
+    ecommerce:img       GET /img on the e-commerce app
+
+Run from the repo root:
+    py benchmarks/loadtest.py --levels 1,8,32 --duration 10
+    py benchmarks/loadtest.py --scenarios gateway:ecommerce --json before.json
+    py benchmarks/loadtest.py --compare before.json --json after.json
+
+Gateway env knobs (GATEWAY_CONCURRENCY, ...) pass through with --env KEY=VALUE.
+The default admission limits reject some requests at high concurrency, and
+those show up in the status column.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_backends import FakeGemini, FakeImages  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+
+TARGETS = {
+    "gateway": ["-m", "uvicorn", "main:app"],
+    "ecommerce": ["-m", "uvicorn", "agent:app", "--app-dir", str(ROOT / "Agentic-Tools" / "e-commerce")],
+}
+ALL_SCENARIOS = ["gateway:ecommerce", "gateway:brand-seo", "gateway:stream", "gateway:img", "ecommerce:query", "ecommerce:img"]
+
+_SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][\w:]*)(?:\{(?P<labels>[^}]*)\})?\s+(?P<value>\S+)$')
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def parse_histogram(text: str, name: str) -> dict[str, float]:
+    """{le: cumulative count, "_sum": s, "_count": n} for an unlabelled histogram."""
+    out: dict[str, float] = {}
+    for line in text.splitlines():
+        m = _SAMPLE.match(line)
+        if not m:
+            continue
+        metric, labels, value = m["name"], m["labels"] or "", float(m["value"])
+        if metric == f"{name}_bucket":
+            le = re.search(r'le="([^"]+)"', labels)
+            if le:
+                out[le.group(1)] = value
+        elif metric == f"{name}_sum":
+            out["_sum"] = value
+        elif metric == f"{name}_count":
+            out["_count"] = value
+    return out
+
+
+def lag_between(before: dict[str, float], after: dict[str, float]) -> tuple[float, float]:
+    """Mean and p99 (bucket upper bound) of loop lag, in ms, for samples taken between two scrapes."""
+    n = after.get("_count", 0) - before.get("_count", 0)
+    if n <= 0:
+        return 0.0, 0.0
+    mean = (after.get("_sum", 0) - before.get("_sum", 0)) / n * 1000
+    buckets = sorted(
+        ((float("inf") if le == "+Inf" else float(le), after[le] - before.get(le, 0)) for le in after if not le.startswith("_")),
+    )
+    p99 = float("inf")
+    for bound, cum in buckets:
+        if cum >= 0.99 * n:
+            p99 = bound
+            break
+    return mean, p99 * 1000
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class App:
+    """One uvicorn subprocess."""
+
+    def __init__(self, target: str, port: int, env: dict[str, str], log_dir: Path):
+        self.target = target
+        self.port = port
+        self.base = f"http://127.0.0.1:{port}"
+        self.log_path = log_dir / f"{target}.log"
+        cmd = [sys.executable, *TARGETS[target], "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+        self._log = self.log_path.open("w")
+        self.proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=self._log, stderr=subprocess.STDOUT)
+
+    async def wait_ready(self, client: httpx.AsyncClient, timeout: float = 90.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"{self.target} exited ({self.proc.returncode}); see {self.log_path}")
+            try:
+                if (await client.get(f"{self.base}/metrics", timeout=2)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+        raise RuntimeError(f"{self.target} did not become ready in {timeout:.0f}s; see {self.log_path}")
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self._log.close()
+
+
+def make_request(scenario: str, n: int, image_base: str, images: int) -> tuple[str, str, Optional[dict]]:
+    """(method, path, json body) for request number ``n``; queries are unique so caches and single-flight stay out of the way."""
+    target, kind = scenario.split(":")
+    image = f"{image_base}/img/{n % images}.jpg"
+    if kind == "img":
+        params = f"u={image}&w=320&h=280&fmt=webp"
+        return "GET", f"/img?{params}", None
+    body = {"query": f"load test product {n}", "session_id": f"lt-{n}"}
+    if target == "gateway":
+        body["mode"] = "ecommerce" if kind in ("ecommerce", "stream") else kind
+        return "POST", "/query/stream" if kind == "stream" else "/query", body
+    return "POST", "/query", body
+
+
+async def run_level(
+    client: httpx.AsyncClient, app: App, scenario: str, concurrency: int, duration: float, counter: itertools.count, image_base: str, images: int
+) -> dict[str, Any]:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    stop_at = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while time.perf_counter() < stop_at:
+            method, path, body = make_request(scenario, next(counter), image_base, images)
+            started = time.perf_counter()
+            try:
+                r = await client.request(method, app.base + path, json=body)
+                await r.aread()
+                code = str(r.status_code)
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    before = parse_histogram((await client.get(f"{app.base}/metrics")).text, "event_loop_lag_seconds")
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    after = parse_histogram((await client.get(f"{app.base}/metrics")).text, "event_loop_lag_seconds")
+    lag_mean, lag_p99 = lag_between(before, after)
+
+    latencies.sort()
+    ok = statuses.get("200", 0)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "ok_rps": ok / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "loop_lag_mean_ms": lag_mean,
+        "loop_lag_p99_ms": lag_p99,
+        "rss_mb": rss_mb(app.proc.pid),
+        "statuses": statuses,
+    }
+
+
+def print_rows(rows: list[dict[str, Any]], baseline: Optional[dict[tuple[str, int], dict[str, Any]]] = None) -> None:
+    header = f"{'scenario':<20}{'conc':>5}{'reqs':>7}{'ok rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'lag avg':>9}{'lag p99':>9}{'rss MB':>8}  statuses"
+    print(header)
+    for r in rows:
+        rss = f"{r['rss_mb']:.0f}" if r["rss_mb"] is not None else "n/a"
+        statuses = ",".join(f"{k}:{v}" for k, v in sorted(r["statuses"].items()))
+        line = (
+            f"{r['scenario']:<20}{r['concurrency']:>5}{r['requests']:>7}{r['ok_rps']:>9.1f}{r['p50_ms']:>9.1f}"
+            f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['loop_lag_mean_ms']:>9.2f}{r['loop_lag_p99_ms']:>9.1f}{rss:>8}  {statuses}"
+        )
+        base = (baseline or {}).get((r["scenario"], r["concurrency"]))
+        if base:
+            line += f"   vs baseline: rps {r['ok_rps'] / max(base['ok_rps'], 1e-9) - 1:+.0%}, p95 {r['p95_ms'] / max(base['p95_ms'], 1e-9) - 1:+.0%}"
+        print(line)
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scenarios", default=",".join(ALL_SCENARIOS), help="comma-separated, see above")
+    ap.add_argument("--levels", default="1,4,16,64", help="concurrency levels to sweep")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    ap.add_argument("--warmup", type=int, default=3, help="requests per scenario before measuring")
+    ap.add_argument("--model-latency-ms", type=float, default=50.0, help="fake Gemini latency per call")
+    ap.add_argument("--images", type=int, default=8, help="distinct images behind /img")
+    ap.add_argument("--port", type=int, default=8740, help="first port; the harness uses four")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra env for the apps")
+    ap.add_argument("--json", help="write results here")
+    ap.add_argument("--compare", help="earlier --json output to diff against")
+    args = ap.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in ALL_SCENARIOS]
+    if unknown:
+        ap.error(f"unknown scenario(s): {', '.join(unknown)}")
+    levels = [int(x) for x in args.levels.split(",")]
+
+    fake_images = FakeImages(args.images)
+    image_base = await fake_images.start(args.port)
+    model = FakeGemini(args.model_latency_ms, image_base=image_base, images=args.images)
+    model_base = await model.start(args.port + 1)
+
+    tmp = Path(tempfile.mkdtemp(prefix="loadtest-"))
+    env = {
+        **os.environ,
+        "GOOGLE_GEMINI_BASE_URL": model_base,
+        "GOOGLE_API_KEY": "offline-load-test",
+        "GOOGLE_GENAI_USE_VERTEXAI": "false",
+        "GOOGLE_CSE_ID": "",
+        "GOOGLE_SEARCH_API_KEY": "",
+        "HEADLESS": "1",
+        "IMG_CACHE_DIR": str(tmp / "img"),
+        "GATEWAY_PRELOAD": "all",
+        "PYTHONUNBUFFERED": "1",
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    apps: dict[str, App] = {}
+    rows: list[dict[str, Any]] = []
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=max(levels) + 8, max_keepalive_connections=max(levels) + 8)
+    try:
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            for i, target in enumerate(sorted({s.split(":")[0] for s in scenarios})):
+                apps[target] = App(target, args.port + 2 + i, env, tmp)
+            for app in apps.values():
+                await app.wait_ready(client)
+            for scenario in scenarios:
+                app = apps[scenario.split(":")[0]]
+                for _ in range(args.warmup):
+                    method, path, body = make_request(scenario, next(counter), image_base, args.images)
+                    await client.request(method, app.base + path, json=body)
+                for level in levels:
+                    row = await run_level(client, app, scenario, level, args.duration, counter, image_base, args.images)
+                    rows.append(row)
+                    print(f"{scenario} x{level}: {row['requests']} requests, p95 {row['p95_ms']:.0f} ms", flush=True)
+    finally:
+        for app in apps.values():
+            app.stop()
+        await model.close()
+        await fake_images.close()
+
+    baseline = None
+    if args.compare:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.loads(Path(args.compare).read_text())["results"]}
+    print()
+    print(f"fake model: {model.calls} calls ({model.stream_calls} streamed), {args.model_latency_ms:g} ms each; image host hits: {fake_images.hits}")
+    print_rows(rows, baseline)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "results": rows}, indent=2))
+        print(f"Wrote {args.json}")
+    print(f"App logs: {tmp}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,20 +3,28 @@ from __future__ import annotations
 # Thin wrapper to expose root_agent from the packaged implementation.
 # The root FastAPI app loads this file by path.
 from pathlib import Path
+import importlib
 import importlib.util
 import logging
+import sys
 
 logger = logging.getLogger(__name__)
-_IMPL = Path(__file__).parent.parent / "Agentic-Tools" / "brand-SEO" / "agent.py"
+_PKG = Path(__file__).parent.parent / "Agentic-Tools" / "brand-SEO"
 
 root_agent = None
 try:
-    spec = importlib.util.spec_from_file_location("brand_seo_impl", _IMPL)
+    # Load as a package so the implementation's relative imports resolve
+    spec = importlib.util.spec_from_file_location(
+        "brand_seo_impl", _PKG / "__init__.py", submodule_search_locations=[str(_PKG)]
+    )
     if spec and spec.loader:
         mod = importlib.util.module_from_spec(spec)
+        sys.modules["brand_seo_impl"] = mod
         spec.loader.exec_module(mod)  # type: ignore[attr-defined]
-        root_agent = getattr(mod, "root_agent", None)
+        impl = importlib.import_module("brand_seo_impl.agent")
+        root_agent = getattr(impl, "root_agent", None)
     else:
-        logger.error("Failed to load spec for %s", _IMPL)
+        logger.error("Failed to load spec for %s", _PKG)
 except Exception:  # pragma: no cover
-    logger.exception("Failed to import brand-SEO implementation from %s", _IMPL)
+    sys.modules.pop("brand_seo_impl", None)
+    logger.exception("Failed to import brand-SEO implementation from %s", _PKG)
@@ -0,0 +1 @@
+# Helpers for the root FastAPI gateway (main.py)
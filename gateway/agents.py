@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Optional
+
+logger = logging.getLogger("adk_practice.web.agents")
+
+
+def load_module(path: Path, name: str) -> ModuleType:
+    """Execute a Python file as a module (folders may contain hyphens).
+
+    If ``path`` is a package ``__init__.py`` the module is registered as a
+    package so its relative imports resolve.
+    """
+    is_package = path.name == "__init__.py"
+    spec = importlib.util.spec_from_file_location(
+        name, path, submodule_search_locations=[str(path.parent)] if is_package else None
+    )
+    if not spec or not spec.loader:
+        raise ImportError(f"Failed to load spec for {path}")
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    try:
+        spec.loader.exec_module(mod)
+    except BaseException:
+        sys.modules.pop(name, None)
+        raise
+    return mod
+
+
+class _TimedLoader:
+    """Loader proxy that times exec_module for one module."""
+
+    def __init__(self, profiler: "ImportProfiler", loader: Any):
+        self._profiler = profiler
+        self._loader = loader
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._loader, item)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        self._profiler._enter()
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit(module.__name__, time.perf_counter() - started)
+            # Hand the real loader back so nothing downstream sees the proxy
+            if module.__spec__ is not None:
+                module.__spec__.loader = self._loader
+            module.__loader__ = self._loader
+
+
+class ImportProfiler:
+    """Meta path hook recording how long each newly imported module takes.
+
+    Only active inside ``with profiler:``. ``self_ms`` excludes time spent in
+    nested imports, like ``python -X importtime``. Imports made by other
+    threads during the window are attributed here too, so treat the numbers as
+    a cold-start guide rather than an exact profile.
+    """
+
+    def __init__(self) -> None:
+        self.timings: dict[str, dict[str, float]] = {}
+        self._local = threading.local()
+
+    def __enter__(self) -> "ImportProfiler":
+        sys.meta_path.insert(0, self)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        try:
+            sys.meta_path.remove(self)
+        except ValueError:
+            pass
+
+    def find_spec(self, fullname: str, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(self, spec.loader)
+                return spec
+        return None
+
+    def _enter(self) -> None:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+
+    def _exit(self, name: str, elapsed: float) -> None:
+        stack = self._local.stack
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.timings[name] = {
+            "ms": round(elapsed * 1000, 2),
+            "self_ms": round((elapsed - children) * 1000, 2),
+        }
+
+    def top(self, limit: int = 15) -> list[dict[str, Any]]:
+        rows = sorted(self.timings.items(), key=lambda kv: kv[1]["self_ms"], reverse=True)
+        return [{"module": name, **t} for name, t in rows[:limit]]
+
+
+class AgentLoader:
+    """Loads each mode's root_agent on first use instead of at import time.
+
+    ``sources`` maps a mode to candidate files (first existing one wins) and
+    the module name to load it under.
+    """
+
+    def __init__(self, sources: dict[str, tuple[list[Path], str]], profile_imports: bool = True):
+        self.sources = sources
+        self.profile_imports = profile_imports
+        self._agents: dict[str, Any] = {}
+        self._errors: dict[str, str] = {}
+        self._reports: dict[str, dict[str, Any]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def path_for(self, mode: str) -> Optional[Path]:
+        candidates, _ = self.sources[mode]
+        return next((p for p in candidates if p.exists()), None)
+
+    def modes(self) -> list[str]:
+        """Modes whose agent file exists (loaded or not)."""
+        return [m for m in self.sources if self.path_for(m) is not None]
+
+    def loaded(self) -> dict[str, Any]:
+        return dict(self._agents)
+
+    async def get(self, mode: str) -> Any:
+        """Return the root agent for a mode, importing it on first use.
+
+        Raises LookupError for unknown modes and RuntimeError if loading failed.
+        """
+        agent = self._agents.get(mode)
+        if agent is not None:
+            return agent
+        if mode not in self.sources:
+            raise LookupError(mode)
+        lock = self._locks.setdefault(mode, asyncio.Lock())
+        async with lock:
+            if mode not in self._agents:
+                # Imports block for seconds (Selenium, ADK trees); keep the loop responsive
+                await asyncio.to_thread(self._load, mode)
+        agent = self._agents.get(mode)
+        if agent is None:
+            raise RuntimeError(self._errors.get(mode) or f"Failed to load agent for {mode}")
+        return agent
+
+    def _load(self, mode: str) -> None:
+        path = self.path_for(mode)
+        _, module_name = self.sources[mode]
+        if path is None:
+            self._errors[mode] = f"agent file not found for {mode}"
+            logger.info("%s agent file not found", mode)
+            return
+        profiler = ImportProfiler()
+        before = set(sys.modules)
+        started = time.perf_counter()
+        root = None
+        try:
+            if self.profile_imports:
+                with profiler:
+                    mod = load_module(path, module_name)
+            else:
+                mod = load_module(path, module_name)
+            root = getattr(mod, "root_agent", None)
+            if root is None:
+                self._errors[mode] = f"root_agent not found in {path}"
+                logger.warning("%s root_agent not found in %s", mode, path)
+        except Exception as e:
+            self._errors[mode] = f"{type(e).__name__}: {e}"
+            logger.exception("Failed to load %s agent", mode)
+        elapsed = time.perf_counter() - started
+        self._reports[mode] = {
+            "path": str(path),
+            "ok": root is not None,
+            "load_ms": round(elapsed * 1000, 2),
+            "new_modules": len(set(sys.modules) - before),
+            "slowest_modules": profiler.top(),
+        }
+        if root is not None:
+            self._agents[mode] = root
+            self._errors.pop(mode, None)
+            logger.info("Loaded %s agent in %.0f ms", mode, elapsed * 1000)
+
+    def report(self) -> dict[str, Any]:
+        """Import cost per mode; modes not yet requested show as not loaded."""
+        out: dict[str, Any] = {}
+        for mode in self.sources:
+            if mode in self._reports:
+                out[mode] = dict(self._reports[mode], error=self._errors.get(mode))
+            else:
+                out[mode] = {"loaded": False, "available": self.path_for(mode) is not None}
+        return out
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import base64
+import json
+import re
+from typing import Any, Optional
+
+from google.adk.events import Event
+
+_FENCE_RE = re.compile(r"```json\s*([\s\S]*?)```", re.IGNORECASE)
+_MD_IMAGE_RE = re.compile(r"!\[[^\]]*\]\((https?[^\s)]+)\)")
+_URL_RE = re.compile(r"https?://[^\s)\]\"'<>`]+")
+_IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+_HTML_ATTRS = ("rendered_content", "renderedContent", "html")
+_PRODUCT_KEYS = ("item_number", "sku", "product_url", "url", "title")
+
+
+def is_image_url(url: str) -> bool:
+    return url.lower().split("?", 1)[0].endswith(_IMAGE_EXTS)
+
+
+def _product_key(product: dict[str, Any]) -> Optional[str]:
+    for field in _PRODUCT_KEYS:
+        value = product.get(field)
+        if isinstance(value, str) and value.strip():
+            return f"{field}:{value.strip().lower()}"
+    return None
+
+
+def _part_html(part: Any) -> list[str]:
+    out = []
+    for attr in _HTML_ATTRS:
+        h = getattr(part, attr, None)
+        if isinstance(h, str) and h:
+            out.append(h)
+    inline = getattr(part, "inline_data", None)
+    if inline is not None and getattr(inline, "mime_type", None) in ("text/html", "application/html"):
+        data = getattr(inline, "data", None)
+        try:
+            if isinstance(data, (bytes, bytearray)):
+                out.append(data.decode("utf-8", errors="ignore"))
+            elif isinstance(data, str) and data:
+                # Some SDKs base64-encode inline data to str
+                out.append(base64.b64decode(data).decode("utf-8", errors="ignore"))
+        except Exception:
+            pass  # undecodable inline data: fall back on text only
+    return out
+
+
+class EventAggregator:
+    """Folds a run's events into one answer as they arrive, keeping only what it needs.
+
+    Every non-partial, non-user event is scanned once: JSON fences for
+    ``products`` / ``page_urls``, markdown images and bare URLs, with products,
+    URLs and images deduplicated on the fly and capped. ``text`` and ``html``
+    are those of the latest event that had any, which is what the old
+    "last model event" extraction returned, but output from earlier sub-agents
+    (e.g. shop_agent's products in the e-commerce loop) is no longer lost.
+    Per-agent summaries keep counts and a short excerpt instead of the events.
+    """
+
+    def __init__(self, max_products: int = 200, max_urls: int = 200, max_images: int = 100, excerpt_chars: int = 500):
+        self.max_products = max_products
+        self.max_urls = max_urls
+        self.max_images = max_images
+        self.excerpt_chars = excerpt_chars
+        self.text = ""
+        self.html = ""
+        self.products: dict[str, dict[str, Any]] = {}
+        self.page_urls: dict[str, None] = {}  # insertion-ordered set
+        self.images: dict[str, None] = {}
+        self.agents: dict[str, dict[str, Any]] = {}
+        self.events = 0
+        self.dropped = 0  # items over the caps
+
+    def add(self, event: Event) -> None:
+        if event.partial or not event.author or event.author == "user":
+            return
+        self.events += 1
+        parts = event.content.parts if event.content and event.content.parts else []
+        texts: list[str] = []
+        htmls: list[str] = []
+        for part in parts:
+            if isinstance(part.text, str) and part.text and not part.thought:
+                texts.append(part.text)
+                self._scan(part.text)
+            htmls.extend(_part_html(part))
+        if not texts and not htmls:
+            return
+        text = "\n".join(texts).strip()
+        self.text, self.html = text, "\n".join(htmls).strip()
+        summary = self.agents.setdefault(event.author, {"events": 0, "chars": 0, "excerpt": ""})
+        summary["events"] += 1
+        summary["chars"] += len(text)
+        if text:
+            summary["excerpt"] = text[: self.excerpt_chars]
+
+    def _scan(self, text: str) -> None:
+        for fence in _FENCE_RE.findall(text):
+            try:
+                obj = json.loads(fence)
+            except ValueError:
+                continue
+            products = obj if isinstance(obj, list) else obj.get("products") if isinstance(obj, dict) else None
+            for product in products if isinstance(products, list) else ():
+                if isinstance(product, dict):
+                    self._add_product(product)
+            if isinstance(obj, dict):
+                for url in obj.get("page_urls") or ():
+                    if isinstance(url, str):
+                        self._add(self.page_urls, url, self.max_urls)
+        for url in _MD_IMAGE_RE.findall(text):
+            self._add(self.images, url, self.max_images)
+        for url in _URL_RE.findall(text):
+            url = url.rstrip(".,;:")
+            if is_image_url(url):
+                self._add(self.images, url, self.max_images)
+            else:
+                self._add(self.page_urls, url, self.max_urls)
+
+    def _add(self, seen: dict[str, None], item: str, cap: int) -> None:
+        if item in seen:
+            return
+        if len(seen) >= cap:
+            self.dropped += 1
+            return
+        seen[item] = None
+
+    def _add_product(self, product: dict[str, Any]) -> None:
+        key = _product_key(product) or json.dumps(product, sort_keys=True, default=str)
+        existing = self.products.get(key)
+        if existing is not None:
+            # A later iteration may fill in fields (price, rating) the first one lacked
+            for field, value in product.items():
+                if value not in (None, "", []) and existing.get(field) in (None, "", []):
+                    existing[field] = value
+            return
+        if len(self.products) >= self.max_products:
+            self.dropped += 1
+            return
+        self.products[key] = dict(product)
+
+    def result(self) -> dict[str, Any]:
+        return {
+            "text": self.text,
+            "html": self.html,
+            "images": list(self.images),
+            "products": list(self.products.values()),
+            "page_urls": list(self.page_urls),
+        }
+
+    def summary(self) -> dict[str, Any]:
+        return {"events": self.events, "agents": self.agents, "dropped": self.dropped}
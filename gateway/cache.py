@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger("adk_practice.web.cache")
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, Unicode forms and whitespace so near-identical questions share a key."""
+    q = unicodedata.normalize("NFKC", query).casefold()
+    q = _WS.sub(" ", q).strip()
+    return q.strip(" ?!.")
+
+
+def cache_key(mode: str, query: str, version: str) -> str:
+    raw = json.dumps([mode, normalize_query(query), version], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU with TTL; fine for a single worker."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        stored_at, value = item
+        age = time.time() - stored_at
+        if age > self.ttl:
+            del self._data[key]
+            self.evictions += 1
+            return None
+        self._data.move_to_end(key)
+        return value, age
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """On-disk LRU with TTL shared by every worker on the host (WAL mode)."""
+
+    blocking = True
+
+    def __init__(self, path: str | Path, max_entries: int = 10000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)")
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if now - stored_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.evictions += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value), now - stored_at
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            cur = self._conn.execute("DELETE FROM responses WHERE stored_at < ?", (now - self.ttl,))
+            self.evictions += max(cur.rowcount, 0)
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                cur = self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self.evictions += max(cur.rowcount, 0)
+
+    def size(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return count
+
+
+class ResponseCache:
+    """Async front for a cache backend, with hit/miss counters."""
+
+    def __init__(self, backend: MemoryBackend | SQLiteBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def _call(self, fn, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get(self, key: str) -> Optional[tuple[Any, float]]:
+        """Return (value, age_seconds) or None."""
+        try:
+            found = await self._call(self.backend.get, key)
+        except Exception:
+            logger.exception("Cache lookup failed")
+            found = None
+        if found is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return found
+
+    async def set(self, key: str, value: Any) -> None:
+        try:
+            await self._call(self.backend.set, key, value)
+        except Exception:
+            logger.exception("Cache store failed")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "ttl_s": self.backend.ttl,
+            "max_entries": self.backend.max_entries,
+        }
+
+
+class SWRCache:
+    """In-process LRU for idempotent lookups with stale-while-revalidate.
+
+    An entry is fresh for ``ttl`` seconds and is returned as is ("hit").
+    For ``swr`` seconds after that it is still returned at once ("stale"),
+    and one background refresh replaces it. Older entries are fetched in
+    line ("miss"), and concurrent misses for one key share a single fetch.
+    When that fetch fails and ``serve_stale(error)`` allows it, an entry up
+    to ``stale_if_error`` seconds old is returned instead ("stale_if_error").
+
+    Entries are tagged with a dataset. ``invalidate(dataset)`` drops them and
+    also discards refreshes that were already in flight, so an older answer
+    cannot reappear after a catalog update.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl: float = 60.0,
+        swr: float = 300.0,
+        stale_if_error: float = 3600.0,
+        serve_stale: Callable[[BaseException], bool] = lambda e: True,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.swr = swr
+        self.stale_if_error = stale_if_error
+        self.serve_stale = serve_stale
+        # key -> (stored_at, dataset, value)
+        self._data: OrderedDict[str, tuple[float, str, Any]] = OrderedDict()
+        # bumped by invalidate(); a fetch started under an older generation is not stored
+        self._epoch = 0
+        self._generation: dict[str, int] = {}
+        self._inflight: dict[str, tuple[str, asyncio.Task]] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self.counts = {"hit": 0, "stale": 0, "miss": 0, "stale_if_error": 0}
+        self.coalesced = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+        self.invalidated = 0
+
+    @property
+    def keep_seconds(self) -> float:
+        return max(self.ttl + self.swr, self.stale_if_error)
+
+    def _lookup(self, key: str) -> Optional[tuple[Any, float]]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        age = time.time() - item[0]
+        if age > self.keep_seconds:
+            del self._data[key]
+            self.evictions += 1
+            return None
+        self._data.move_to_end(key)
+        return item[2], age
+
+    def _store(self, key: str, dataset: str, value: Any) -> None:
+        self._data[key] = (time.time(), dataset, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _gen(self, dataset: str) -> tuple[int, int]:
+        return self._epoch, self._generation.get(dataset, 0)
+
+    async def _fetch(self, key: str, dataset: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            generation = self._gen(dataset)
+
+            async def run() -> Any:
+                try:
+                    value = await fetch()
+                    if self._gen(dataset) == generation:  # not invalidated meanwhile
+                        self._store(key, dataset, value)
+                    return value
+                finally:
+                    if self._inflight.get(key, (None, None))[1] is asyncio.current_task():
+                        del self._inflight[key]
+
+            # Detached, so a caller that goes away does not cancel it for the others
+            flight = self._inflight[key] = (dataset, asyncio.create_task(run()))
+            flight[1].add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(flight[1])
+
+    async def _refresh(self, key: str, dataset: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        self.refreshes += 1
+        try:
+            await self._fetch(key, dataset, fetch)
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning("Background refresh failed: %s", e)
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_fetch(self, key: str, dataset: str, fetch: Callable[[], Awaitable[Any]]) -> tuple[Any, str, float]:
+        """Return (value, state, age_seconds); state is a key of ``counts``."""
+        found = self._lookup(key)
+        if found is not None:
+            value, age = found
+            if age <= self.ttl:
+                self.counts["hit"] += 1
+                return value, "hit", age
+            if age <= self.ttl + self.swr:
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, dataset, fetch))
+                self.counts["stale"] += 1
+                return value, "stale", age
+        try:
+            value = await self._fetch(key, dataset, fetch)
+        except Exception as e:
+            if found is None or found[1] > self.stale_if_error or not self.serve_stale(e):
+                raise
+            self.counts["stale_if_error"] += 1
+            return found[0], "stale_if_error", found[1]
+        self.counts["miss"] += 1
+        return value, "miss", 0.0
+
+    def invalidate(self, dataset: Optional[str] = None) -> int:
+        """Drop the entries of ``dataset`` (every entry when None); returns how many."""
+        if dataset is None:
+            dropped = len(self._data)
+            self._data.clear()
+            self._epoch += 1
+        else:
+            keys = [k for k, (_, d, _) in self._data.items() if d == dataset]
+            for k in keys:
+                del self._data[k]
+            dropped = len(keys)
+            self._generation[dataset] = self._generation.get(dataset, 0) + 1
+        # later callers start a fresh fetch instead of joining one from before the update
+        for key, (name, _) in list(self._inflight.items()):
+            if dataset is None or name == dataset:
+                del self._inflight[key]
+        self.invalidated += dropped
+        return dropped
+
+    async def close(self) -> None:
+        for task in [*self._refreshing.values(), *(t for _, t in self._inflight.values())]:
+            task.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self.counts,
+            "entries": len(self._data),
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "evictions": self.evictions,
+            "invalidated": self.invalidated,
+            "ttl_s": self.ttl,
+            "swr_s": self.swr,
+            "stale_if_error_s": self.stale_if_error,
+            "max_entries": self.max_entries,
+        }
+
+
+def cache_from_env() -> Optional[ResponseCache]:
+    """Build the cache selected by GATEWAY_CACHE ("memory" | "sqlite"); None when unset."""
+    kind = os.getenv("GATEWAY_CACHE", "").strip().lower()
+    if kind in ("", "0", "off", "none", "false"):
+        return None
+    ttl = float(os.getenv("GATEWAY_CACHE_TTL", "300"))
+    max_entries = int(os.getenv("GATEWAY_CACHE_MAX_ENTRIES", "1000"))
+    if kind == "memory":
+        return ResponseCache(MemoryBackend(max_entries=max_entries, ttl=ttl))
+    if kind == "sqlite":
+        path = os.getenv("GATEWAY_CACHE_PATH", ".cache/responses.sqlite3")
+        return ResponseCache(SQLiteBackend(path, max_entries=max_entries, ttl=ttl))
+    logger.warning("Unknown GATEWAY_CACHE=%r; response cache disabled", kind)
+    return None
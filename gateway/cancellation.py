@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional
+
+from fastapi import Request
+
+from gateway.metrics import MetricsRegistry
+
+logger = logging.getLogger("adk_practice.web.cancellation")
+
+
+class ClientGone(Exception):
+    """The HTTP client disconnected before its answer was ready."""
+
+
+async def _disconnected(request: Request) -> None:
+    # The body is already read, so the next ASGI message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def wait_for_client(request: Request, aw: Awaitable[Any], timeout: Optional[float]) -> Any:
+    """Await ``aw`` while watching the client.
+
+    Raises ClientGone when the client disconnects first and TimeoutError once
+    ``timeout`` seconds pass. Either way ``aw`` is cancelled; callers decide
+    whether the work behind it (e.g. a shared run) should stop too.
+    """
+    waiter = asyncio.ensure_future(aw)
+    gone = asyncio.create_task(_disconnected(request))
+    try:
+        done, _ = await asyncio.wait({waiter, gone}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        waiter.cancel()
+        raise
+    finally:
+        gone.cancel()
+    if waiter in done:
+        return waiter.result()
+    waiter.cancel()
+    if gone in done:
+        raise ClientGone()
+    raise asyncio.TimeoutError()
+
+
+class RunCost:
+    """Typical cost of a finished run per mode, and what cancelled runs did not spend.
+
+    Completed runs feed an EWMA of wall time and model calls. When a run is
+    cancelled (client gone, deadline passed) the remainder of that typical cost
+    is counted as avoided, together with the tool calls it aborted:
+
+    - gateway_runs_cancelled_total{mode,reason,stage}: stage "queued" never
+      reached the model, "running" was stopped part way
+    - gateway_avoided_run_seconds_total{mode}, gateway_avoided_llm_calls_total{mode}:
+      estimates from the EWMA (nothing is counted before a run has finished)
+    - gateway_aborted_tool_calls_total{mode}: tool calls in flight at cancel time
+    """
+
+    def __init__(self, registry: MetricsRegistry, alpha: float = 0.2):
+        self.alpha = alpha
+        self._seconds: dict[str, float] = {}
+        self._llm_calls: dict[str, float] = {}
+        self.cancelled = registry.counter(
+            "gateway_runs_cancelled_total", "Agent runs cancelled because nobody was waiting any more.", ["mode", "reason", "stage"]
+        )
+        self.avoided_seconds = registry.counter(
+            "gateway_avoided_run_seconds_total", "Estimated agent run time not spent thanks to cancellation.", ["mode"]
+        )
+        self.avoided_llm_calls = registry.counter(
+            "gateway_avoided_llm_calls_total", "Estimated model calls not made thanks to cancellation.", ["mode"]
+        )
+        self.aborted_tools = registry.counter(
+            "gateway_aborted_tool_calls_total", "Tool calls in flight when their run was cancelled.", ["mode"]
+        )
+
+    def finished(self, mode: str, seconds: float, llm_calls: int) -> None:
+        prev = self._seconds.get(mode)
+        a = self.alpha
+        self._seconds[mode] = seconds if prev is None else (1 - a) * prev + a * seconds
+        prev_calls = self._llm_calls.get(mode)
+        self._llm_calls[mode] = llm_calls if prev_calls is None else (1 - a) * prev_calls + a * llm_calls
+
+    def cancelled_run(self, mode: str, reason: str, started: bool, seconds: float, llm_calls: int, pending_tools: int) -> None:
+        self.cancelled.inc(mode=mode, reason=reason, stage="running" if started else "queued")
+        if pending_tools:
+            self.aborted_tools.inc(pending_tools, mode=mode)
+        typical_seconds = self._seconds.get(mode)
+        if typical_seconds is not None:
+            self.avoided_seconds.inc(max(0.0, typical_seconds - seconds), mode=mode)
+            self.avoided_llm_calls.inc(max(0.0, self._llm_calls[mode] - llm_calls), mode=mode)
+        logger.info("Cancelled %s run (%s) after %.2fs, %d model calls", mode, reason, seconds, llm_calls)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            mode: {
+                "run_s_ewma": round(self._seconds[mode], 3),
+                "llm_calls_ewma": round(self._llm_calls[mode], 2),
+            }
+            for mode in self._seconds
+        }
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import logging
+import os
+import zlib
+from typing import Any, Optional
+
+try:  # Optional: brotli compresses text ~15-25% smaller than gzip at similar speed
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    try:
+        import brotlicffi as brotli  # type: ignore[no-redef]
+    except ImportError:
+        brotli = None
+
+from gateway.metrics import MetricsRegistry
+
+logger = logging.getLogger("adk_practice.web.compression")
+
+# Already compressed, or must reach the client frame by frame
+_SKIP_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip", "text/event-stream", "application/x-ndjson")
+
+
+def negotiate(accept_encoding: str, available: tuple[str, ...]) -> Optional[str]:
+    """Pick the best encoding from an Accept-Encoding header, or None for identity.
+
+    Honours q-values (``gzip;q=0`` excludes gzip) and ``*``; ties go to the
+    order of ``available``.
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for enc in available:
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class _Encoder:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._z = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data) if data else b""
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._z.compress(data)
+        return out + self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: gzip or brotli for responses of at least ``minimum_size`` bytes.
+
+    The encoding is negotiated from Accept-Encoding (brotli first when the
+    optional package is installed). Small bodies, images, SSE and NDJSON
+    streams, range responses and responses that already carry a
+    Content-Encoding go out untouched. Bodies sent in several chunks are
+    compressed chunk by chunk with a flush, so streaming still streams.
+    With a ``registry``, bytes before and after compression are counted per
+    encoding.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        minimum_size: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None,
+        registry: Optional[MetricsRegistry] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("GATEWAY_COMPRESS_MIN_BYTES", "1024"))
+        self.gzip_level = gzip_level if gzip_level is not None else int(os.getenv("GATEWAY_GZIP_LEVEL", "6"))
+        self.brotli_quality = brotli_quality if brotli_quality is not None else int(os.getenv("GATEWAY_BROTLI_QUALITY", "5"))
+        self.encodings: tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+        self._bytes = None
+        if registry is not None:
+            self._bytes = registry.get("http_compression_bytes_total") or registry.counter(
+                "http_compression_bytes_total", "Response bytes before (raw) and after (sent) compression.", ["encoding", "kind"]
+            )
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or self.minimum_size <= 0:
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope.get("headers") or ():
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def wrapped_send(message: dict) -> None:
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message  # held until the first body chunk decides
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+
+            if encoder is None:
+                if not self._compressible(start, body, more):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality)
+                headers = [(k, v) for k, v in start.get("headers", ()) if k not in (b"content-length", b"vary")]
+                vary = [v for k, v in start.get("headers", ()) if k == b"vary"]
+                headers.append((b"content-encoding", encoding.encode()))
+                headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+                out = encoder.compress(body, final=not more)
+                if not more:
+                    headers.append((b"content-length", str(len(out)).encode()))
+                await send({**start, "headers": headers})
+            else:
+                out = encoder.compress(body, final=not more)
+            if self._bytes is not None:
+                self._bytes.inc(len(body), encoding=encoding, kind="raw")
+                self._bytes.inc(len(out), encoding=encoding, kind="sent")
+            await send({"type": "http.response.body", "body": out, "more_body": more})
+
+        await self.app(scope, receive, wrapped_send)
+
+    def _compressible(self, start: dict, body: bytes, more: bool) -> bool:
+        headers = dict(start.get("headers", ()))
+        if b"content-encoding" in headers or b"content-range" in headers or start["status"] in (204, 206, 304):
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+        if content_type.startswith(_SKIP_TYPES):
+            return False
+        # A declared length tells us the full size even when the body is chunked
+        declared = headers.get(b"content-length")
+        size = int(declared) if declared else (len(body) if not more else self.minimum_size)
+        return size >= self.minimum_size
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+logger = logging.getLogger("adk_practice.web.concurrency")
+
+
+def parse_mode_map(raw: str | None) -> dict[str, int]:
+    """Parse "brand-seo=2,ecommerce=8" into {"brand-seo": 2, "ecommerce": 8}.
+
+    Malformed entries are logged and skipped.
+    """
+    out: dict[str, int] = {}
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        mode, sep, value = item.partition("=")
+        try:
+            if not sep:
+                raise ValueError(item)
+            out[mode.strip().lower()] = int(value)
+        except ValueError:
+            logger.warning("Ignoring malformed per-mode setting: %r", item)
+    return out
+
+
+# Lower rank is admitted first; unknown names count as "normal"
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when a mode is saturated.
+
+    ``status`` is 429 when the wait queue is full and 503 when the request
+    could not (or would not) start within its queue deadline.
+    """
+
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ModeQueue:
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.running = 0
+        self.queued = 0
+        self.waiters: list[tuple[int, int, asyncio.Future]] = []
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.timed_out = 0
+        self.waits_ms: deque[float] = deque(maxlen=512)
+        self.run_s: Optional[float] = None  # EWMA of run duration
+
+    def ahead_of(self, rank: int) -> int:
+        return sum(1 for r, _, fut in self.waiters if r <= rank and not fut.done())
+
+
+class AdmissionScheduler:
+    """Admission control in front of agent runs, per mode.
+
+    Each mode runs at most ``limit`` agents at once (GATEWAY_CONCURRENCY=
+    "brand-seo=2,ecommerce=8", else GATEWAY_CONCURRENCY_DEFAULT=8; 0 or less
+    means unlimited). Extra requests wait in a bounded priority queue
+    (GATEWAY_QUEUE / GATEWAY_QUEUE_DEFAULT=32 entries) for at most
+    GATEWAY_QUEUE_TIMEOUT seconds (30). A full queue raises ``Overloaded(429)``
+    straight away; a request that times out, or whose estimated wait already
+    exceeds its deadline, raises ``Overloaded(503)``. Both carry a Retry-After
+    estimate from the recent run time.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, int] | None = None,
+        default: int | None = None,
+        queue_limits: dict[str, int] | None = None,
+        queue_default: int | None = None,
+        queue_timeout: float | None = None,
+    ):
+        self.limits = limits if limits is not None else parse_mode_map(os.getenv("GATEWAY_CONCURRENCY"))
+        self.default = default if default is not None else int(os.getenv("GATEWAY_CONCURRENCY_DEFAULT", "8"))
+        self.queue_limits = queue_limits if queue_limits is not None else parse_mode_map(os.getenv("GATEWAY_QUEUE"))
+        self.queue_default = queue_default if queue_default is not None else int(os.getenv("GATEWAY_QUEUE_DEFAULT", "32"))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.getenv("GATEWAY_QUEUE_TIMEOUT", "30"))
+        self._queues: dict[str, _ModeQueue] = {}
+        self._seq = itertools.count()
+
+    def limit(self, mode: str) -> int:
+        return self.limits.get(mode, self.default)
+
+    def _queue(self, mode: str) -> _ModeQueue:
+        q = self._queues.get(mode)
+        if q is None:
+            q = self._queues[mode] = _ModeQueue(self.limit(mode), self.queue_limits.get(mode, self.queue_default))
+        return q
+
+    def _estimate_wait(self, q: _ModeQueue, ahead: int) -> Optional[float]:
+        """Seconds until a request with ``ahead`` waiters in front of it starts; None before any run finished."""
+        if q.run_s is None or q.limit <= 0:
+            return None
+        return (ahead // q.limit + 1) * q.run_s
+
+    def _retry_after(self, q: _ModeQueue, ahead: int) -> int:
+        est = self._estimate_wait(q, ahead)
+        return max(1, math.ceil(est if est is not None else 1))
+
+    def _release(self, q: _ModeQueue) -> None:
+        # Hand the slot straight to the best live waiter, so newcomers cannot barge in
+        while q.waiters:
+            _, _, fut = heapq.heappop(q.waiters)
+            if not fut.done():
+                q.queued -= 1
+                fut.set_result(None)
+                return
+        q.running -= 1
+
+    def _displace(self, mode: str, q: _ModeQueue, rank: int) -> bool:
+        """Reject the newest, lowest-priority waiter if it ranks below ``rank``."""
+        live = [w for w in q.waiters if not w[2].done()]
+        if not live:
+            return False
+        victim = max(live, key=lambda w: (w[0], w[1]))
+        if victim[0] <= rank:
+            return False
+        q.queued -= 1
+        q.rejected_full += 1
+        victim[2].set_exception(Overloaded(429, f"{mode} queue is full", self._retry_after(q, q.queued)))
+        return True
+
+    async def _acquire(self, mode: str, q: _ModeQueue, rank: int, timeout: float) -> None:
+        if q.running < q.limit and not q.queued:
+            q.running += 1
+            return
+        ahead = q.ahead_of(rank)
+        if q.queued >= q.max_queue and not self._displace(mode, q, rank):
+            q.rejected_full += 1
+            raise Overloaded(429, f"{mode} queue is full", self._retry_after(q, ahead))
+        est = self._estimate_wait(q, ahead)
+        if est is not None and est > timeout:
+            q.rejected_deadline += 1
+            raise Overloaded(503, f"{mode} cannot start within {timeout:g}s", self._retry_after(q, ahead))
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(q.waiters, (rank, next(self._seq), fut))
+        q.queued += 1
+        try:
+            await asyncio.wait({fut}, timeout=timeout)
+        except asyncio.CancelledError:
+            if not fut.done():
+                fut.cancel()
+                q.queued -= 1
+            elif fut.exception() is None:
+                self._release(q)  # the slot was handed over just as we were cancelled
+            raise
+        if fut.done():
+            fut.result()  # raises Overloaded if a higher-priority request displaced us
+            return
+        fut.cancel()
+        q.queued -= 1
+        q.timed_out += 1
+        raise Overloaded(503, f"{mode} queue wait exceeded {timeout:g}s", self._retry_after(q, q.ahead_of(rank)))
+
+    @asynccontextmanager
+    async def slot(self, mode: str, priority: str | None = None, timeout: float | None = None) -> AsyncIterator[None]:
+        """Hold one run slot for ``mode``, queueing by ``priority`` ("high" | "normal" | "low")."""
+        q = self._queue(mode)
+        rank = PRIORITIES.get((priority or "normal").lower(), PRIORITIES["normal"])
+        enqueued = time.monotonic()
+        if q.limit <= 0:
+            q.running += 1
+        else:
+            await self._acquire(mode, q, rank, self.queue_timeout if timeout is None else timeout)
+        started = time.monotonic()
+        q.admitted += 1
+        q.waits_ms.append((started - enqueued) * 1000)
+        cancelled = False
+        try:
+            yield
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # A cancelled run says nothing about how long runs take
+            if not cancelled:
+                elapsed = time.monotonic() - started
+                q.run_s = elapsed if q.run_s is None else 0.8 * q.run_s + 0.2 * elapsed
+            if q.limit <= 0:
+                q.running -= 1
+            else:
+                self._release(q)
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth and wait times per mode (for dashboards and autoscaling)."""
+        out: dict[str, Any] = {}
+        for mode, q in self._queues.items():
+            waits = sorted(q.waits_ms)
+            pct = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))], 1) if waits else 0.0  # noqa: E731
+            out[mode] = {
+                "limit": q.limit,
+                "running": q.running,
+                "queued": q.queued,
+                "max_queue": q.max_queue,
+                "admitted": q.admitted,
+                "rejected_full": q.rejected_full,
+                "rejected_deadline": q.rejected_deadline,
+                "timed_out": q.timed_out,
+                "wait_ms_p50": pct(0.5),
+                "wait_ms_p95": pct(0.95),
+                "run_ms_ewma": round(q.run_s * 1000, 1) if q.run_s is not None else None,
+            }
+        return {"queue_timeout_s": self.queue_timeout, "modes": out}
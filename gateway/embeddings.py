@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, Iterator, Optional
+
+import numpy as np
+
+# Optional: POSIX advisory lock so two processes do not append at once (single writer elsewhere)
+try:
+    import fcntl  # type: ignore
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger("adk_practice.web.embeddings")
+
+FORMAT = 1
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Rows dequantized per step while scoring; bounds the float32 scratch to CHUNK_ROWS * dim * 4 bytes
+CHUNK_ROWS = 4096
+
+
+def id_hashes(ids: list[str]) -> np.ndarray:
+    return np.frombuffer(
+        b"".join(hashlib.blake2b(i.encode("utf-8"), digest_size=8).digest() for i in ids), dtype=np.uint64
+    ).copy()
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """(stored matrix, per-row scales or None). int8 is symmetric per row: x ~= q * scale."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype != "int8":
+        return vectors.astype(DTYPES[dtype]), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.rint(vectors / scales[:, None]).clip(-127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def _memmap(path: Path, dtype: Any, shape: tuple[int, ...]) -> np.ndarray:
+    # np.memmap cannot map an empty file
+    if not shape[0]:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class Segment:
+    """One immutable append: quantized rows plus their ids, all memory-mapped.
+
+    Files (``<name>.<ext>``):
+    - vec: rows x dim matrix in the store dtype ("vectors" segments only)
+    - scale: float32 per row (int8 only)
+    - ids, idoff: UTF-8 ids back to back, and rows + 1 uint64 offsets into them
+    - hash, hrow: the ids' 64-bit hashes sorted, and the row of each (id -> row lookup)
+
+    A "delete" segment has ids and no vectors. Either kind hides the same ids
+    in older segments.
+    """
+
+    def __init__(self, root: Path, meta: dict[str, Any], dim: int, dtype: str):
+        self.name = meta["name"]
+        self.kind = meta.get("kind", "vectors")
+        self.rows = int(meta["rows"])
+        base = root / self.name
+        vec_rows = self.rows if self.kind == "vectors" else 0
+        self.vectors = _memmap(base.with_suffix(".vec"), DTYPES[dtype], (vec_rows, dim))
+        self.scales = _memmap(base.with_suffix(".scale"), np.float32, (vec_rows,)) if dtype == "int8" else None
+        self.offsets = _memmap(base.with_suffix(".idoff"), np.uint64, (self.rows + 1,))
+        id_size = int(self.offsets[-1]) if self.rows else 0
+        self.id_bytes = _memmap(base.with_suffix(".ids"), np.uint8, (id_size,))
+        self.hashes = _memmap(base.with_suffix(".hash"), np.uint64, (self.rows,))
+        self.hash_rows = _memmap(base.with_suffix(".hrow"), np.int64, (self.rows,))
+        # rows superseded by a newer segment; None while every row is current
+        self.dead: Optional[np.ndarray] = None
+
+    @staticmethod
+    def write(root: Path, name: str, ids: list[str], vectors: Optional[np.ndarray], dtype: str) -> dict[str, Any]:
+        base = root / name
+        encoded = [i.encode("utf-8") for i in ids]
+        offsets = np.zeros(len(ids) + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded], dtype=np.uint64)
+        base.with_suffix(".ids").write_bytes(b"".join(encoded))
+        offsets.tofile(base.with_suffix(".idoff"))
+        hashes = id_hashes(ids)
+        order = np.argsort(hashes, kind="stable")
+        hashes[order].tofile(base.with_suffix(".hash"))
+        order.astype(np.int64).tofile(base.with_suffix(".hrow"))
+        if vectors is not None:
+            data, scales = quantize(vectors, dtype)
+            data.tofile(base.with_suffix(".vec"))
+            if scales is not None:
+                scales.tofile(base.with_suffix(".scale"))
+        return {"name": name, "rows": len(ids), "kind": "vectors" if vectors is not None else "delete"}
+
+    def id_at(self, row: int) -> str:
+        return bytes(self.id_bytes[int(self.offsets[row]):int(self.offsets[row + 1])]).decode("utf-8")
+
+    def find(self, id_: str, h: Optional[np.uint64] = None) -> Optional[int]:
+        h = id_hashes([id_])[0] if h is None else h
+        i = int(np.searchsorted(self.hashes, h))
+        while i < self.rows and self.hashes[i] == h:
+            row = int(self.hash_rows[i])
+            if self.id_at(row) == id_:
+                return row
+            i += 1
+        return None
+
+    def vector(self, row: int) -> np.ndarray:
+        v = np.asarray(self.vectors[row], dtype=np.float32)
+        return v * self.scales[row] if self.scales is not None else v
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        out = np.empty(len(self.vectors), dtype=np.float32)
+        if self.vectors.dtype == np.float32:
+            np.matmul(self.vectors, query, out=out)
+        else:
+            # dequantize one cache-sized block at a time into a reused buffer
+            buffer = np.empty((min(CHUNK_ROWS, len(self.vectors)), self.vectors.shape[1]), dtype=np.float32)
+            for start in range(0, len(self.vectors), CHUNK_ROWS):
+                block = self.vectors[start:start + CHUNK_ROWS]
+                np.copyto(buffer[:len(block)], block, casting="unsafe")
+                np.matmul(buffer[:len(block)], query, out=out[start:start + len(block)])
+        if self.scales is not None:
+            out *= self.scales
+        if self.dead is not None:
+            out[self.dead] = -np.inf
+        return out
+
+
+class EmbeddingStore:
+    """Append-only on-disk embedding matrix, memory-mapped read-only.
+
+    A store is a directory: ``manifest.json`` plus one file set per segment
+    (see ``Segment``). Rows are stored as float32, float16 or int8 (per-row
+    scale). Because the segments are plain ``np.memmap`` files, every
+    process that opens the store (e.g. each uvicorn worker) shares one
+    copy in the OS page cache. Only per-row liveness flags are private.
+
+    ``append``/``delete`` write a new segment and then atomically replace the
+    manifest, so readers see either the old or the new set. An id written
+    again supersedes its older rows. ``refresh()`` picks up appends made by
+    another process, and ``compact()`` rewrites the live rows into one
+    segment. Writers take an advisory lock (POSIX); run one writer per store.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self._manifest_stamp: tuple[int, int] = (0, 0)
+        # open_or_build's shared lock; released when the store is garbage collected
+        self.pin: Optional[IO[str]] = None
+        self._load()
+
+    @classmethod
+    def create(cls, root: str | Path, dim: int, dtype: str = "int8", meta: Optional[dict[str, Any]] = None) -> "EmbeddingStore":
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {sorted(DTYPES)}")
+        root = Path(root)
+        if (root / "manifest.json").exists():
+            raise FileExistsError(f"{root} already holds an embedding store")
+        root.mkdir(parents=True, exist_ok=True)
+        cls._write_manifest(root, {"format": FORMAT, "dim": dim, "dtype": dtype, "next": 1, "segments": [], "meta": meta or {}})
+        return cls(root)
+
+    @staticmethod
+    def _write_manifest(root: Path, manifest: dict[str, Any]) -> None:
+        tmp = root / f"manifest.json.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp, root / "manifest.json")
+
+    def _load(self) -> None:
+        path = self.root / "manifest.json"
+        self._manifest_stamp = self._stamp()
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"Unsupported embedding store format in {self.root}")
+        self.manifest = manifest
+        self.dim = int(manifest["dim"])
+        self.dtype = manifest["dtype"]
+        self.meta = manifest.get("meta", {})
+        self.segments = [Segment(self.root, m, self.dim, self.dtype) for m in manifest["segments"]]
+        # Newest first: a row is dead when any newer segment carries its id
+        newer = np.empty(0, dtype=np.uint64)
+        for seg in reversed(self.segments):
+            if len(newer) and seg.rows:
+                superseded = np.isin(seg.hashes, newer, assume_unique=False)
+                if superseded.any():
+                    seg.dead = np.asarray(seg.hash_rows[superseded])
+            newer = np.union1d(newer, seg.hashes)
+        self._starts = np.cumsum([0] + [len(s.vectors) for s in self.segments])
+
+    def _stamp(self) -> tuple[int, int]:
+        # os.replace gives every manifest a new inode, so this changes even within one mtime tick
+        st = (self.root / "manifest.json").stat()
+        return st.st_ino, st.st_mtime_ns
+
+    def refresh(self) -> bool:
+        """Reload if another process changed the manifest; True when it did."""
+        if self._stamp() == self._manifest_stamp:
+            return False
+        self._load()
+        return True
+
+    @contextmanager
+    def _writer(self) -> Iterator[None]:
+        with open(self.root / ".lock", "a+") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                self._load()  # another writer may have appended meanwhile
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _commit(self, segment: dict[str, Any]) -> None:
+        manifest = dict(self.manifest, next=self.manifest["next"] + 1, segments=[*self.manifest["segments"], segment])
+        self._write_manifest(self.root, manifest)
+        self._load()
+
+    def append(self, ids: Iterable[str], vectors: np.ndarray) -> int:
+        """Add (or replace) rows; returns how many were written."""
+        ids = [str(i) for i in ids]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(ids), self.dim):
+            raise ValueError(f"Expected {len(ids)} x {self.dim} vectors, got {vectors.shape}")
+        # within one append the last occurrence of an id wins
+        last = {id_: i for i, id_ in enumerate(ids)}
+        if len(last) != len(ids):
+            keep = sorted(last.values())
+            ids, vectors = [ids[i] for i in keep], vectors[keep]
+        if not ids:
+            return 0
+        with self._writer():
+            name = f"seg-{self.manifest['next']:06d}"
+            self._commit(Segment.write(self.root, name, ids, vectors, self.dtype))
+        return len(ids)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        ids = sorted({str(i) for i in ids})
+        if ids:
+            with self._writer():
+                name = f"seg-{self.manifest['next']:06d}"
+                self._commit(Segment.write(self.root, name, ids, None, self.dtype))
+
+    def compact(self) -> None:
+        """Rewrite the live rows as one segment and drop the old files.
+
+        Stored values are copied as they are, with no requantization. On
+        POSIX, processes that still map the old files keep reading them
+        until they ``refresh()``.
+        """
+        with self._writer():
+            ids: list[str] = []
+            parts: list[np.ndarray] = []
+            scales: list[np.ndarray] = []
+            for seg in self.segments:
+                if seg.kind != "vectors" or not seg.rows:
+                    continue
+                live = np.ones(seg.rows, dtype=bool)
+                if seg.dead is not None:
+                    live[seg.dead] = False
+                rows = np.flatnonzero(live)
+                ids.extend(seg.id_at(int(r)) for r in rows)
+                parts.append(np.asarray(seg.vectors[rows]))
+                if seg.scales is not None:
+                    scales.append(np.asarray(seg.scales[rows]))
+            name = f"seg-{self.manifest['next']:06d}"
+            base = self.root / name
+            meta = Segment.write(self.root, name, ids, None, self.dtype)
+            meta["kind"] = "vectors"
+            np.concatenate(parts or [np.zeros((0, self.dim), DTYPES[self.dtype])]).tofile(base.with_suffix(".vec"))
+            if self.dtype == "int8":
+                np.concatenate(scales or [np.zeros(0, np.float32)]).tofile(base.with_suffix(".scale"))
+            old = [s.name for s in self.segments]
+            manifest = dict(self.manifest, next=self.manifest["next"] + 1, segments=[meta])
+            self._write_manifest(self.root, manifest)
+            self._load()
+        for name in old:
+            for ext in (".vec", ".scale", ".ids", ".idoff", ".hash", ".hrow"):
+                (self.root / name).with_suffix(ext).unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return sum(len(s.vectors) - (len(s.dead) if s.dead is not None else 0) for s in self.segments)
+
+    @property
+    def total_rows(self) -> int:
+        """Rows across all segments, live or superseded; the length of ``scores()``."""
+        return int(self._starts[-1])
+
+    def _locate(self, id_: str) -> Optional[tuple[Segment, int]]:
+        h = id_hashes([id_])[0]
+        for seg in reversed(self.segments):
+            row = seg.find(id_, h)
+            if row is not None:
+                return (seg, row) if seg.kind == "vectors" else None
+        return None
+
+    def get(self, id_: str) -> Optional[np.ndarray]:
+        """Current (dequantized) vector for ``id_``, or None."""
+        found = self._locate(id_)
+        return found[0].vector(found[1]) if found else None
+
+    def id_at(self, row: int) -> str:
+        """Id of global row ``row`` (segments in order, as in ``scores()``)."""
+        i = int(np.searchsorted(self._starts, row, side="right")) - 1
+        return self.segments[i].id_at(row - int(self._starts[i]))
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Dot product of ``query`` with every row; superseded rows score -inf."""
+        query = np.asarray(query, dtype=np.float32)
+        parts = [s.scores(query) for s in self.segments if len(s.vectors)]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.float32)
+
+    def search(self, query: np.ndarray, k: int = 10) -> list[tuple[str, float]]:
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.id_at(int(r)), float(scores[r])) for r in top if np.isfinite(scores[r])]
+
+    def disk_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.root.iterdir() if p.is_file())
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "dtype": self.dtype,
+            "dim": self.dim,
+            "rows": len(self),
+            "segments": len(self.segments),
+            "disk_bytes": self.disk_bytes(),
+        }
+
+
+def _pin(root: Path) -> Optional[IO[str]]:
+    """Shared lock on the store at ``root``, held while the returned file stays open."""
+    if fcntl is None:
+        return None
+    try:
+        fh = open(root / ".readers", "a+")
+    except FileNotFoundError:  # removed meanwhile
+        return None
+    fcntl.flock(fh, fcntl.LOCK_SH)
+    return fh
+
+
+def _remove_older(root: Path, current: Path) -> None:
+    """Remove stores under ``root`` built before ``current`` that no process has open."""
+    built = (current / "manifest.json").stat().st_mtime_ns
+    for sibling in root.iterdir():
+        if not sibling.is_dir() or sibling == current or ".tmp-" in sibling.name:
+            continue
+        try:
+            if (sibling / "manifest.json").stat().st_mtime_ns >= built:
+                continue  # a newer catalog, loaded by another worker
+            fh = open(sibling / ".readers", "a+") if fcntl is not None else None
+        except OSError:
+            continue
+        if fh is None:  # no flock (Windows), which refuses to delete files another process maps anyway
+            shutil.rmtree(sibling, ignore_errors=True)
+            continue
+        with fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue  # still open in some worker
+            shutil.rmtree(sibling, ignore_errors=True)
+
+
+def open_or_build(root: str | Path, fingerprint: str, dtype: str, build: Callable[[Path], tuple[list[str], np.ndarray]]) -> EmbeddingStore:
+    """Store for ``fingerprint`` under ``root``, written once and then shared.
+
+    Each fingerprint gets its own subdirectory. The first process builds it
+    in a temporary directory and renames it into place, and every other
+    process (or a restarted worker) opens that copy. ``build`` is given the
+    temporary directory, so it can leave other files next to the vectors.
+
+    Every process holds a shared lock on the store it opened for as long as
+    the store is alive. Stores built before this one are removed only once
+    no process holds theirs.
+    """
+    root = Path(root)
+    target = root / fingerprint
+    while True:
+        if not (target / "manifest.json").exists():
+            tmp = root / f"{fingerprint}.tmp-{os.getpid()}"
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir(parents=True)
+            ids, vectors = build(tmp)
+            store = EmbeddingStore.create(tmp, vectors.shape[1], dtype, meta={"fingerprint": fingerprint})
+            store.append(ids, vectors)
+            try:
+                os.rename(tmp, target)
+            except OSError:  # another worker got there first; use its copy
+                shutil.rmtree(tmp, ignore_errors=True)
+        pin = _pin(target)
+        if (target / "manifest.json").exists():
+            break
+        # Another process removed it as stale before we locked it; build it again
+        if pin is not None:
+            pin.close()
+    store = EmbeddingStore(target)
+    store.pin = pin
+    _remove_older(root, target)
+    return store
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Optional
+
+from google.adk.events import Event
+
+from gateway.serialization import dumps_str
+
+
+def sse(event: str, data: Any) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {dumps_str(data)}\n\n"
+
+
+class ToolTimer:
+    """Pairs function_call and function_response events to time each tool call."""
+
+    def __init__(self) -> None:
+        self._started: dict[str, float] = {}
+
+    def start(self, call_id: Optional[str], name: str) -> None:
+        self._started[call_id or name] = time.perf_counter()
+
+    @property
+    def pending(self) -> int:
+        """Tool calls started but not answered yet."""
+        return len(self._started)
+
+    def stop(self, call_id: Optional[str], name: str) -> Optional[float]:
+        started = self._started.pop(call_id or name, None)
+        if started is None:
+            return None
+        return (time.perf_counter() - started) * 1000
+
+
+def event_payload(event: Event, timer: ToolTimer) -> dict[str, Any]:
+    """Summarize an ADK event for the stream: author, text, tool calls and state delta."""
+    texts: list[str] = []
+    parts = event.content.parts if event.content and event.content.parts else []
+    for part in parts:
+        if part.text and not part.thought:
+            texts.append(part.text)
+
+    tool_calls = []
+    for call in event.get_function_calls():
+        timer.start(call.id, call.name)
+        tool_calls.append({"name": call.name, "args": call.args or {}})
+
+    tool_results = []
+    for resp in event.get_function_responses():
+        duration = timer.stop(resp.id, resp.name)
+        tool_results.append({
+            "name": resp.name,
+            "duration_ms": round(duration, 1) if duration is not None else None,
+        })
+
+    payload: dict[str, Any] = {
+        "author": event.author,
+        "partial": bool(event.partial),
+        "final": event.is_final_response(),
+    }
+    if texts:
+        payload["text"] = "".join(texts)
+    if tool_calls:
+        payload["tool_calls"] = tool_calls
+    if tool_results:
+        payload["tool_results"] = tool_results
+    if event.actions and event.actions.state_delta:
+        payload["state_delta"] = event.actions.state_delta
+    if event.actions and event.actions.transfer_to_agent:
+        payload["transfer_to_agent"] = event.actions.transfer_to_agent
+    return payload
@@ -0,0 +1,522 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import aiohttp
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+# Optional: Pillow enables resized/re-encoded thumbnails; without it originals are served
+try:
+    from PIL import Image, ImageOps  # type: ignore
+except ImportError:  # pragma: no cover
+    Image = None  # type: ignore
+    ImageOps = None  # type: ignore
+
+logger = logging.getLogger("adk_practice.web.images")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
+CHUNK = 64 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def is_direct_image_url(u: str) -> bool:
+    u = u.lower()
+    return any(u.endswith(ext) for ext in (".jpg", ".jpeg", ".png", ".webp", ".gif"))
+
+
+# fmt -> (Pillow encoder, Content-Type)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+MAX_VARIANT_SIDE = 2048
+
+
+def _resize(path: str, width: Optional[int], height: Optional[int], fmt: str) -> bytes:
+    """Resize (cover-crop when both sides are given) and re-encode one image."""
+    encoder = VARIANT_FORMATS[fmt][0]
+    with Image.open(path) as im:
+        if im.format == "JPEG" and (width or height):
+            # Let the JPEG decoder downscale by 1/2..1/8 while decoding (never below target)
+            w, h = im.size
+            scale = max((width or 0) / w, (height or 0) / h)
+            im.draft("RGB", (max(1, round(w * scale)), max(1, round(h * scale))))
+        im = ImageOps.exif_transpose(im)
+        if encoder == "JPEG" and im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        elif im.mode not in ("RGB", "RGBA", "L", "LA"):
+            im = im.convert("RGBA")
+        if width and height:
+            # Matches the gallery's object-fit: cover tiles
+            im = ImageOps.fit(im, (width, height), method=Image.Resampling.LANCZOS)
+        elif width or height:
+            w, h = im.size
+            scale = (width / w) if width else (height / h)
+            if scale < 1:
+                im = im.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.Resampling.LANCZOS)
+        out = BytesIO()
+        if encoder == "PNG":
+            im.save(out, encoder, optimize=True)
+        else:
+            im.save(out, encoder, quality=80)
+        return out.getvalue()
+
+
+def _read_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    # Sync generator: Starlette iterates it in a worker thread
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class DiskCache:
+    """Content-addressed image store with LRU eviction by total size.
+
+    Bodies live under ``blobs/<sha256>``, so identical images fetched from
+    different URLs are stored once. ``meta/<sha256(url)>.json`` maps a URL to
+    its blob plus the validators (ETag/Last-Modified) used to revalidate it.
+    Evicting a blob also deletes the meta files that point at it. Methods
+    that touch the disk are blocking; ImageProxy calls them from a thread.
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.blobs = self.root / "blobs"
+        self.meta = self.root / "meta"
+        self.tmp = self.root / "tmp"
+        for d in (self.blobs, self.meta, self.tmp):
+            d.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # blob name -> (size, last access); rebuilt from disk so LRU survives restarts
+        self._index: dict[str, tuple[int, float]] = {}
+        for p in self.blobs.iterdir():
+            st = p.stat()
+            self._index[p.name] = (st.st_size, st.st_atime)
+        self._bytes = sum(size for size, _ in self._index.values())
+        # meta file name -> blob, and blob -> meta files, so eviction can find them
+        self._meta_blob: dict[str, str] = {}
+        self._blob_metas: dict[str, set[str]] = {}
+        for p in self.meta.glob("*.json"):
+            try:
+                blob = json.loads(p.read_text("utf-8")).get("blob", "")
+            except (OSError, ValueError):
+                blob = ""
+            if blob in self._index:
+                self._link(p.name, blob)
+            else:  # left behind by an eviction before meta files were removed with their blob
+                p.unlink(missing_ok=True)
+        self.evictions = 0
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs / digest
+
+    def size(self) -> int:
+        return self._bytes
+
+    def _link(self, meta_name: str, blob: str) -> None:
+        old = self._meta_blob.get(meta_name)
+        if old is not None and old != blob:
+            self._blob_metas.get(old, set()).discard(meta_name)
+        self._meta_blob[meta_name] = blob
+        self._blob_metas.setdefault(blob, set()).add(meta_name)
+
+    def get_meta(self, url: str) -> Optional[dict[str, Any]]:
+        p = self.meta / f"{self.url_key(url)}.json"
+        try:
+            meta = json.loads(p.read_text("utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not self.blob_path(meta.get("blob", "")).exists():
+            return None
+        return meta
+
+    def put_meta(self, url: str, meta: dict[str, Any]) -> bool:
+        """Point ``url`` at ``meta["blob"]``; False when that blob has been evicted meanwhile."""
+        p = self.meta / f"{self.url_key(url)}.json"
+        tmp = p.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(meta), "utf-8")
+        with self._lock:
+            if meta["blob"] not in self._index:
+                tmp.unlink(missing_ok=True)
+                return False
+            os.replace(tmp, p)
+            self._link(p.name, meta["blob"])
+        return True
+
+    def touch(self, digest: str) -> None:
+        now = time.time()
+        with self._lock:
+            if digest not in self._index:
+                return
+            self._index[digest] = (self._index[digest][0], now)
+        try:
+            os.utime(self.blob_path(digest), (now, now))
+        except OSError:
+            pass
+
+    def new_temp(self):
+        return tempfile.NamedTemporaryFile(dir=self.tmp, delete=False)
+
+    def commit(self, tmp_path: str, digest: str, size: int) -> None:
+        """Move a fully written temp file into the store and evict down to budget."""
+        dest = self.blob_path(digest)
+        with self._lock:
+            if dest.exists():
+                os.unlink(tmp_path)
+            else:
+                os.replace(tmp_path, dest)
+            previous = self._index.get(digest)
+            self._bytes += size - (previous[0] if previous else 0)
+            self._index[digest] = (size, time.time())
+            self._evict(keep=digest)
+
+    def _evict(self, keep: str) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        for digest, (size, _) in sorted(self._index.items(), key=lambda kv: kv[1][1]):
+            if self._bytes <= self.max_bytes:
+                break
+            if digest == keep:
+                continue  # just written; its meta is stored next
+            self.blob_path(digest).unlink(missing_ok=True)
+            for meta_name in self._blob_metas.pop(digest, ()):
+                (self.meta / meta_name).unlink(missing_ok=True)
+                self._meta_blob.pop(meta_name, None)
+            del self._index[digest]
+            self._bytes -= size
+            self.evictions += 1
+
+
+class ImageProxy:
+    """Async image proxy: pooled keep-alive upstream connections, streamed
+    bodies with a size cap, disk cache with conditional revalidation, and
+    single-range requests. With Pillow installed it also serves resized
+    derivatives (thumbnails), cached by (source hash, size, format).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path | None = None,
+        max_cache_bytes: int | None = None,
+        max_body_bytes: int | None = None,
+        fresh_seconds: float | None = None,
+        pool_size: int | None = None,
+        resize_workers: int | None = None,
+    ):
+        self.cache = DiskCache(
+            cache_dir or os.getenv("IMG_CACHE_DIR", ".cache/img"),
+            max_cache_bytes or int(float(os.getenv("IMG_CACHE_MAX_MB", "256")) * 1024 * 1024),
+        )
+        self.max_body_bytes = max_body_bytes or int(float(os.getenv("IMG_MAX_MB", "10")) * 1024 * 1024)
+        # Within this window cached images are served without asking upstream
+        self.fresh_seconds = fresh_seconds if fresh_seconds is not None else float(os.getenv("IMG_FRESH_SECONDS", "3600"))
+        self.pool_size = pool_size or int(os.getenv("IMG_POOL_SIZE", "32"))
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Resizing is CPU-bound; Pillow releases the GIL for most of it
+        self._pool = ThreadPoolExecutor(
+            max_workers=resize_workers or int(os.getenv("IMG_RESIZE_WORKERS", str(min(4, os.cpu_count() or 1)))),
+            thread_name_prefix="img-resize",
+        )
+        self._rendering: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.variants_rendered = 0
+        self.variant_hits = 0
+
+    def _client(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=8, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None, connect=5, sock_read=10),
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "variants_rendered": self.variants_rendered,
+            "variant_hits": self.variant_hits,
+            "cache_bytes": self.cache.size(),
+            "cache_evictions": self.cache.evictions,
+        }
+
+    async def serve(
+        self,
+        url: str,
+        range_header: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        fmt: Optional[str] = None,
+    ) -> Response:
+        """Serve ``url``; with width/height/fmt, serve a resized derivative instead."""
+        if not (url.startswith("http://") or url.startswith("https://")):
+            raise HTTPException(status_code=400, detail="Invalid URL")
+        try:
+            if (width or height or fmt) and Image is not None:
+                return await self._serve_variant(url, width, height, fmt, if_none_match)
+            meta = await asyncio.to_thread(self.cache.get_meta, url)
+            if meta is not None:
+                if time.time() - meta["fetched_at"] < self.fresh_seconds:
+                    self.hits += 1
+                    return await self._from_cache(meta, range_header, if_none_match, "HIT")
+                return await self._revalidate(url, meta, range_header, if_none_match)
+            self.misses += 1
+            return await self._fetch(url, range_header)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Image fetch timeout")
+        except aiohttp.ClientError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+
+    async def _from_cache(self, meta: dict[str, Any], range_header: Optional[str], if_none_match: Optional[str], state: str) -> Response:
+        digest = meta["blob"]
+        await asyncio.to_thread(self.cache.touch, digest)
+        etag = f'"{digest[:32]}"'
+        headers = {
+            "ETag": etag,
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "public, max-age=86400",
+            "X-Cache": state,
+        }
+        if if_none_match and etag in if_none_match:
+            return Response(status_code=304, headers=headers)
+        path = self.cache.blob_path(digest)
+        size = meta["size"]
+        start, end = 0, size - 1
+        status = 200
+        if range_header:
+            m = _RANGE.match(range_header.strip())
+            if not m or (not m.group(1) and not m.group(2)):
+                raise HTTPException(status_code=416, detail="Invalid range", headers={"Content-Range": f"bytes */{size}"})
+            if m.group(1):
+                start = int(m.group(1))
+                end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            else:  # suffix range: last N bytes
+                start = max(size - int(m.group(2)), 0)
+            if start > end or start >= size:
+                raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(_read_range(path, start, end), status_code=status, media_type=meta["content_type"], headers=headers)
+
+    async def _revalidate(self, url: str, meta: dict[str, Any], range_header: Optional[str], if_none_match: Optional[str]) -> Response:
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        resp = await self._client().get(url, headers=headers)
+        if resp.status == 304:
+            resp.release()
+            self.revalidated += 1
+            meta["fetched_at"] = time.time()
+            await asyncio.to_thread(self.cache.put_meta, url, meta)
+            return await self._from_cache(meta, range_header, if_none_match, "REVALIDATED")
+        self.misses += 1
+        return await self._stream_new(url, resp, range_header)
+
+    async def _fetch(self, url: str, range_header: Optional[str]) -> Response:
+        resp = await self._client().get(url)
+        return await self._stream_new(url, resp, range_header)
+
+    async def _source(self, url: str) -> tuple[dict[str, Any], str]:
+        """Make sure the original is cached and fresh; return its meta and cache state."""
+        meta = await asyncio.to_thread(self.cache.get_meta, url)
+        if meta is not None and time.time() - meta["fetched_at"] < self.fresh_seconds:
+            self.hits += 1
+            return meta, "HIT"
+        headers = {}
+        if meta is not None and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta is not None and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        resp = await self._client().get(url, headers=headers)
+        if meta is not None and resp.status == 304:
+            resp.release()
+            self.revalidated += 1
+            meta["fetched_at"] = time.time()
+            await asyncio.to_thread(self.cache.put_meta, url, meta)
+            return meta, "REVALIDATED"
+        self.misses += 1
+        new_meta = self._check_upstream(url, resp)
+        await self._drain_to_cache(url, resp, new_meta)
+        return new_meta, "MISS"
+
+    async def _serve_variant(
+        self, url: str, width: Optional[int], height: Optional[int], fmt: Optional[str], if_none_match: Optional[str]
+    ) -> Response:
+        fmt = (fmt or "webp").lower()
+        if fmt not in VARIANT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+        width = min(width, MAX_VARIANT_SIDE) if width else None
+        height = min(height, MAX_VARIANT_SIDE) if height else None
+        source, state = await self._source(url)
+        # Derivatives are keyed by source content, so a changed upstream image gets new ones
+        variant_key = f"variant:{source['blob']}:{width or 0}x{height or 0}:{fmt}"
+        meta = await asyncio.to_thread(self.cache.get_meta, variant_key)
+        if meta is None:
+            meta = await self._render_variant(variant_key, source, width, height, fmt)
+            self.variants_rendered += 1
+        else:
+            self.variant_hits += 1
+        return await self._from_cache(meta, None, if_none_match, state)
+
+    async def _render_variant(
+        self, variant_key: str, source: dict[str, Any], width: Optional[int], height: Optional[int], fmt: str
+    ) -> dict[str, Any]:
+        # Identical concurrent requests wait for one render
+        pending = self._rendering.get(variant_key)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = loop.run_in_executor(
+                self._pool, _resize, str(self.cache.blob_path(source["blob"])), width, height, fmt
+            )
+            self._rendering[variant_key] = pending
+        try:
+            data = await pending
+        except Exception as e:
+            raise HTTPException(status_code=415, detail=f"Cannot decode image: {e}")
+        finally:
+            self._rendering.pop(variant_key, None)
+        meta = await asyncio.to_thread(self.cache.get_meta, variant_key)
+        if meta is not None:
+            return meta
+        meta = {"url": variant_key, "content_type": VARIANT_FORMATS[fmt][1]}
+        await asyncio.to_thread(self._store_bytes, variant_key, data, meta)
+        if "blob" not in meta:
+            raise HTTPException(status_code=503, detail="Image cache is full, try again")
+        return meta
+
+    def _check_upstream(self, url: str, resp: aiohttp.ClientResponse) -> dict[str, Any]:
+        ct = resp.headers.get("Content-Type", "application/octet-stream")
+        try:
+            if resp.status != 200:
+                raise HTTPException(status_code=resp.status, detail="Upstream error")
+            # Only serve images
+            if not ct.startswith("image/") and not is_direct_image_url(url):
+                raise HTTPException(status_code=415, detail="Not an image")
+            if resp.content_length is not None and resp.content_length > self.max_body_bytes:
+                raise HTTPException(status_code=413, detail="Image too large")
+        except HTTPException:
+            resp.release()
+            raise
+        return {
+            "url": url,
+            "content_type": ct,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+        }
+
+    async def _stream_new(self, url: str, resp: aiohttp.ClientResponse, range_header: Optional[str]) -> Response:
+        meta = self._check_upstream(url, resp)
+        ct = meta["content_type"]
+        if range_header:
+            # Ranges are served from the cache, so fill it first
+            await self._drain_to_cache(url, resp, meta)
+            return await self._from_cache(meta, range_header, None, "MISS")
+        return StreamingResponse(
+            self._tee(url, resp, meta, to_client=True),
+            media_type=ct,
+            headers={"Cache-Control": "public, max-age=86400", "X-Cache": "MISS", "Accept-Ranges": "bytes"},
+        )
+
+    async def _tee(self, url: str, resp: aiohttp.ClientResponse, meta: dict[str, Any], to_client: bool = False):
+        """Yield the upstream body while writing it to the cache (file I/O runs in a thread).
+
+        A body over ``max_body_bytes`` is not cached. With ``to_client`` the
+        rest of it is still streamed, since the 200 headers are already out;
+        otherwise reading stops there.
+        """
+        tmp = await asyncio.to_thread(self.cache.new_temp)
+        digest = hashlib.sha256()
+        size = 0
+        complete = False
+        try:
+            async for chunk in resp.content.iter_chunked(CHUNK):
+                size += len(chunk)
+                if tmp is not None and size > self.max_body_bytes:
+                    logger.warning("Image exceeded %d bytes, not cached: %s", self.max_body_bytes, url)
+                    await asyncio.to_thread(self._discard, tmp)
+                    tmp = None
+                    if not to_client:
+                        return
+                if tmp is not None:
+                    digest.update(chunk)
+                    await asyncio.to_thread(tmp.write, chunk)
+                yield chunk
+            complete = True
+        finally:
+            resp.release()
+            if tmp is not None:
+                if complete:
+                    await asyncio.to_thread(self._store_file, url, tmp, digest.hexdigest(), size, meta)
+                else:
+                    await asyncio.to_thread(self._discard, tmp)
+
+    async def _drain_to_cache(self, url: str, resp: aiohttp.ClientResponse, meta: dict[str, Any]) -> None:
+        chunks = self._tee(url, resp, meta)
+        async for _ in chunks:
+            pass
+        if "blob" not in meta:
+            raise HTTPException(status_code=413, detail="Image too large")
+
+    # Blocking helpers, run with asyncio.to_thread
+
+    @staticmethod
+    def _discard(tmp) -> None:
+        tmp.close()
+        try:
+            os.unlink(tmp.name)
+        except OSError:
+            pass
+
+    def _store_file(self, url: str, tmp, digest: str, size: int, meta: dict[str, Any]) -> None:
+        tmp.close()
+        self.cache.commit(tmp.name, digest, size)
+        stored = {**meta, "blob": digest, "size": size, "fetched_at": time.time()}
+        if self.cache.put_meta(url, stored):
+            meta.update(stored)
+
+    def _store_bytes(self, url: str, data: bytes, meta: dict[str, Any]) -> None:
+        tmp = self.cache.new_temp()
+        with tmp:
+            tmp.write(data)
+        self._store_file(url, tmp, hashlib.sha256(data).hexdigest(), len(data), meta)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+from typing import Any, Optional
+
+
+class WatchError(Exception):
+    """A watched key changed before EXEC (mirrors redis.exceptions.WatchError)."""
+
+
+class LocalRedis:
+    """In-process stand-in for the slice of redis.asyncio that RedisSessionStore uses.
+
+    Strings, lists, sets and hashes, plus WATCH/MULTI/EXEC pipelines with
+    real optimistic-lock semantics: every write bumps the key's version and
+    EXEC fails with WatchError if a watched key moved. Values are str, as
+    with ``decode_responses=True``. It is not shared between processes, so
+    use it for tests and single-worker development only.
+    """
+
+    def __init__(self) -> None:
+        self._data: dict[str, Any] = {}
+        self._versions: dict[str, int] = {}
+        self._lock = asyncio.Lock()
+
+    # --- internals ---
+    def _touch(self, key: str) -> None:
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _version(self, key: str) -> int:
+        return self._versions.get(key, 0)
+
+    def _typed(self, key: str, factory: type) -> Any:
+        value = self._data.get(key)
+        if value is None:
+            value = self._data[key] = factory()
+        elif not isinstance(value, factory):
+            raise TypeError(f"WRONGTYPE Operation against a key holding the wrong kind of value: {key}")
+        return value
+
+    # --- strings ---
+    async def get(self, key: str) -> Optional[str]:
+        value = self._data.get(key)
+        return value if isinstance(value, str) else None
+
+    async def mget(self, keys: list[str]) -> list[Optional[str]]:
+        return [await self.get(k) for k in keys]
+
+    async def set(self, key: str, value: str, nx: bool = False) -> Optional[bool]:
+        if nx and key in self._data:
+            return None
+        self._data[key] = str(value)
+        self._touch(key)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                removed += 1
+                self._touch(key)
+        return removed
+
+    async def keys(self, pattern: str = "*") -> list[str]:
+        return [k for k in self._data if fnmatch.fnmatchcase(k, pattern)]
+
+    # --- lists ---
+    async def rpush(self, key: str, *values: str) -> int:
+        items = self._typed(key, list)
+        items.extend(str(v) for v in values)
+        self._touch(key)
+        return len(items)
+
+    async def lrange(self, key: str, start: int, end: int) -> list[str]:
+        items = self._data.get(key) or []
+        end = len(items) - 1 if end == -1 else end
+        if start < 0:
+            start = max(0, len(items) + start)
+        return list(items[start : end + 1])
+
+    async def llen(self, key: str) -> int:
+        return len(self._data.get(key) or [])
+
+    # --- sets ---
+    async def sadd(self, key: str, *members: str) -> int:
+        items = self._typed(key, set)
+        before = len(items)
+        items.update(str(m) for m in members)
+        self._touch(key)
+        return len(items) - before
+
+    async def srem(self, key: str, *members: str) -> int:
+        items = self._data.get(key) or set()
+        before = len(items)
+        items.difference_update(members)
+        self._touch(key)
+        return before - len(items)
+
+    async def smembers(self, key: str) -> set[str]:
+        return set(self._data.get(key) or ())
+
+    # --- hashes ---
+    async def hset(self, key: str, mapping: dict[str, str]) -> int:
+        items = self._typed(key, dict)
+        added = sum(1 for f in mapping if f not in items)
+        items.update({f: str(v) for f, v in mapping.items()})
+        self._touch(key)
+        return added
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        return dict(self._data.get(key) or {})
+
+    # --- transactions ---
+    def pipeline(self, transaction: bool = True) -> "LocalPipeline":
+        return LocalPipeline(self)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class LocalPipeline:
+    """WATCH -> reads -> MULTI -> queued writes -> EXEC, like redis-py's async pipeline."""
+
+    def __init__(self, client: LocalRedis):
+        self._client = client
+        self._watched: dict[str, int] = {}
+        self._queue: list[tuple[str, tuple, dict]] = []
+        self._multi = False
+
+    async def __aenter__(self) -> "LocalPipeline":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.reset()
+
+    async def watch(self, *keys: str) -> None:
+        for key in keys:
+            self._watched[key] = self._client._version(key)
+
+    async def reset(self) -> None:
+        self._watched.clear()
+        self._queue.clear()
+        self._multi = False
+
+    def multi(self) -> None:
+        self._multi = True
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self._client, name)
+        if not self._multi:
+            return method  # immediate mode (after WATCH, before MULTI)
+
+        def queued(*args: Any, **kwargs: Any) -> "LocalPipeline":
+            self._queue.append((name, args, kwargs))
+            return self
+
+        return queued
+
+    async def execute(self) -> list[Any]:
+        client = self._client
+        async with client._lock:
+            if any(client._version(k) != v for k, v in self._watched.items()):
+                await self.reset()
+                raise WatchError("Watched variable changed.")
+            # No awaits between the check and the writes: the queue runs atomically
+            results = [await getattr(client, name)(*args, **kwargs) for name, args, kwargs in self._queue]
+        await self.reset()
+        return results
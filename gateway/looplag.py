@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Optional
+
+from gateway.metrics import MetricsRegistry
+
+logger = logging.getLogger("adk_practice.web.looplag")
+
+# Lag is usually sub-millisecond; anything past 100 ms is a blocking call on the loop
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag: how late a periodic ``sleep(interval)`` wakes up.
+
+    A blocking call (sync I/O, CPU-heavy parsing) on the loop shows up here
+    directly, so it is a cheap regression signal for handlers like query().
+    Samples go to ``event_loop_lag_seconds`` in the registry and to a small
+    window for /stats. GATEWAY_LOOP_LAG_INTERVAL sets the probe period in
+    seconds (0.05; 0 disables).
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, interval: float | None = None, window: int = 1200):
+        self.interval = interval if interval is not None else float(os.getenv("GATEWAY_LOOP_LAG_INTERVAL", "0.05"))
+        self.histogram = (
+            registry.histogram("event_loop_lag_seconds", "Event-loop wake-up delay of a periodic probe.", buckets=LAG_BUCKETS)
+            if registry is not None
+            else None
+        )
+        self._recent: deque[float] = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._probe(), name="loop-lag-monitor")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _probe(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self._recent.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if self.histogram is not None:
+                self.histogram.observe(lag)
+
+    def stats(self) -> dict[str, Any]:
+        recent = sorted(self._recent)
+        pct = lambda p: round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 2) if recent else 0.0  # noqa: E731
+        return {
+            "interval_ms": self.interval * 1000,
+            "running": self._task is not None,
+            "samples": len(recent),
+            "p50_ms": pct(0.5),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+logger = logging.getLogger("adk_practice.web.metrics")
+
+# Seconds; spans a cache hit up to a long Selenium-backed brand-SEO run
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: dict[str, Any]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_num(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge read at scrape time from ``collect()`` -> {label values: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str], collect: Callable[[], dict[LabelKey, float]]):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        try:
+            values = self.collect()
+        except Exception:
+            logger.exception("Gauge %s failed to collect", self.name)
+            values = {}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_num(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._counts: dict[LabelKey, list[int]] = {}
+        self._sums: dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        self._sums[key] += value
+
+    def count(self, **labels: Any) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key in sorted(self._counts):
+            counts = self._counts[key]
+            running = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                running += n
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_num(self._sums[key])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {running}")
+        return lines
+
+
+class MetricsRegistry:
+    """A few Prometheus-style series rendered in the text exposition format (0.0.4).
+
+    Small on purpose: no prometheus_client dependency, single process, and all
+    updates happen on the event loop.
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str], collect: Callable[[], dict[LabelKey, float]]) -> Gauge:
+        return self._add(Gauge(name, help, labels, collect))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Invocations started inside the current MetricsPlugin.scope(), so it can clean them up
+_SCOPE: contextvars.ContextVar[Optional[list[str]]] = contextvars.ContextVar("metrics_plugin_scope", default=None)
+
+
+def _app_name(ctx: Any) -> str:
+    # CallbackContext/ToolContext wrap the InvocationContext, which knows the app
+    inv = getattr(ctx, "_invocation_context", ctx)
+    return getattr(inv, "app_name", "") or ""
+
+
+class MetricsPlugin(BasePlugin):
+    """ADK plugin that records run, agent, tool and LLM metrics for any agent tree.
+
+    Attach it to a Runner (``plugins=[MetricsPlugin(registry)]``); the agents
+    themselves need no changes. Series are labelled by ``app`` (the runner's
+    app_name) plus the agent, tool or event author.
+
+    A cancelled run never reaches the after/error callbacks. Iterate
+    ``run_async`` inside ``with plugin.scope():`` so the start times of the
+    runs it began are dropped however they end.
+    """
+
+    def __init__(self, registry: MetricsRegistry, name: str = "metrics"):
+        super().__init__(name=name)
+        self.registry = registry
+        self.run_seconds = registry.histogram("adk_run_duration_seconds", "Runner invocation wall time.", ["app"])
+        self.run_errors = registry.counter("adk_run_errors_total", "Invocations that raised.", ["app"])
+        self.events = registry.counter("adk_events_total", "Events yielded by the runner, by author (sub-agent).", ["app", "author"])
+        self.agent_seconds = registry.histogram("adk_agent_duration_seconds", "Time spent inside each (sub-)agent.", ["app", "agent"])
+        self.tool_seconds = registry.histogram("adk_tool_duration_seconds", "Tool call latency by function.", ["app", "tool", "status"])
+        self.llm_calls = registry.counter("adk_llm_calls_total", "LLM calls by agent and model.", ["app", "agent", "model"])
+        self.llm_errors = registry.counter("adk_llm_errors_total", "LLM calls that raised.", ["app", "agent"])
+        self.llm_seconds = registry.histogram("adk_llm_duration_seconds", "LLM call latency (until the final chunk).", ["app", "agent"])
+        self.llm_tokens = registry.counter("adk_llm_tokens_total", "Token usage reported by the model.", ["app", "agent", "kind"])
+        # invocation id -> start times of the run, its agents, LLM and tool calls;
+        # the whole invocation is dropped when the run ends (or its scope exits)
+        self._started: dict[str, dict[tuple[str, ...], float]] = {}
+
+    def _start(self, invocation_id: str, *key: str) -> None:
+        self._started.setdefault(invocation_id, {})[key] = time.perf_counter()
+
+    def _stop(self, invocation_id: str, *key: str) -> Optional[float]:
+        """Seconds since the matching _start, or None if it was never started (or already dropped)."""
+        started = self._started.get(invocation_id, {}).pop(key, None)
+        return None if started is None else time.perf_counter() - started
+
+    def forget(self, invocation_id: str) -> None:
+        self._started.pop(invocation_id, None)
+
+    @contextmanager
+    def scope(self) -> Iterator[None]:
+        """Drop the bookkeeping of every run started inside this block when it exits."""
+        token = _SCOPE.set([])
+        try:
+            yield
+        finally:
+            for invocation_id in _SCOPE.get() or ():
+                self.forget(invocation_id)
+            _SCOPE.reset(token)
+
+    def in_flight(self) -> int:
+        return len(self._started)
+
+    # --- runs and events ---
+    async def before_run_callback(self, *, invocation_context):
+        self._start(invocation_context.invocation_id, "run")
+        scope = _SCOPE.get()
+        if scope is not None:
+            scope.append(invocation_context.invocation_id)
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        elapsed = self._stop(invocation_context.invocation_id, "run")
+        self.forget(invocation_context.invocation_id)
+        if elapsed is not None:
+            self.run_seconds.observe(elapsed, app=invocation_context.app_name)
+
+    async def on_run_error_callback(self, *, invocation_context, error):
+        self.forget(invocation_context.invocation_id)
+        self.run_errors.inc(app=invocation_context.app_name)
+        return None
+
+    async def on_event_callback(self, *, invocation_context, event):
+        # Streaming chunks would inflate the count; a partial is not a finished event
+        if not event.partial:
+            self.events.inc(app=invocation_context.app_name, author=event.author or "")
+        return None
+
+    # --- agents ---
+    async def before_agent_callback(self, *, agent, callback_context):
+        self._start(callback_context.invocation_id, "agent", agent.name)
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        elapsed = self._stop(callback_context.invocation_id, "agent", agent.name)
+        if elapsed is not None:
+            self.agent_seconds.observe(elapsed, app=_app_name(callback_context), agent=agent.name)
+        return None
+
+    # --- LLM calls ---
+    async def before_model_callback(self, *, callback_context, llm_request):
+        app, agent = _app_name(callback_context), callback_context.agent_name
+        self._start(callback_context.invocation_id, "llm", agent)
+        self.llm_calls.inc(app=app, agent=agent, model=getattr(llm_request, "model", None) or "")
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        if llm_response.partial:
+            return None
+        app, agent = _app_name(callback_context), callback_context.agent_name
+        elapsed = self._stop(callback_context.invocation_id, "llm", agent)
+        if elapsed is not None:
+            self.llm_seconds.observe(elapsed, app=app, agent=agent)
+        usage = llm_response.usage_metadata
+        if usage is not None:
+            for kind, attr in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count"),
+                               ("cached", "cached_content_token_count"), ("thoughts", "thoughts_token_count")):
+                n = getattr(usage, attr, None)
+                if n:
+                    self.llm_tokens.inc(n, app=app, agent=agent, kind=kind)
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        agent = callback_context.agent_name
+        self._stop(callback_context.invocation_id, "llm", agent)
+        self.llm_errors.inc(app=_app_name(callback_context), agent=agent)
+        return None
+
+    # --- tools ---
+    def _tool_done(self, tool, tool_context, status: str) -> None:
+        elapsed = self._stop(tool_context.invocation_id, "tool", tool_context.function_call_id or "")
+        if elapsed is not None:
+            self.tool_seconds.observe(elapsed, app=_app_name(tool_context), tool=tool.name, status=status)
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        self._start(tool_context.invocation_id, "tool", tool_context.function_call_id or "")
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        self._tool_done(tool, tool_context, "ok")
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        self._tool_done(tool, tool_context, "error")
+        return None
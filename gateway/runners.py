@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+import time
+import uuid
+from typing import Any, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.runners import Runner
+from google.adk.sessions import BaseSessionService, InMemorySessionService
+from google.genai import types
+
+from gateway.sessions import AlreadyExistsError
+
+logger = logging.getLogger("adk_practice.web.runners")
+
+
+class RunnerRegistry:
+    """Long-lived Runner per mode ("ecommerce", "brand-seo").
+
+    All runners share one session service, so a follow-up turn with the same
+    session_id continues the conversation instead of starting from scratch.
+    The registry also records how long building a runner took, which is the
+    setup cost every request used to pay when it created its own runner.
+    ``plugins`` (e.g. metrics) are attached to every runner it builds.
+    """
+
+    def __init__(
+        self,
+        session_service: Optional[BaseSessionService] = None,
+        app_prefix: str = "adk-practice-web",
+        plugins: Optional[list[BasePlugin]] = None,
+    ):
+        self.session_service = session_service or InMemorySessionService()
+        self.app_prefix = app_prefix
+        self.plugins = list(plugins or [])
+        self._runners: dict[str, Runner] = {}
+        self._build_seconds: dict[str, float] = {}
+        self._reuses: dict[str, int] = {}
+
+    def app_name(self, mode: str) -> str:
+        return f"{self.app_prefix}:{mode}"
+
+    def get(self, mode: str, agent: BaseAgent) -> Runner:
+        """Return the runner for a mode, building it on first use."""
+        runner = self._runners.get(mode)
+        if runner is not None:
+            self._reuses[mode] += 1
+            return runner
+        started = time.perf_counter()
+        runner = Runner(
+            agent=agent,
+            app_name=self.app_name(mode),
+            session_service=self.session_service,
+            plugins=self.plugins,
+        )
+        self._build_seconds[mode] = time.perf_counter() - started
+        self._reuses[mode] = 0
+        self._runners[mode] = runner
+        logger.info("Built runner for %s in %.1f ms", mode, self._build_seconds[mode] * 1000)
+        return runner
+
+    async def ensure_session(self, mode: str, user_id: str, session_id: str) -> None:
+        """Create the session on first use; later turns reuse its history."""
+        app_name = self.app_name(mode)
+        session = await self.session_service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        if session is None:
+            try:
+                await self.session_service.create_session(app_name=app_name, user_id=user_id, session_id=session_id)
+            except AlreadyExistsError:
+                pass  # another request (or worker) created it first
+
+    async def history_length(self, mode: str, user_id: str, session_id: str) -> int:
+        """Events already recorded in the session (0 for one that does not exist yet)."""
+        session = await self.session_service.get_session(app_name=self.app_name(mode), user_id=user_id, session_id=session_id)
+        return len(session.events) if session is not None else 0
+
+    async def record_turn(self, mode: str, user_id: str, session_id: str, author: str, query: str, reply: str) -> None:
+        """Append a turn answered without running the agent (a cache hit, or another
+        session's run of the same first turn) to the session.
+
+        The next turn then sees this question and answer in its history, as if
+        the agent had produced them.
+        """
+        await self.ensure_session(mode, user_id, session_id)
+        session = await self.session_service.get_session(app_name=self.app_name(mode), user_id=user_id, session_id=session_id)
+        invocation_id = f"e-{uuid.uuid4()}"
+        for who, role, text in (("user", "user", query), (author, "model", reply)):
+            event = Event(invocation_id=invocation_id, author=who, content=types.Content(role=role, parts=[types.Part(text=text)]))
+            await self.session_service.append_event(session, event)
+
+    async def close(self) -> None:
+        """Close all runners (plugins, toolsets). Safe to call more than once."""
+        runners, self._runners = self._runners, {}
+        for mode, runner in runners.items():
+            close = getattr(runner, "close", None)
+            if close is None:
+                continue
+            try:
+                await close()
+            except Exception:
+                logger.exception("Failed to close runner for %s", mode)
+        close = getattr(self.session_service, "close", None)
+        if close is not None:
+            await close()
+
+    def stats(self) -> dict[str, Any]:
+        """Per-mode build cost, reuse count and the setup time those reuses saved."""
+        modes: dict[str, Any] = {}
+        for mode, build in self._build_seconds.items():
+            reuses = self._reuses.get(mode, 0)
+            modes[mode] = {
+                "build_ms": round(build * 1000, 3),
+                "reuses": reuses,
+                "setup_ms_saved": round(build * reuses * 1000, 3),
+            }
+        sessions = getattr(self.session_service, "stats", None)
+        return {
+            "runners": modes,
+            "sessions": sessions() if sessions else {"backend": type(self.session_service).__name__},
+            "setup_ms_saved_total": round(sum(m["setup_ms_saved"] for m in modes.values()), 3),
+        }
@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from gateway.embeddings import DTYPES, EmbeddingStore, open_or_build
+
+logger = logging.getLogger("adk_practice.web.search")
+
+_TOKEN = re.compile(r"(?u)\b\w+\b")
+# Product fields that carry searchable text, in the shape the shop/research agents emit
+TEXT_FIELDS = ("title", "name", "brand", "seller_or_brand", "category", "description", "key_specs", "item_number", "sku", "upc", "ean")
+ID_FIELDS = ("id", "item_number", "sku", "product_url", "url")
+RRF_K = 60
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def doc_id(doc: dict[str, Any], position: int) -> str:
+    for field in ID_FIELDS:
+        value = doc.get(field)
+        if isinstance(value, (str, int)) and str(value).strip():
+            return str(value).strip()
+    return str(position)
+
+
+def doc_text(doc: dict[str, Any]) -> str:
+    parts: list[str] = []
+    for field in TEXT_FIELDS:
+        value = doc.get(field)
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, (list, tuple)):
+            parts.extend(str(v) for v in value)
+    if not parts:  # unknown schema: every string value
+        parts = [v for v in doc.values() if isinstance(v, str)]
+    return " ".join(parts)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the (at most) k best positive scores, best first."""
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class BM25:
+    """Okapi BM25 as one precomputed sparse matrix: a query is a column-sum over its terms."""
+
+    def __init__(self, texts: list[str], k1: float = 1.2, b: float = 0.75):
+        self.n_docs = len(texts)
+        self.vectorizer: Optional[CountVectorizer] = CountVectorizer(token_pattern=_TOKEN.pattern, dtype=np.float32)
+        try:
+            tf = self.vectorizer.fit_transform(texts).tocsr()
+        except ValueError:  # empty vocabulary: not one document has a word in it
+            self.vectorizer = self.postings = None
+            return
+        n_docs = tf.shape[0]
+        lengths = np.asarray(tf.sum(axis=1)).ravel()
+        avg = float(lengths.mean()) or 1.0
+        df = np.bincount(tf.indices, minlength=tf.shape[1])
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        rows = np.repeat(np.arange(n_docs), np.diff(tf.indptr))
+        norm = k1 * (1 - b + b * lengths[rows] / avg)
+        tf.data = idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + norm)
+        # term -> documents, so scoring only touches the postings of the query terms
+        self.postings = tf.T.tocsr()
+
+    def scores(self, query: str) -> np.ndarray:
+        if self.vectorizer is None:
+            return np.zeros(self.n_docs, dtype=np.float32)
+        terms = np.unique(self.vectorizer.transform([query]).indices)
+        if not len(terms):
+            return np.zeros(self.n_docs, dtype=np.float32)
+        return np.asarray(self.postings[terms].sum(axis=0)).ravel()
+
+
+class LsaEncoder:
+    """Dense vectors without a model download: char n-gram TF-IDF reduced by truncated SVD.
+
+    Character n-grams make it tolerant to typos, plurals and split words, which
+    is what BM25's exact token match misses.
+    """
+
+    def __init__(self, texts: list[str], dim: int = 128):
+        self.vectorizer = self._vectorizer()
+        grams = self.vectorizer.fit_transform(texts)
+        components = min(dim, grams.shape[0] - 1, grams.shape[1] - 1)
+        self.svd = TruncatedSVD(n_components=components, random_state=0) if components >= 2 else None
+        reduced = self.svd.fit_transform(grams) if self.svd is not None else grams.toarray()
+        self.matrix: Optional[np.ndarray] = normalize(reduced).astype(np.float32)
+        # TruncatedSVD.transform multiplies by a transposed view; a contiguous copy is ~100x faster per query
+        self.projection = np.ascontiguousarray(self.svd.components_.T, dtype=np.float32) if self.svd is not None else None
+
+    @staticmethod
+    def _vectorizer(**kwargs: Any) -> TfidfVectorizer:
+        return TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 4), sublinear_tf=True, dtype=np.float32, **kwargs)
+
+    def save(self, root: Path) -> None:
+        """Write the fitted vocabulary, idf weights and projection to ``root`` for ``load``."""
+        vocabulary = self.vectorizer.get_feature_names_out().tolist()
+        (root / "lsa-vocabulary.json").write_text(json.dumps(vocabulary, ensure_ascii=False), encoding="utf-8")
+        np.save(root / "lsa-idf.npy", self.vectorizer.idf_)
+        if self.projection is not None:
+            np.save(root / "lsa-projection.npy", self.projection)
+
+    @classmethod
+    def load(cls, root: Path) -> "LsaEncoder":
+        """An encoder written by ``save``, without refitting; the projection is memory-mapped."""
+        encoder = cls.__new__(cls)
+        vocabulary = json.loads((root / "lsa-vocabulary.json").read_text(encoding="utf-8"))
+        encoder.vectorizer = cls._vectorizer(vocabulary=vocabulary)
+        encoder.vectorizer.idf_ = np.load(root / "lsa-idf.npy")
+        projection = root / "lsa-projection.npy"
+        encoder.svd = None
+        encoder.matrix = None
+        encoder.projection = np.load(projection, mmap_mode="r") if projection.exists() else None
+        return encoder
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        grams = self.vectorizer.transform(texts)
+        reduced = grams @ self.projection if self.projection is not None else grams.toarray()
+        return normalize(reduced).astype(np.float32)
+
+
+Reranker = Callable[[str, list[dict[str, Any]], np.ndarray], np.ndarray]
+
+
+def lexical_rerank(query: str, docs: list[dict[str, Any]], fused: np.ndarray) -> np.ndarray:
+    """Re-score fused candidates on how completely and where they match the query.
+
+    Coverage of the query terms (in the title counts extra), an exact id/SKU
+    hit and the query as a phrase in the title are added to the normalized
+    fusion score. Cheap enough for the top few dozen candidates per query.
+    """
+    terms = set(tokenize(query))
+    phrase = " ".join(tokenize(query))
+    top = float(fused.max()) if len(fused) else 0.0
+    out = np.empty(len(docs), dtype=np.float32)
+    for i, doc in enumerate(docs):
+        title = str(doc.get("title") or doc.get("name") or "")
+        title_terms = set(tokenize(title))
+        all_terms = title_terms | set(tokenize(doc_text(doc)))
+        score = 0.5 * (fused[i] / top if top else 0.0)
+        if terms:
+            score += 0.3 * len(terms & all_terms) / len(terms) + 0.2 * len(terms & title_terms) / len(terms)
+        ids = {str(doc.get(f)).lower() for f in ("item_number", "sku", "upc", "ean") if doc.get(f)}
+        if ids & (terms | {query.strip().lower()}):
+            score += 0.5
+        if phrase and phrase in " ".join(tokenize(title)):
+            score += 0.2
+        out[i] = score
+    return out
+
+
+class HybridIndex:
+    """One dataset: BM25 postings, dense vectors, and the documents they point at.
+
+    With ``store_dir`` the dense vectors move out of process memory into an
+    EmbeddingStore of ``store_dtype`` (int8 / float16 / float32). The store
+    is keyed by the catalog's content, so workers that index the same
+    catalog map one shared copy instead of each holding a float32 matrix.
+    The fitted encoder is saved with it: only the worker that builds the
+    store fits TF-IDF and SVD, and the others load the result.
+    """
+
+    def __init__(
+        self,
+        documents: list[dict[str, Any]],
+        dense_dim: int = 128,
+        store_dir: Optional[str | Path] = None,
+        store_dtype: str = "int8",
+    ):
+        started = time.perf_counter()
+        self.documents = [dict(d) for d in documents]
+        self.ids = [doc_id(d, i) for i, d in enumerate(self.documents)]
+        texts = [doc_text(d) for d in self.documents]
+        self.sparse = BM25(texts) if self.documents else None
+        self.dense: Optional[LsaEncoder] = None
+        self.dense_store: Optional[EmbeddingStore] = None
+        # char n-grams need some non-blank text to build a vocabulary from
+        dense = len(self.documents) > 1 and any(t.strip() for t in texts)
+        if self.documents and not dense and (self.sparse is None or self.sparse.vectorizer is None):
+            logger.warning("None of the %d documents has searchable text; searches will find nothing", len(self.documents))
+        if store_dir is not None and dense:
+            fitted: list[LsaEncoder] = []
+
+            def build(root: Path) -> tuple[list[str], np.ndarray]:
+                encoder = LsaEncoder(texts, dense_dim)
+                encoder.save(root)
+                matrix, encoder.matrix = encoder.matrix, None  # rows are read from the store from now on
+                fitted.append(encoder)
+                return [str(i) for i in range(len(matrix))], matrix
+
+            digest = hashlib.sha256("\x1e".join(texts).encode("utf-8")).hexdigest()[:16]
+            self.dense_store = open_or_build(store_dir, f"{digest}-lsa{dense_dim}-{store_dtype}", store_dtype, build)
+            # Built by another worker (or an earlier run): load its encoder instead of refitting
+            self.dense = fitted[-1] if fitted else LsaEncoder.load(self.dense_store.root)
+        elif dense:
+            self.dense = LsaEncoder(texts, dense_dim)
+        self.build_seconds = time.perf_counter() - started
+
+    def _dense_scores(self, query_vector: np.ndarray) -> np.ndarray:
+        if self.dense_store is not None:
+            return self.dense_store.scores(query_vector)
+        return self.dense.matrix @ query_vector
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(
+        self,
+        query: str,
+        rows: int = 10,
+        use_dense: bool = True,
+        use_sparse: bool = True,
+        use_rerank: bool = True,
+        rrf_alpha: float = 0.5,
+        reranker: Optional[Reranker] = None,
+    ) -> list[dict[str, Any]]:
+        """Top ``rows`` documents for ``query``.
+
+        Each enabled retriever contributes its top ``max(4 * rows, 50)``
+        candidates. They are fused with weighted reciprocal-rank fusion:
+        ``rrf_alpha / (60 + dense rank) + (1 - rrf_alpha) / (60 + sparse rank)``.
+        With ``use_rerank`` set, the reranker (``lexical_rerank`` by default)
+        reorders the top ``max(3 * rows, 30)`` fused hits.
+        """
+        if not self.documents:
+            return []
+        depth = max(4 * rows, 50)
+        alpha = min(max(rrf_alpha, 0.0), 1.0)
+        fused: dict[int, float] = {}
+        parts: dict[int, dict[str, float]] = {}
+        rankings: list[tuple[str, float, np.ndarray, np.ndarray]] = []
+        if use_sparse and self.sparse is not None:
+            scores = self.sparse.scores(query)
+            rankings.append(("sparse", 1.0 - alpha if use_dense else 1.0, _top(scores, depth), scores))
+        if use_dense and self.dense is not None:
+            scores = self._dense_scores(self.dense.encode([query])[0])
+            rankings.append(("dense", alpha if use_sparse else 1.0, _top(scores, depth), scores))
+        for name, weight, ranked, scores in rankings:
+            for rank, idx in enumerate(ranked.tolist()):
+                fused[idx] = fused.get(idx, 0.0) + weight / (RRF_K + rank + 1)
+                parts.setdefault(idx, {})[name] = float(scores[idx])
+        if not fused:
+            return []
+        order = sorted(fused, key=fused.__getitem__, reverse=True)
+        final = np.array([fused[i] for i in order], dtype=np.float32)
+        rerank_scores = None
+        if use_rerank:
+            # only the head of the fused list can reach the page; the tail keeps its fusion order
+            head = max(3 * rows, 30)
+            order, final = order[:head], final[:head]
+            rerank_scores = (reranker or lexical_rerank)(query, [self.documents[i] for i in order], final)
+            resort = np.argsort(-rerank_scores, kind="stable")
+            order = [order[i] for i in resort]
+            final, rerank_scores = final[resort], rerank_scores[resort]
+        results = []
+        for pos, idx in enumerate(order[:rows]):
+            scores = {**parts[idx], "rrf": round(float(final[pos]), 6)}
+            if rerank_scores is not None:
+                scores["rerank"] = round(float(rerank_scores[pos]), 6)
+            results.append({
+                "id": self.ids[idx],
+                "score": scores.get("rerank", scores["rrf"]),
+                "scores": scores,
+                "document": self.documents[idx],
+            })
+        return results
+
+
+class SearchEngine:
+    """Named datasets of HybridIndex, searched in-process.
+
+    ``load`` builds the new index first and then swaps it in, so searches
+    running against the old one finish undisturbed.
+    """
+
+    def __init__(
+        self,
+        default_dataset: str = "default",
+        dense_dim: int = 128,
+        reranker: Optional[Reranker] = None,
+        store_dir: Optional[str | Path] = None,
+        store_dtype: str = "int8",
+    ):
+        if store_dtype not in DTYPES:
+            raise ValueError(f"store_dtype must be one of {sorted(DTYPES)}")
+        self.default_dataset = default_dataset
+        self.dense_dim = dense_dim
+        self.reranker = reranker
+        self.store_dir = Path(store_dir) if store_dir else None
+        self.store_dtype = store_dtype
+        self._datasets: dict[str, HybridIndex] = {}
+        self._lock = threading.Lock()
+        self.searches = 0
+
+    def _store_path(self, dataset_id: str) -> Optional[Path]:
+        if self.store_dir is None:
+            return None
+        # dataset ids come from URLs: keep them out of path syntax, and distinct after escaping
+        safe = re.sub(r"[^A-Za-z0-9_-]", "_", dataset_id)[:64]
+        return self.store_dir / f"{safe}-{hashlib.sha1(dataset_id.encode('utf-8')).hexdigest()[:8]}"
+
+    def load(self, dataset_id: str, documents: Iterable[dict[str, Any]]) -> HybridIndex:
+        index = HybridIndex(list(documents), self.dense_dim, self._store_path(dataset_id), self.store_dtype)
+        with self._lock:
+            self._datasets[dataset_id] = index
+        logger.info("Indexed %d documents for %s in %.0f ms", len(index), dataset_id, index.build_seconds * 1000)
+        return index
+
+    def drop(self, dataset_id: str) -> bool:
+        with self._lock:
+            return self._datasets.pop(dataset_id, None) is not None
+
+    def get(self, dataset_id: Optional[str]) -> Optional[HybridIndex]:
+        return self._datasets.get(dataset_id or self.default_dataset)
+
+    def search(self, dataset_id: Optional[str], query: str, **options: Any) -> list[dict[str, Any]]:
+        index = self.get(dataset_id)
+        if index is None:
+            raise LookupError(f"Unknown dataset {dataset_id or self.default_dataset!r}")
+        self.searches += 1
+        return index.search(query, reranker=self.reranker, **options)
+
+    def load_dir(self, root: str | Path) -> None:
+        """Load ``<dataset_id>.jsonl`` / ``<dataset_id>.json`` catalogs from a directory.
+
+        A .json file holds a list of products or ``{"products": [...]}``, the
+        block format the shop and research agents already emit.
+        """
+        for path in sorted(Path(root).glob("*.json*")):
+            if path.suffix == ".jsonl":
+                with path.open(encoding="utf-8") as fh:
+                    docs = [json.loads(line) for line in fh if line.strip()]
+            elif path.suffix == ".json":
+                data = json.loads(path.read_text(encoding="utf-8"))
+                docs = data.get("products", []) if isinstance(data, dict) else data
+            else:
+                continue
+            self.load(path.stem, [d for d in docs if isinstance(d, dict)])
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "searches": self.searches,
+            "datasets": {
+                name: {
+                    "documents": len(index),
+                    "build_ms": round(index.build_seconds * 1000, 1),
+                    **({"embeddings": index.dense_store.stats()} if index.dense_store is not None else {}),
+                }
+                for name, index in self._datasets.items()
+            },
+        }
+
+
+def engine_from_env() -> SearchEngine:
+    """SearchEngine for VECTOR_DEFAULT_DATASET ("default") with VECTOR_DENSE_DIM (128) dimensions.
+
+    Catalogs are read from VECTOR_CATALOG_DIR when set (see ``load_dir``).
+    VECTOR_EMBEDDINGS_DIR keeps the dense vectors in memory-mapped stores of
+    VECTOR_EMBEDDINGS_DTYPE (int8) there.
+    """
+    engine = SearchEngine(
+        default_dataset=os.getenv("VECTOR_DEFAULT_DATASET", "default"),
+        dense_dim=int(os.getenv("VECTOR_DENSE_DIM", "128")),
+        store_dir=os.getenv("VECTOR_EMBEDDINGS_DIR") or None,
+        store_dtype=os.getenv("VECTOR_EMBEDDINGS_DTYPE", "int8"),
+    )
+    catalog_dir = os.getenv("VECTOR_CATALOG_DIR")
+    if catalog_dir:
+        engine.load_dir(catalog_dir)
+    return engine
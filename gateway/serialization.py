@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:  # Optional: orjson is the fastest encoder when installed
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+import pydantic_core
+
+JSON_BACKEND = "orjson" if orjson is not None else "pydantic-core"
+
+
+def dumps(data: Any) -> bytes:
+    """Compact UTF-8 JSON, encoded in native code (orjson, else pydantic-core).
+
+    Both handle dicts/lists/str/numbers and pydantic models directly, so callers
+    can skip FastAPI's ``jsonable_encoder`` pass, which walks and copies the whole
+    payload in Python before ``json.dumps`` walks it again.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return pydantic_core.to_json(data, fallback=str)
+
+
+def dumps_str(data: Any) -> str:
+    return dumps(data).decode()
+
+
+def dumps_stdlib(data: Any) -> bytes:
+    """What Starlette's JSONResponse produces; kept for comparisons."""
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with ``dumps``.
+
+    Return it from an endpoint (instead of a dict) so FastAPI sends the bytes as
+    they are, without running ``jsonable_encoder`` first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
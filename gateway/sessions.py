@@ -0,0 +1,662 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+from gateway.localredis import LocalRedis, WatchError as LocalWatchError
+from gateway.metrics import MetricsRegistry
+
+try:  # Optional: real Redis (or any Redis-compatible server) for multi-host setups
+    import redis.asyncio as aioredis
+    from redis.exceptions import WatchError as RedisWatchError
+except ImportError:  # pragma: no cover - optional dependency
+    aioredis = None
+    RedisWatchError = LocalWatchError
+
+try:
+    from google.adk.errors.already_exists_error import AlreadyExistsError
+except ImportError:  # pragma: no cover - older google-adk
+    AlreadyExistsError = ValueError  # type: ignore[misc,assignment]
+
+logger = logging.getLogger("adk_practice.web.sessions")
+
+_WATCH_ERRORS = (LocalWatchError, RedisWatchError)
+
+
+class SessionConflictError(RuntimeError):
+    """A session kept changing underneath us; the append was retried and gave up."""
+
+
+def split_state(state: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any], dict[str, Any]]:
+    """Split a state (delta) into (app, user, session) parts; ``temp:`` keys are dropped."""
+    app: dict[str, Any] = {}
+    user: dict[str, Any] = {}
+    session: dict[str, Any] = {}
+    for key, value in state.items():
+        if key.startswith(State.APP_PREFIX):
+            app[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+class SQLiteSessionStore:
+    """Sessions in one SQLite file (WAL), shared by every worker on the host.
+
+    A session row holds its state and ``updated`` stamp; events are appended
+    to their own table. ``append`` is a compare-and-set on ``updated`` and
+    commits the row and the event together.
+
+    Calls run in worker threads, so the store is lock-striped: ``shards``
+    connections, each behind its own lock, and a session (or state scope)
+    always maps to the same one. Calls for one session are ordered; calls for
+    sessions on different shards read in parallel and only meet at SQLite's
+    single writer lock for the brief commit.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str | Path, shards: int = 8):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(path)
+        self._shards = [
+            (threading.Lock(), sqlite3.connect(self.path, check_same_thread=False, timeout=10))
+            for _ in range(max(1, shards))
+        ]
+        lock, conn = self._shards[0]
+        with lock, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " app TEXT NOT NULL, user TEXT NOT NULL, id TEXT NOT NULL,"
+                " state TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (app, user, id))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " app TEXT NOT NULL, user TEXT NOT NULL, sid TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS events_session ON events(app, user, sid, seq)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scoped_state ("
+                " scope TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (scope, key))"
+            )
+        for _, conn in self._shards:
+            conn.execute("PRAGMA synchronous=NORMAL")  # per connection
+
+    def _shard(self, *key: str) -> tuple[threading.Lock, sqlite3.Connection]:
+        # crc32, not hash(): the mapping must not change between runs or workers
+        return self._shards[zlib.crc32("\x00".join(key).encode()) % len(self._shards)]
+
+    def create(self, app: str, user: str, sid: str, state: dict[str, Any], updated: float) -> bool:
+        lock, conn = self._shard(app, user, sid)
+        with lock, conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO sessions (app, user, id, state, updated) VALUES (?, ?, ?, ?, ?)",
+                (app, user, sid, json.dumps(state), updated),
+            )
+        return cur.rowcount == 1
+
+    def load(self, app: str, user: str, sid: str) -> Optional[tuple[dict[str, Any], float, list[str]]]:
+        lock, conn = self._shard(app, user, sid)
+        with lock:
+            row = conn.execute(
+                "SELECT state, updated FROM sessions WHERE app = ? AND user = ? AND id = ?", (app, user, sid)
+            ).fetchone()
+            if row is None:
+                return None
+            events = [d for (d,) in conn.execute(
+                "SELECT data FROM events WHERE app = ? AND user = ? AND sid = ? ORDER BY seq", (app, user, sid)
+            )]
+        return json.loads(row[0]), row[1], events
+
+    def append(self, app: str, user: str, sid: str, expected: float, state: dict[str, Any], updated: float, event: str) -> bool:
+        lock, conn = self._shard(app, user, sid)
+        with lock, conn:
+            cur = conn.execute(
+                "UPDATE sessions SET state = ?, updated = ? WHERE app = ? AND user = ? AND id = ? AND updated = ?",
+                (json.dumps(state), updated, app, user, sid, expected),
+            )
+            if cur.rowcount != 1:
+                return False
+            conn.execute("INSERT INTO events (app, user, sid, data) VALUES (?, ?, ?, ?)", (app, user, sid, event))
+        return True
+
+    def delete(self, app: str, user: str, sid: str) -> None:
+        lock, conn = self._shard(app, user, sid)
+        with lock, conn:
+            conn.execute("DELETE FROM sessions WHERE app = ? AND user = ? AND id = ?", (app, user, sid))
+            conn.execute("DELETE FROM events WHERE app = ? AND user = ? AND sid = ?", (app, user, sid))
+
+    def list(self, app: str, user: Optional[str]) -> list[tuple[str, str, dict[str, Any], float]]:
+        query = "SELECT user, id, state, updated FROM sessions WHERE app = ?"
+        args: tuple = (app,)
+        if user is not None:
+            query += " AND user = ?"
+            args += (user,)
+        lock, conn = self._shard(app, user or "")
+        with lock:
+            rows = conn.execute(query, args).fetchall()
+        return [(u, i, json.loads(s), t) for u, i, s, t in rows]
+
+    def scope_get(self, scope: str) -> dict[str, Any]:
+        lock, conn = self._shard(scope)
+        with lock:
+            rows = conn.execute("SELECT key, value FROM scoped_state WHERE scope = ?", (scope,)).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def scope_update(self, scope: str, delta: dict[str, Any]) -> None:
+        lock, conn = self._shard(scope)
+        with lock, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO scoped_state (scope, key, value) VALUES (?, ?, ?)",
+                [(scope, k, json.dumps(v)) for k, v in delta.items()],
+            )
+
+    def close(self) -> None:
+        for lock, conn in self._shards:
+            with lock:
+                conn.close()
+
+
+class RedisSessionStore:
+    """Sessions in Redis (or a Redis-compatible server), shared across hosts.
+
+    ``<prefix>:s:<app>|<user>|<id>`` holds {"state", "updated"} as JSON,
+    ``...:events`` is the event list and ``<prefix>:idx:<app>`` indexes the
+    sessions per app. ``append`` WATCHes the session key and writes the new
+    state and the event in one MULTI/EXEC, so a concurrent writer makes it
+    fail instead of being overwritten. Works with redis.asyncio or LocalRedis.
+    """
+
+    blocking = False
+
+    def __init__(self, client: Any, prefix: str = "adk"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, app: str, user: str, sid: str) -> str:
+        return f"{self.prefix}:s:{app}|{user}|{sid}"
+
+    def _index(self, app: str) -> str:
+        return f"{self.prefix}:idx:{app}"
+
+    async def create(self, app: str, user: str, sid: str, state: dict[str, Any], updated: float) -> bool:
+        created = await self.client.set(self._key(app, user, sid), json.dumps({"state": state, "updated": updated}), nx=True)
+        if created:
+            await self.client.sadd(self._index(app), json.dumps([user, sid]))
+        return bool(created)
+
+    async def load(self, app: str, user: str, sid: str) -> Optional[tuple[dict[str, Any], float, list[str]]]:
+        key = self._key(app, user, sid)
+        raw = await self.client.get(key)
+        if raw is None:
+            return None
+        meta = json.loads(raw)
+        events = await self.client.lrange(f"{key}:events", 0, -1)
+        return meta["state"], meta["updated"], list(events)
+
+    async def append(self, app: str, user: str, sid: str, expected: float, state: dict[str, Any], updated: float, event: str) -> bool:
+        key = self._key(app, user, sid)
+        async with self.client.pipeline(transaction=True) as pipe:
+            await pipe.watch(key)
+            raw = await pipe.get(key)
+            if raw is None or json.loads(raw)["updated"] != expected:
+                await pipe.reset()
+                return False
+            pipe.multi()
+            pipe.set(key, json.dumps({"state": state, "updated": updated}))
+            pipe.rpush(f"{key}:events", event)
+            try:
+                await pipe.execute()
+            except _WATCH_ERRORS:
+                return False
+        return True
+
+    async def delete(self, app: str, user: str, sid: str) -> None:
+        key = self._key(app, user, sid)
+        await self.client.delete(key, f"{key}:events")
+        await self.client.srem(self._index(app), json.dumps([user, sid]))
+
+    async def list(self, app: str, user: Optional[str]) -> list[tuple[str, str, dict[str, Any], float]]:
+        members = [json.loads(m) for m in await self.client.smembers(self._index(app))]
+        members = [(u, i) for u, i in members if user is None or u == user]
+        if not members:
+            return []
+        raws = await self.client.mget([self._key(app, u, i) for u, i in members])
+        out = []
+        for (u, i), raw in zip(members, raws):
+            if raw is not None:
+                meta = json.loads(raw)
+                out.append((u, i, meta["state"], meta["updated"]))
+        return out
+
+    async def scope_get(self, scope: str) -> dict[str, Any]:
+        return {k: json.loads(v) for k, v in (await self.client.hgetall(f"{self.prefix}:scope:{scope}")).items()}
+
+    async def scope_update(self, scope: str, delta: dict[str, Any]) -> None:
+        await self.client.hset(f"{self.prefix}:scope:{scope}", mapping={k: json.dumps(v) for k, v in delta.items()})
+
+    async def close(self) -> None:
+        close = getattr(self.client, "aclose", None)
+        if close is not None:
+            await close()
+
+
+class SharedSessionService(BaseSessionService):
+    """ADK session service over a shared store, so any worker can serve any turn.
+
+    Appends use optimistic concurrency: the write only lands if the stored
+    session still has the ``last_update_time`` this worker last saw. On a
+    conflict (another worker appended in between) the event is rebased onto
+    the fresh copy: its state delta is applied on top, the in-memory session
+    picks up the other worker's events, and the write is retried. ``app:`` and
+    ``user:`` state live in separate scopes merged key by key; ``temp:`` state
+    is never stored.
+    """
+
+    def __init__(self, store: SQLiteSessionStore | RedisSessionStore, max_retries: int = 8):
+        self.store = store
+        self.max_retries = max_retries
+        self.appends = 0
+        self.conflicts = 0
+
+    async def _call(self, method: str, *args: Any) -> Any:
+        fn = getattr(self.store, method)
+        if self.store.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return await fn(*args)
+
+    async def _merge_scoped(self, app_name: str, user_id: str, state: dict[str, Any]) -> dict[str, Any]:
+        for key, value in (await self._call("scope_get", f"app:{app_name}")).items():
+            state[State.APP_PREFIX + key] = value
+        for key, value in (await self._call("scope_get", f"user:{app_name}:{user_id}")).items():
+            state[State.USER_PREFIX + key] = value
+        return state
+
+    async def _update_scoped(self, app_name: str, user_id: str, app_delta: dict[str, Any], user_delta: dict[str, Any]) -> None:
+        if app_delta:
+            await self._call("scope_update", f"app:{app_name}", app_delta)
+        if user_delta:
+            await self._call("scope_update", f"user:{app_name}:{user_id}", user_delta)
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or uuid.uuid4().hex
+        app_delta, user_delta, session_state = split_state(state or {})
+        now = time.time()
+        if not await self._call("create", app_name, user_id, session_id, session_state, now):
+            raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+        await self._update_scoped(app_name, user_id, app_delta, user_delta)
+        merged = await self._merge_scoped(app_name, user_id, dict(session_state))
+        return Session(app_name=app_name, user_id=user_id, id=session_id, state=merged, last_update_time=now)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        found = await self._call("load", app_name, user_id, session_id)
+        if found is None:
+            return None
+        state, updated, raw_events = found
+        if config is not None and config.num_recent_events is not None:
+            raw_events = raw_events[-config.num_recent_events:] if config.num_recent_events else []
+        events = [Event.model_validate_json(e) for e in raw_events]
+        if config is not None and config.after_timestamp is not None:
+            events = [e for e in events if e.timestamp >= config.after_timestamp]
+        merged = await self._merge_scoped(app_name, user_id, state)
+        return Session(app_name=app_name, user_id=user_id, id=session_id, state=merged, events=events, last_update_time=updated)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        sessions = []
+        for uid, sid, state, updated in await self._call("list", app_name, user_id):
+            merged = await self._merge_scoped(app_name, uid, state)
+            sessions.append(Session(app_name=app_name, user_id=uid, id=sid, state=merged, last_update_time=updated))
+        sessions.sort(key=lambda s: (s.last_update_time, s.user_id, s.id))
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self._call("delete", app_name, user_id, session_id)
+
+    async def get_user_state(self, *, app_name: str, user_id: str) -> dict[str, Any]:
+        return await self._call("scope_get", f"user:{app_name}:{user_id}")
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        expected = session.last_update_time
+        # Applies the delta (and temp: keys) to the in-memory session and appends the event
+        event = await super().append_event(session=session, event=event)
+        app_delta, user_delta, session_delta = split_state(event.actions.state_delta if event.actions else {})
+        payload = event.model_dump_json(exclude_none=True)
+        _, _, stored_state = split_state(session.state)
+
+        for attempt in range(self.max_retries + 1):
+            updated = max(event.timestamp, expected + 1e-6)
+            if await self._call("append", session.app_name, session.user_id, session.id, expected, stored_state, updated, payload):
+                break
+            # Someone else wrote first: back off, rebase this event onto the stored copy and retry
+            self.conflicts += 1
+            await asyncio.sleep(random.uniform(0, min(0.05, 0.002 * 2**attempt)))
+            found = await self._call("load", session.app_name, session.user_id, session.id)
+            if found is None:
+                raise ValueError(f"Session {session.id} not found.")
+            fresh_state, expected, raw_events = found
+            stored_state = {**fresh_state, **session_delta}
+            session.events[:] = [Event.model_validate_json(e) for e in raw_events] + [event]
+            session.state.update(stored_state)
+            logger.info("Session %s changed concurrently; rebased event %s (attempt %d)", session.id, event.id, attempt + 1)
+        else:
+            raise SessionConflictError(f"Session {session.id} kept changing; gave up after {self.max_retries} retries")
+
+        session.last_update_time = updated
+        await self._update_scoped(session.app_name, session.user_id, app_delta, user_delta)
+        self.appends += 1
+        return event
+
+    async def close(self) -> None:
+        close = getattr(self.store, "close", None)
+        if close is None:
+            return
+        if self.store.blocking:
+            close()
+        else:
+            await close()
+
+    def stats(self) -> dict[str, Any]:
+        return {"backend": type(self.store).__name__, "appends": self.appends, "conflicts": self.conflicts}
+
+
+SessionKey = tuple[str, str, str]  # (app_name, user_id, session_id)
+
+# Client-supplied session/user ids; server-issued ones are uuid4 hex
+SESSION_ID_PATTERN = r"^[A-Za-z0-9_.:-]{1,128}$"
+_SESSION_ID_RE = re.compile(SESSION_ID_PATTERN)
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def valid_session_id(value: str) -> bool:
+    return bool(_SESSION_ID_RE.match(value))
+
+
+class SessionLocks:
+    """Orders agent turns per session without serializing different sessions.
+
+    A turn holds its session's lock from the first event to the last, so two
+    turns on one session run one after the other, in arrival order (asyncio
+    locks are FIFO), instead of interleaving their events. Turns on different
+    sessions never wait for each other. Everything runs on the event loop
+    thread, so one dict of key -> [lock, holders and waiters] needs no lock
+    of its own; an entry exists only while a turn holds or waits for it, so
+    idle sessions cost nothing.
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[SessionKey, list] = {}  # key -> [asyncio.Lock, refcount]
+        self.turns = 0
+        self.waited = 0  # turns that queued behind another turn on the same session
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def hold(self, key: SessionKey) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        lock: asyncio.Lock = entry[0]
+        try:
+            if lock.locked():
+                self.waited += 1
+                started = time.perf_counter()
+                await lock.acquire()
+                self.wait_seconds += time.perf_counter() - started
+            else:
+                await lock.acquire()
+            self.turns += 1
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "active_sessions": len(self._locks),
+            "turns": self.turns,
+            "waited": self.waited,
+            "wait_s_total": round(self.wait_seconds, 3),
+        }
+
+
+class BoundedSessionService(InMemorySessionService):
+    """InMemorySessionService that forgets sessions instead of growing forever.
+
+    - ``idle_ttl``: sessions untouched (no get/append) for this many seconds
+      are dropped (SESSION_IDLE_TTL, 3600).
+    - ``max_bytes``: budget for all sessions together; the least recently used
+      ones are evicted once it is exceeded (SESSION_MAX_MB, 256).
+    - ``max_events``: per-session cap; the oldest whole turns are trimmed so the
+      kept history still starts at a user message (SESSION_MAX_EVENTS, 500).
+
+    0 disables a limit. Sizes are estimates (the JSON size of events and
+    state). An expired or evicted session looks like one that never existed,
+    so the next turn starts a fresh conversation. app:/user: state is kept.
+    """
+
+    def __init__(
+        self,
+        idle_ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        max_events: Optional[int] = None,
+    ):
+        super().__init__()
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.getenv("SESSION_IDLE_TTL", "3600"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv("SESSION_MAX_MB", "256")) * 1024 * 1024)
+        self.max_events = max_events if max_events is not None else int(os.getenv("SESSION_MAX_EVENTS", "500"))
+        # Least recently used first: key -> [estimated bytes, last use (monotonic)]
+        self._lru: OrderedDict[SessionKey, list[float]] = OrderedDict()
+        self.resident_bytes = 0
+        self.expired = 0
+        self.evicted = 0
+        self.trimmed_events = 0
+
+    @staticmethod
+    def _event_bytes(event: Event) -> int:
+        return len(event.model_dump_json(exclude_none=True))
+
+    def _storage(self, key: SessionKey) -> Optional[Session]:
+        app_name, user_id, session_id = key
+        return self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+
+    def _touch(self, key: SessionKey, delta: int = 0) -> None:
+        entry = self._lru.get(key)
+        if entry is None:
+            entry = self._lru[key] = [0, 0.0]
+        entry[0] += delta
+        entry[1] = time.monotonic()
+        self.resident_bytes += delta
+        self._lru.move_to_end(key)
+
+    def _drop(self, key: SessionKey) -> None:
+        entry = self._lru.pop(key, None)
+        if entry is not None:
+            self.resident_bytes -= entry[0]
+        app_name, user_id, session_id = key
+        users = self.sessions.get(app_name, {})
+        users.get(user_id, {}).pop(session_id, None)
+        if user_id in users and not users[user_id]:
+            del users[user_id]
+
+    def _sweep(self) -> None:
+        """Drop idle sessions; they sit at the front of the LRU, so this stops at the first live one."""
+        if self.idle_ttl <= 0:
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._lru:
+            key, (_, last_used) = next(iter(self._lru.items()))
+            if last_used > cutoff:
+                return
+            self._drop(key)
+            self.expired += 1
+
+    def _enforce_budget(self, keep: SessionKey) -> None:
+        if self.max_bytes <= 0:
+            return
+        while self.resident_bytes > self.max_bytes and len(self._lru) > 1:
+            key = next(iter(self._lru))
+            if key == keep:  # the session in use is never the one evicted
+                self._lru.move_to_end(key)
+                continue
+            self._drop(key)
+            self.evicted += 1
+
+    def _trim(self, storage: Session) -> int:
+        """Cut the oldest turns down to ``max_events``; returns the bytes released."""
+        excess = len(storage.events) - self.max_events
+        if self.max_events <= 0 or excess <= 0:
+            return 0
+        # Cut at a user message so no function call loses its response
+        cut = next((i for i in range(excess, len(storage.events)) if storage.events[i].author == "user"), None)
+        if cut is None:
+            return 0  # one turn larger than the cap: keep it whole
+        released = sum(self._event_bytes(e) for e in storage.events[:cut])
+        del storage.events[:cut]
+        self.trimmed_events += cut
+        return released
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        self._sweep()
+        session = await super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        key = (app_name, user_id, session.id)
+        self._touch(key, len(json.dumps(session.state, default=str)) + 256)
+        self._enforce_budget(keep=key)
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        self._sweep()
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        if session is not None:
+            self._touch((app_name, user_id, session.id))
+        return session
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        self._sweep()
+        return await super().list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._drop((app_name, user_id, session_id))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        storage = self._storage(key)
+        if storage is None:
+            return event
+        self._touch(key, self._event_bytes(event) - self._trim(storage))
+        self._enforce_budget(keep=key)
+        return event
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "resident_sessions": len(self._lru),
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes,
+            "idle_ttl_s": self.idle_ttl,
+            "max_events": self.max_events,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "trimmed_events": self.trimmed_events,
+        }
+
+
+def register_session_gauges(registry: MetricsRegistry, service: BaseSessionService) -> None:
+    """Expose resident sessions/bytes of a BoundedSessionService on /metrics."""
+    if not isinstance(service, BoundedSessionService):
+        return
+    registry.gauge("session_store_resident_sessions", "Sessions held in memory.", [], lambda: {(): len(service._lru)})
+    registry.gauge("session_store_resident_bytes", "Estimated bytes held by in-memory sessions.", [], lambda: {(): service.resident_bytes})
+    registry.gauge(
+        "session_store_dropped", "Sessions dropped by idle TTL or LRU eviction, and events trimmed (cumulative).", ["reason"],
+        lambda: {("expired",): service.expired, ("evicted",): service.evicted, ("trimmed_events",): service.trimmed_events},
+    )
+
+
+def session_service_from_env() -> BaseSessionService:
+    """Session service selected by SESSION_BACKEND: memory (default), sqlite, redis or redis-local.
+
+    memory is a BoundedSessionService (SESSION_IDLE_TTL, SESSION_MAX_MB,
+    SESSION_MAX_EVENTS); memory-unbounded is ADK's plain InMemorySessionService.
+    sqlite uses SESSION_DB_PATH (.cache/sessions.sqlite3) with SESSION_DB_SHARDS
+    lock stripes (8) and is shared by workers on one host; redis uses SESSION_REDIS_URL and needs the ``redis``
+    package; redis-local is the in-process stand-in for tests.
+    """
+    kind = os.getenv("SESSION_BACKEND", "memory").strip().lower()
+    if kind in ("", "memory"):
+        return BoundedSessionService()
+    if kind == "memory-unbounded":
+        return InMemorySessionService()
+    if kind == "sqlite":
+        store = SQLiteSessionStore(os.getenv("SESSION_DB_PATH", ".cache/sessions.sqlite3"), int(os.getenv("SESSION_DB_SHARDS", "8")))
+        return SharedSessionService(store)
+    if kind == "redis":
+        if aioredis is None:
+            raise RuntimeError("SESSION_BACKEND=redis needs the 'redis' package (pip install redis)")
+        url = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+        return SharedSessionService(RedisSessionStore(aioredis.from_url(url, decode_responses=True)))
+    if kind == "redis-local":
+        return SharedSessionService(RedisSessionStore(LocalRedis()))
+    logger.warning("Unknown SESSION_BACKEND=%r; using in-memory sessions", kind)
+    return BoundedSessionService()
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+logger = logging.getLogger("adk_practice.web.singleflight")
+
+
+class Flight:
+    """One shared agent run.
+
+    The producer publishes frames, but they are only kept once a streaming
+    caller ``subscribe()``s: a /query run keeps nothing but its final result.
+    Subscribers read from a ring buffer of the last ``backlog`` frames, so a
+    late joiner replays what is still buffered and a reader that falls that
+    far behind skips ahead (the final result still carries the whole answer).
+    ``wait()`` returns the final result (or raises the producer's error) to
+    every caller. Producers that may queue call ``mark_started()`` once they
+    get going, so callers can hold off committing to a response until then
+    (``until_started()``). ``waiters`` counts the callers still interested in
+    the result; when the last one leaves (``SingleFlight.leave``) an
+    unfinished run is cancelled. ``owner`` is for the caller to record whose
+    run it is. A producer clears ``shareable`` once its result turns out to
+    depend on the owner's own state, so other callers know not to reuse it.
+    """
+
+    def __init__(self, backlog: int = 256) -> None:
+        self.backlog = max(1, backlog)
+        self.frames: Optional[deque[Any]] = None  # allocated by the first subscriber
+        self.published = 0  # frames published since the first subscriber; the next frame's number
+        self.subscribers = 0
+        self.done = False
+        self.started = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.cancel_reason: Optional[str] = None
+        self.owner: Any = None
+        self.shareable = True
+        self._wake = asyncio.Event()
+
+    def subscribe(self) -> None:
+        """Start keeping frames for a streaming caller."""
+        self.subscribers += 1
+        if self.frames is None:
+            self.frames = deque(maxlen=self.backlog)
+
+    def publish(self, frame: Any) -> None:
+        if self.frames is None:
+            return
+        self.frames.append(frame)
+        self.published += 1
+        self._notify()
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        self.result, self.error, self.done = result, error, True
+        self._notify()
+
+    def mark_started(self) -> None:
+        self.started = True
+        self._notify()
+
+    def _notify(self) -> None:
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    async def frames_iter(self) -> AsyncIterator[Any]:
+        """Buffered frames, then new ones as they arrive, until the run finishes."""
+        seq = 0
+        while True:
+            while self.frames is not None and seq < self.published:
+                # Frames older than the buffer are gone; skip to the oldest one kept
+                seq = max(seq, self.published - len(self.frames))
+                yield self.frames[seq - self.published]
+                seq += 1
+            if self.done:
+                return
+            await self._wake.wait()
+
+    async def until_started(self) -> None:
+        """Return once the producer has started or finished (successfully or not)."""
+        while not (self.started or self.done):
+            await self._wake.wait()
+
+    async def wait(self) -> Any:
+        while not self.done:
+            await self._wake.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Coalesces identical in-flight requests onto one producer run."""
+
+    def __init__(self, enabled: bool = True, backlog: int = 256) -> None:
+        self.enabled = enabled
+        self.backlog = backlog
+        self._flights: dict[str, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.followers = 0
+        self.cancelled = 0
+
+    def join(self, key: str, producer: Callable[[Flight], Awaitable[Any]], follower: bool = False) -> Flight:
+        """Attach to the running flight for ``key`` or start a new one.
+
+        ``follower`` producers only relay another flight's result, so they are
+        counted apart from the runs they follow.
+        """
+        flight = self._flights.get(key) if self.enabled else None
+        if flight is not None and flight.cancel_reason is None:
+            self.coalesced += 1
+            flight.waiters += 1
+            return flight
+        flight = Flight(self.backlog)
+        flight.waiters = 1
+        if follower:
+            self.followers += 1
+        else:
+            self.leaders += 1
+        if self.enabled:
+            self._flights[key] = flight
+        flight.task = asyncio.create_task(self._run(key, flight, producer))
+        return flight
+
+    async def _run(self, key: str, flight: Flight, producer: Callable[[Flight], Awaitable[Any]]) -> None:
+        try:
+            flight.finish(result=await producer(flight))
+        except asyncio.CancelledError as e:
+            flight.finish(error=e)
+            raise
+        except Exception as e:
+            flight.finish(error=e)
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def leave(self, flight: Flight, reason: str) -> bool:
+        """Detach one caller; if nobody else waits, cancel the unfinished run.
+
+        Returns True when this call cancelled the run. ``reason`` (e.g.
+        "disconnect", "deadline") is kept on the flight for the producer.
+        """
+        flight.waiters -= 1
+        if flight.waiters > 0 or flight.done or flight.task is None or flight.cancel_reason is not None:
+            return False
+        flight.cancel_reason = reason
+        flight.task.cancel()
+        self.cancelled += 1
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "runs_started": self.leaders,
+            "requests_coalesced": self.coalesced,
+            "followers": self.followers,
+            "runs_cancelled": self.cancelled,
+        }
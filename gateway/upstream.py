@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from gateway.metrics import MetricsRegistry
+
+logger = logging.getLogger("adk_practice.web.upstream")
+
+# Worth another attempt: the upstream (or a proxy in front of it) was briefly unavailable
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class UpstreamError(Exception):
+    """An upstream call that did not produce a usable answer; ``status`` is what to return to the caller."""
+
+    def __init__(self, status: int, detail: Any):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class CircuitOpen(UpstreamError):
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(503, f"Upstream {upstream} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Opens after ``failures`` consecutive failures and rejects calls for ``reset_seconds``.
+
+    After that one call goes through as a probe (half-open): success closes
+    the breaker, failure opens it again for another ``reset_seconds``.
+    """
+
+    def __init__(self, failures: int = 5, reset_seconds: float = 30.0):
+        self.failures = max(1, failures)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and self.retry_in() <= 0:
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """The call ended without an outcome (cancelled, or an unexpected error); let another probe through."""
+        self._probing = False
+
+    def success(self) -> None:
+        self.state = "closed"
+        self.consecutive = 0
+        self._probing = False
+
+    def failure(self) -> None:
+        self.consecutive += 1
+        if self.state == "half_open" or self.consecutive >= self.failures:
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class UpstreamClient:
+    """POSTs JSON to one or more equivalent upstreams over a pooled keep-alive session.
+
+    - connect and read timeouts are separate, so a dead host fails in
+      ``connect_timeout`` rather than the full read budget
+    - connection errors, timeouts and RETRY_STATUSES are retried up to
+      ``retries`` times with full-jitter exponential backoff. Only use this
+      for idempotent calls (search is a read)
+    - every upstream has its own CircuitBreaker. Attempts go to the next
+      upstream whose breaker allows it, and ``CircuitOpen`` is raised at once
+      when none does
+    - upstream_requests_total{upstream,outcome}, upstream_request_seconds{upstream,outcome},
+      upstream_retries_total{upstream} and upstream_circuit_state{upstream}
+      (0 closed, 1 half-open, 2 open) are recorded in ``registry``
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        registry: Optional[MetricsRegistry] = None,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.1,
+        pool_size: int = 32,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0,
+    ):
+        if not urls:
+            raise ValueError("UpstreamClient needs at least one URL")
+        self.urls = list(urls)
+        self.names = {url: urlsplit(url).netloc or url for url in self.urls}
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.breakers = {url: CircuitBreaker(breaker_failures, breaker_reset) for url in self.urls}
+        # last outcomes per upstream, for the error rate in stats()
+        self._recent = {url: deque(maxlen=100) for url in self.urls}
+        self._next = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        registry = registry or MetricsRegistry()
+        self.requests = registry.counter("upstream_requests_total", "Upstream HTTP attempts by outcome.", ["upstream", "outcome"])
+        self.latency = registry.histogram(
+            "upstream_request_seconds", "Upstream HTTP attempt latency.", ["upstream", "outcome"], LATENCY_BUCKETS
+        )
+        self.retried = registry.counter("upstream_retries_total", "Upstream attempts that were retries.", ["upstream"])
+        registry.gauge(
+            "upstream_circuit_state", "Circuit breaker per upstream: 0 closed, 1 half-open, 2 open.", ["upstream"],
+            lambda: {(self.names[u],): float(BREAKER_STATES[b.state]) for u, b in self.breakers.items()},
+        )
+
+    def _client(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _pick(self) -> Optional[str]:
+        """Next upstream (round robin) whose breaker lets a call through."""
+        for i in range(len(self.urls)):
+            url = self.urls[(self._next + i) % len(self.urls)]
+            if self.breakers[url].allow():
+                self._next = (self._next + i + 1) % len(self.urls)
+                return url
+        return None
+
+    def _record(self, url: str, outcome: str, started: float, attempt: int) -> None:
+        name = self.names[url]
+        self.requests.inc(upstream=name, outcome=outcome)
+        self.latency.observe(time.perf_counter() - started, upstream=name, outcome=outcome)
+        if attempt:
+            self.retried.inc(upstream=name)
+        self._recent[url].append(outcome in ("ok", "rejected"))
+
+    async def post_json(self, payload: Any, suffix: str = "") -> Any:
+        """POST ``payload`` to an upstream URL (plus ``suffix``, e.g. "/batch") and return its JSON."""
+        last: Optional[UpstreamError] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            url = self._pick()
+            if url is None:
+                if last is not None:
+                    raise last
+                soonest = min(self.breakers.values(), key=CircuitBreaker.retry_in)
+                raise CircuitOpen(", ".join(self.names.values()), soonest.retry_in())
+            breaker = self.breakers[url]
+            started = time.perf_counter()
+            try:
+                async with self._client().post(url + suffix, json=payload) as resp:
+                    if resp.status < 400:
+                        data = await resp.json(content_type=None)
+                        self._record(url, "ok", started, attempt)
+                        breaker.success()
+                        return data
+                    try:
+                        detail = await resp.json(content_type=None)
+                    except ValueError:
+                        detail = await resp.text()
+                    if resp.status not in RETRY_STATUSES:
+                        # the request itself was rejected; the upstream is healthy
+                        self._record(url, "rejected", started, attempt)
+                        breaker.success()
+                        raise UpstreamError(resp.status, detail)
+                    self._record(url, "error", started, attempt)
+                    last = UpstreamError(resp.status, detail)
+            except asyncio.TimeoutError:
+                self._record(url, "timeout", started, attempt)
+                last = UpstreamError(504, f"Upstream {self.names[url]} timed out")
+            except (aiohttp.ClientError, ValueError) as e:  # ValueError: a body that is not JSON
+                self._record(url, "error", started, attempt)
+                last = UpstreamError(502, f"Upstream {self.names[url]}: {e}")
+            finally:
+                # Cancelled or an unexpected error leave no outcome; a half-open breaker must not
+                # wait forever for this probe (after success/failure this is a no-op)
+                breaker.release()
+            breaker.failure()
+            logger.warning("Upstream %s attempt %d failed: %s", self.names[url], attempt + 1, last.detail)
+        raise last  # type: ignore[misc]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            self.names[url]: {
+                "state": breaker.state,
+                "consecutive_failures": breaker.consecutive,
+                "opens": breaker.opens,
+                "error_rate": round(1 - sum(self._recent[url]) / len(self._recent[url]), 3) if self._recent[url] else 0.0,
+            }
+            for url, breaker in self.breakers.items()
+        }
+
+
+class MicroBatcher:
+    """Collects concurrent single calls into one upstream batch call.
+
+    ``submit(item)`` waits up to ``linger`` seconds (or until ``max_items``
+    are queued) for company, then ``send`` receives the items as a list and
+    returns one answer per item, in order. An answer that is an exception is
+    raised to that item's caller only; if ``send`` itself fails, every item
+    of the batch gets the error.
+    """
+
+    def __init__(self, send: Callable[[list[Any]], Awaitable[list[Any]]], max_items: int = 32, linger: float = 0.002):
+        self.send = send
+        self.max_items = max(1, max_items)
+        self.linger = linger
+        self._queue: list[tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((item, future))
+        if len(self._queue) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list[tuple[Any, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            answers = await self.send([item for item, _ in batch])
+            if len(answers) != len(batch):
+                raise UpstreamError(502, f"Upstream batch returned {len(answers)} answers for {len(batch)} requests")
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            answers = [e] * len(batch)
+        for (_, future), answer in zip(batch, answers):
+            if future.done():
+                continue  # that caller went away
+            if isinstance(answer, BaseException):
+                future.set_exception(answer)
+            else:
+                future.set_result(answer)
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in list(self._tasks):
+            task.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        return {"batches": self.batches, "items": self.items, "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0}
+
+
+def upstream_from_env(urls: str, registry: Optional[MetricsRegistry] = None, prefix: str = "VECTOR_UPSTREAM") -> UpstreamClient:
+    """UpstreamClient for comma-separated ``urls``, tuned by ``<prefix>_*`` variables.
+
+    CONNECT_TIMEOUT (2 s), READ_TIMEOUT (10 s), RETRIES (2), RETRY_BACKOFF (0.1 s),
+    POOL_SIZE (32), BREAKER_FAILURES (5), BREAKER_RESET (30 s).
+    """
+    def env(name: str, default: str) -> float:
+        return float(os.getenv(f"{prefix}_{name}", default))
+
+    return UpstreamClient(
+        [u.strip() for u in urls.split(",") if u.strip()],
+        registry,
+        connect_timeout=env("CONNECT_TIMEOUT", "2"),
+        read_timeout=env("READ_TIMEOUT", "10"),
+        retries=int(env("RETRIES", "2")),
+        backoff=env("RETRY_BACKOFF", "0.1"),
+        pool_size=int(env("POOL_SIZE", "32")),
+        breaker_failures=int(env("BREAKER_FAILURES", "5")),
+        breaker_reset=env("BREAKER_RESET", "30"),
+    )
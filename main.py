@@ -1,23 +1,37 @@
 from __future__ import annotations
 
-import base64
-import importlib.util
+import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
-import re
 import os
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 import urllib.parse
-import requests
 from dotenv import load_dotenv
 
-from google.adk.runners import InMemoryRunner
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types
 
+from gateway.agents import AgentLoader
+from gateway.aggregate import EventAggregator
+from gateway.cache import cache_from_env, cache_key, normalize_query
+from gateway.cancellation import ClientGone, RunCost, wait_for_client
+from gateway.compression import CompressionMiddleware
+from gateway.concurrency import AdmissionScheduler, Overloaded
+from gateway.images import ImageProxy
+from gateway.looplag import LoopLagMonitor
+from gateway.metrics import MetricsPlugin, MetricsRegistry
+from gateway.events import ToolTimer, event_payload, sse
+from gateway.runners import RunnerRegistry
+from gateway.serialization import FastJSONResponse, dumps_str
+from gateway.sessions import SESSION_ID_PATTERN, SessionLocks, new_session_id, register_session_gauges, session_service_from_env
+from gateway.singleflight import Flight, SingleFlight
+
 # Load environment variables from .env
 load_dotenv()
 
@@ -26,143 +40,160 @@ logger = logging.getLogger("adk_practice.web")
 
 PROJECT_ROOT = Path(__file__).parent
 
-# --- Dynamically load both agents (folders may contain hyphens) ---
-AGENTS: dict[str, object] = {}
-
-# e-commerce
-try:
-    ecom_path = PROJECT_ROOT / "e-commerce" / "agent.py"
-    if ecom_path.exists():
-        spec = importlib.util.spec_from_file_location("e_commerce_agent_module", ecom_path)
-        if spec and spec.loader:
-            mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(mod)  # type: ignore[attr-defined]
-            root = getattr(mod, "root_agent", None)
-            if root is not None:
-                AGENTS["ecommerce"] = root
-            else:
-                logger.warning("e-commerce root_agent not found in %s", ecom_path)
-    else:
-        logger.info("e-commerce agent file not found: %s", ecom_path)
-except Exception:
-    logger.exception("Failed to load e-commerce agent")
-
-# brand-SEO
-try:
-    bseo_path = PROJECT_ROOT / "brand-SEO" / "agent.py"
-    if bseo_path.exists():
-        spec = importlib.util.spec_from_file_location("brand_seo_agent_module", bseo_path)
-        if spec and spec.loader:
-            mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(mod)  # type: ignore[attr-defined]
-            root = getattr(mod, "root_agent", None)
-            if root is not None:
-                AGENTS["brand-seo"] = root
-            else:
-                logger.warning("brand-SEO root_agent not found in %s", bseo_path)
-    else:
-        logger.info("brand-SEO agent file not found: %s", bseo_path)
-except Exception:
-    logger.exception("Failed to load brand-SEO agent")
-
-if not AGENTS:
-    logger.error("No agents loaded. Check project files.")
+# --- Agents load lazily on first use (folders may contain hyphens) ---
+# Each mode lists candidate files; the first that exists is loaded.
+LOADER = AgentLoader({
+    "ecommerce": (
+        [PROJECT_ROOT / "e-commerce" / "agent.py", PROJECT_ROOT / "Agentic-Tools" / "e-commerce" / "agent.py"],
+        "e_commerce_agent_module",
+    ),
+    "brand-seo": ([PROJECT_ROOT / "brand-SEO" / "agent.py"], "brand_seo_agent_module"),
+})
+# Modes to import at startup instead of on first request ("all" for every mode)
+PRELOAD_MODES = [m.strip().lower() for m in os.getenv("GATEWAY_PRELOAD", "").split(",") if m.strip()]
+if PRELOAD_MODES == ["all"]:
+    PRELOAD_MODES = LOADER.modes()
+
+if not LOADER.modes():
+    logger.error("No agent files found. Check project files.")
 
 DEFAULT_MODE = os.getenv("APP_AGENT", "ecommerce").lower()
-if DEFAULT_MODE not in AGENTS:
+if DEFAULT_MODE not in LOADER.modes() and LOADER.modes():
     # Fallback to any available agent
-    DEFAULT_MODE = next(iter(AGENTS.keys()))
+    DEFAULT_MODE = LOADER.modes()[0]
     logger.warning("APP_AGENT not available; defaulting to %s", DEFAULT_MODE)
 
 # Proactive env guidance
-if "brand-seo" in AGENTS:
+if "brand-seo" in LOADER.modes():
     if not (os.getenv("GOOGLE_CSE_ID") and os.getenv("GOOGLE_SEARCH_API_KEY")):
         logger.warning("[brand-seo] GOOGLE_CSE_ID/GOOGLE_SEARCH_API_KEY not set; keyword_finding and SERP tools may be limited.")
     if os.getenv("HEADLESS") in (None, "",):
         logger.info("[brand-seo] HEADLESS defaults to 1 for Selenium. Set HEADLESS=1 on servers without display.")
 
+# Prometheus-style series for GET /metrics; the plugin fills them from ADK callbacks
+METRICS = MetricsRegistry()
+REQUEST_SECONDS = METRICS.histogram(
+    "gateway_request_duration_seconds", "End-to-end /query latency (including queue wait).", ["mode", "endpoint", "outcome"]
+)
+# One long-lived runner per mode; all share a session service so turns with the
+# same session_id continue the conversation. SESSION_BACKEND=sqlite/redis shares
+# sessions across uvicorn workers and hosts.
+METRICS_PLUGIN = MetricsPlugin(METRICS)
+RUNNERS = RunnerRegistry(session_service=session_service_from_env(), plugins=[METRICS_PLUGIN])
+register_session_gauges(METRICS, RUNNERS.session_service)
+# Turns on one session run in arrival order; different sessions never wait on each other
+SESSION_LOCKS = SessionLocks()
+# Per-mode run caps with a bounded priority queue (GATEWAY_CONCURRENCY, GATEWAY_QUEUE*)
+SCHEDULER = AdmissionScheduler()
+# Opt-in response cache (GATEWAY_CACHE=memory|sqlite); None when disabled
+RESPONSE_CACHE = cache_from_env()
+# Part of the cache key; bump it when prompts or agent trees change
+AGENT_VERSION = os.getenv("GATEWAY_AGENT_VERSION", "0.2.0")
+# Coalesce identical in-flight requests onto one run (GATEWAY_SINGLE_FLIGHT=0 disables)
+# Streams keep at most GATEWAY_STREAM_BACKLOG recent frames per run for late joiners
+FLIGHTS = SingleFlight(
+    enabled=os.getenv("GATEWAY_SINGLE_FLIGHT", "1") not in ("0", "false", "False"),
+    backlog=int(os.getenv("GATEWAY_STREAM_BACKLOG", "256")),
+)
+# Runs are cancelled once every caller has disconnected or passed its deadline
+# (request "timeout", capped by GATEWAY_RUN_DEADLINE seconds; <= 0 means none)
+RUN_DEADLINE = float(os.getenv("GATEWAY_RUN_DEADLINE", "300"))
+RUN_COST = RunCost(METRICS)
+# /img proxy with pooled upstream connections and a disk cache (IMG_* env vars)
+IMAGES = ImageProxy()
+
+
+def _scheduler_gauge(field: str):
+    return lambda: {(mode,): s[field] for mode, s in SCHEDULER.stats()["modes"].items()}
+
+
+METRICS.gauge("gateway_queue_depth", "Requests waiting for a run slot.", ["mode"], _scheduler_gauge("queued"))
+METRICS.gauge("gateway_runs_in_progress", "Agent runs holding a slot.", ["mode"], _scheduler_gauge("running"))
+METRICS.gauge("gateway_queue_wait_p95_ms", "p95 queue wait over recent admissions.", ["mode"], _scheduler_gauge("wait_ms_p95"))
+# Periodic probe that exposes blocking calls on the event loop (GATEWAY_LOOP_LAG_INTERVAL)
+LOOP_LAG = LoopLagMonitor(METRICS)
+
+
+async def _warm(modes: list[str]) -> dict[str, object]:
+    """Import the given modes and build their runners; failures are reported, not raised."""
+    for mode in modes:
+        try:
+            RUNNERS.get(mode, await LOADER.get(mode))
+        except (LookupError, RuntimeError):
+            logger.warning("Warm-up of %s failed", mode)
+    return {mode: LOADER.report().get(mode) for mode in modes}
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    LOOP_LAG.start()
+    # Only GATEWAY_PRELOAD modes are imported up front; the rest load on first use
+    if PRELOAD_MODES:
+        await _warm(PRELOAD_MODES)
+    yield
+    await LOOP_LAG.stop()
+    await RUNNERS.close()
+    await IMAGES.close()
+
+
 # --- FastAPI app ---
-app = FastAPI(title="ADK Practice Search UI", version="0.2.0")
+app = FastAPI(title="ADK Practice Search UI", version="0.2.0", lifespan=lifespan)
+# gzip/brotli for bodies >= GATEWAY_COMPRESS_MIN_BYTES (rendered html/text add up fast)
+app.add_middleware(CompressionMiddleware, registry=METRICS)
 
 
 class QueryIn(BaseModel):
     query: str
     mode: Optional[str] = None  # "ecommerce" | "brand-seo"
-    user_id: Optional[str] = "user-1"
-    session_id: Optional[str] = "session-001"
+    # Omit session_id to get a fresh one (returned as "session_id" / X-Session-Id);
+    # without user_id the session gets an anonymous user of its own
+    user_id: Optional[str] = Field(default=None, pattern=SESSION_ID_PATTERN)
+    session_id: Optional[str] = Field(default=None, pattern=SESSION_ID_PATTERN)
+    priority: Optional[str] = None  # "high" | "normal" | "low" when queued
+    timeout: Optional[float] = Field(default=None, gt=0)  # seconds; capped by GATEWAY_RUN_DEADLINE
 
 
-def _extract_text_and_html(gen_content: Optional[types.Content]) -> tuple[str, str, list[str]]:
-    """Extract concatenated text and any HTML-like rendered content.
-    Tries multiple known locations for rendered HTML returned by Gemini 2.
-    """
-    if not gen_content or not getattr(gen_content, "parts", None):
-        return "", "", []
-
-    texts: list[str] = []
-    htmls: list[str] = []
-    images: list[str] = []
-    for part in gen_content.parts:
-        # Text parts
-        txt = getattr(part, "text", None)
-        if isinstance(txt, str) and txt:
-            texts.append(txt)
-            # Parse markdown images: ![alt](url)
-            for m in re.findall(r"!\[[^\]]*\]\((https?[^\s)]+)\)", txt):
-                images.append(m)
-        # Possible rendered HTML in known fields
-        for maybe_html_attr in ("rendered_content", "renderedContent", "html"):
-            h = getattr(part, maybe_html_attr, None)
-            if isinstance(h, str) and h:
-                htmls.append(h)
-        # Inline data that could be HTML
-        inline = getattr(part, "inline_data", None)
-        if inline is not None:
-            mt = getattr(inline, "mime_type", None)
-            data = getattr(inline, "data", None)
-            if mt in ("text/html", "application/html") and data:
-                try:
-                    if isinstance(data, (bytes, bytearray)):
-                        htmls.append(data.decode("utf-8", errors="ignore"))
-                    elif isinstance(data, str):
-                        # Some SDKs may base64 encode to str
-                        htmls.append(base64.b64decode(data).decode("utf-8", errors="ignore"))
-                except Exception:
-                    # Ignore decoding errors; fallback on text only
-                    pass
-    return ("\n".join(texts).strip(), "\n".join(htmls).strip(), images)
+class BatchItem(QueryIn):
+    id: Optional[str] = None  # echoed back so clients can match results
+    priority: Optional[str] = "low"  # batch work yields to interactive /query traffic
+
 
+# Upper bounds for /query/batch; a request may ask for less
+BATCH_MAX_ITEMS = int(os.getenv("GATEWAY_BATCH_MAX_ITEMS", "500"))
+BATCH_PARALLELISM = int(os.getenv("GATEWAY_BATCH_PARALLELISM", "8"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("GATEWAY_BATCH_ITEM_TIMEOUT", "120"))
 
-def _is_direct_image_url(u: str) -> bool:
-    u = u.lower()
-    return any(u.endswith(ext) for ext in (".jpg", ".jpeg", ".png", ".webp", ".gif"))
+
+class BatchIn(BaseModel):
+    items: list[BatchItem] = Field(min_length=1)
+    parallelism: Optional[int] = Field(default=None, ge=1)
+    timeout: Optional[float] = Field(default=None, gt=0)  # seconds per item
 
 
 @app.get("/img")
-def proxy_image(u: str):
-    # Very small proxy to avoid hotlink restrictions. Not production-hardened.
-    if not (u.startswith("http://") or u.startswith("https://")):
-        raise HTTPException(status_code=400, detail="Invalid URL")
-    try:
-        resp = requests.get(u, timeout=10, headers={
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
-        })
-        ct = resp.headers.get("Content-Type", "application/octet-stream")
-        if resp.status_code != 200:
-            raise HTTPException(status_code=resp.status_code, detail="Upstream error")
-        # Only serve images
-        if not ct.startswith("image/") and not _is_direct_image_url(u):
-            raise HTTPException(status_code=415, detail="Not an image")
-        return Response(content=resp.content, media_type=ct)
-    except requests.Timeout:
-        raise HTTPException(status_code=504, detail="Image fetch timeout")
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+async def proxy_image(
+    u: str,
+    request: Request,
+    w: Optional[int] = Query(default=None, ge=1),
+    h: Optional[int] = Query(default=None, ge=1),
+    fmt: Optional[str] = None,
+):
+    # Proxy to avoid hotlink restrictions: pooled upstream connections, streamed
+    # bodies (size-capped) and an on-disk cache with revalidation and Range support.
+    # w/h/fmt return a resized derivative (cover-cropped when both are given).
+    return await IMAGES.serve(
+        u,
+        range_header=request.headers.get("range"),
+        if_none_match=request.headers.get("if-none-match"),
+        width=w,
+        height=h,
+        fmt=fmt,
+    )
 
 
-@app.get("/")
+@app.get("/", response_class=HTMLResponse)
 async def index():
-    # Simple UI that posts to /query and renders both text and HTML snippet; includes mode selector
+    # Simple UI that streams /query/stream events and renders text, HTML snippet and gallery; includes mode selector
     return (
         """
         <!doctype html>
@@ -194,6 +225,8 @@ async def index():
               </div>
             </form>
             <div id="status"></div>
+            <h2>Agent activity</h2>
+            <ol id="events"></ol>
             <h2>Rendered HTML</h2>
             <div id="html"></div>
             <h2>Image Gallery (markdown fallback)</h2>
@@ -205,39 +238,113 @@ async def index():
               const q = document.getElementById('q');
               const mode = document.getElementById('mode');
               const status = document.getElementById('status');
+              const events = document.getElementById('events');
               const html = document.getElementById('html');
               const gallery = document.getElementById('gallery');
               const text = document.getElementById('text');
-              // Default selection from server-side env (best-effort via dataset or URL param not available; leave default order)
+
+              function renderFinal(data) {
+                status.textContent = data.error ? ('Error: ' + data.error) : 'Done';
+                if (data.html) html.innerHTML = data.html; // Render HTML snippet with images
+                gallery.innerHTML = '';
+                if (Array.isArray(data.images)) {
+                  for (const u of data.images) {
+                    // 2x the 160x140 tile, re-encoded as WebP by the proxy
+                    const proxied = '/img?u=' + encodeURIComponent(u) + '&w=320&h=280&fmt=webp';
+                    const a = document.createElement('a');
+                    a.href = u; a.target = '_blank'; a.rel = 'noopener noreferrer';
+                    const img = document.createElement('img');
+                    img.loading = 'lazy'; img.decoding = 'async'; img.src = proxied; img.alt = 'image';
+                    a.appendChild(img);
+                    gallery.appendChild(a);
+                  }
+                }
+                if (data.text) text.textContent = data.text; // Fallback text/markdown
+              }
+
+              // One line per agent event: author, tool calls (with duration) and state keys
+              function renderEvent(ev) {
+                const bits = [];
+                for (const c of ev.tool_calls || []) bits.push('calls ' + c.name);
+                for (const r of ev.tool_results || []) bits.push(r.name + ' done' + (r.duration_ms != null ? ' in ' + r.duration_ms + ' ms' : ''));
+                if (ev.transfer_to_agent) bits.push('transfers to ' + ev.transfer_to_agent);
+                if (ev.state_delta) bits.push('updates ' + Object.keys(ev.state_delta).join(', '));
+                if (ev.partial && ev.text) {
+                  text.textContent += ev.text; // live partial text
+                  return;
+                }
+                if (ev.text && !bits.length) bits.push('says ' + ev.text.slice(0, 120) + (ev.text.length > 120 ? '...' : ''));
+                if (!bits.length) return;
+                const li = document.createElement('li');
+                li.textContent = ev.author + ': ' + bits.join('; ');
+                events.appendChild(li);
+                status.textContent = 'Working... (' + ev.author + ')';
+              }
+
+              // The server issues a session on the first turn; keep it for this tab
+              let sessionId = sessionStorage.getItem('adk-session');
+              function remember(resp) {
+                const sid = resp.headers.get('X-Session-Id');
+                if (sid) { sessionId = sid; sessionStorage.setItem('adk-session', sid); }
+              }
+
+              async function streamQuery(payload) {
+                const resp = await fetch('/query/stream', {
+                  method: 'POST',
+                  headers: { 'Content-Type': 'application/json' },
+                  body: JSON.stringify(payload)
+                });
+                if (!resp.ok || !resp.body) throw new Error('stream unavailable');
+                remember(resp);
+                const reader = resp.body.getReader();
+                const decoder = new TextDecoder();
+                let buf = '';
+                for (;;) {
+                  const { value, done } = await reader.read();
+                  if (done) break;
+                  buf += decoder.decode(value, { stream: true });
+                  let idx;
+                  while ((idx = buf.indexOf('\\n\\n')) >= 0) {
+                    const frame = buf.slice(0, idx);
+                    buf = buf.slice(idx + 2);
+                    let name = 'message', data = '';
+                    for (const line of frame.split('\\n')) {
+                      if (line.startsWith('event: ')) name = line.slice(7);
+                      else if (line.startsWith('data: ')) data += line.slice(6);
+                    }
+                    if (!data) continue;
+                    const obj = JSON.parse(data);
+                    if (name === 'event') renderEvent(obj);
+                    else if (name === 'done') renderFinal(obj);
+                    else if (name === 'error') renderFinal({ error: obj.error });
+                  }
+                }
+              }
+
               f.addEventListener('submit', async (e) => {
                 e.preventDefault();
                 status.textContent = 'Working...';
+                events.innerHTML = '';
                 html.innerHTML = '';
                 gallery.innerHTML = '';
                 text.textContent = '';
+                const payload = { query: q.value, mode: mode.value };
+                if (sessionId) payload.session_id = sessionId;
                 try {
-                  const resp = await fetch('/query', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ query: q.value, mode: mode.value })
-                  });
-                  const data = await resp.json();
-                  status.textContent = data.error ? ('Error: ' + data.error) : 'Done';
-                  if (data.html) html.innerHTML = data.html; // Render HTML snippet with images
-                  if (Array.isArray(data.images)) {
-                    for (const u of data.images) {
-                      const proxied = '/img?u=' + encodeURIComponent(u);
-                      const a = document.createElement('a');
-                      a.href = u; a.target = '_blank'; a.rel = 'noopener noreferrer';
-                      const img = document.createElement('img');
-                      img.loading = 'lazy'; img.decoding = 'async'; img.src = proxied; img.alt = 'image';
-                      a.appendChild(img);
-                      gallery.appendChild(a);
-                    }
-                  }
-                  if (data.text) text.textContent = data.text; // Fallback text/markdown
+                  await streamQuery(payload);
                 } catch (err) {
-                  status.textContent = 'Request failed';
+                  // Fall back to the buffered endpoint
+                  try {
+                    const resp = await fetch('/query', {
+                      method: 'POST',
+                      headers: { 'Content-Type': 'application/json' },
+                      body: JSON.stringify(payload)
+                    });
+                    remember(resp);
+                    renderFinal(await resp.json());
+                  } catch (err2) {
+                    status.textContent = 'Request failed';
+                  }
                 }
               });
             </script>
@@ -247,15 +354,17 @@ async def index():
     )
 
 
-@app.post("/query")
-async def query(body: QueryIn):
-    if not AGENTS:
+async def _resolve_mode(body: QueryIn) -> tuple[str, object]:
+    if not LOADER.modes():
         raise HTTPException(status_code=500, detail="No agents loaded")
 
     mode = (body.mode or DEFAULT_MODE).lower()
-    agent = AGENTS.get(mode)
-    if agent is None:
+    try:
+        agent = await LOADER.get(mode)
+    except LookupError:
         raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=f"Agent for {mode} failed to load: {e}")
 
     # Hints for brand-SEO runtime dependencies
     if mode == "brand-seo":
@@ -263,25 +372,425 @@ async def query(body: QueryIn):
             logger.warning("[brand-seo] Missing Google CSE env; keyword_finding/search tools may be limited.")
         # Selenium defaults headless true in tools; just log guidance
         logger.info("[brand-seo] Ensure Chrome/Chromium is installed or HEADLESS=1 for server environments.")
+    return mode, agent
+
 
-    runner = InMemoryRunner(agent=agent, app_name=f"adk-practice-web:{mode}")
+async def _cache_lookup_key(body: QueryIn) -> Optional[str]:
+    """Response cache key for a request, or None when it must not be cached.
 
+    Only a session's first turn is cacheable: later answers depend on the
+    conversation so far, which the key does not cover.
+    """
+    if RESPONSE_CACHE is None:
+        return None
+    mode = (body.mode or DEFAULT_MODE).lower()
+    if await RUNNERS.history_length(mode, body.user_id, body.session_id):
+        return None
+    return cache_key(mode, body.query, AGENT_VERSION)
+
+
+async def _cached_response(key: Optional[str], body: QueryIn, request: Request) -> Optional[tuple[dict, float]]:
+    """Cached (result, age) for the request, recorded as a turn of the caller's session."""
+    # "Cache-Control: no-cache" forces a fresh run (the result is still stored)
+    if key is None or "no-cache" in request.headers.get("cache-control", "").lower():
+        return None
+    cached = await RESPONSE_CACHE.get(key)
+    if cached is not None:
+        # A hit skips the runner; the session still gets the question and answer
+        mode, agent = await _resolve_mode(body)
+        async with SESSION_LOCKS.hold((RUNNERS.app_name(mode), body.user_id, body.session_id)):
+            await RUNNERS.record_turn(mode, body.user_id, body.session_id, agent.name, body.query, cached[0].get("text") or "")
+    return cached
+
+
+async def _run_agent(flight: Flight, mode: str, agent: object, body: QueryIn, streaming: bool, key: Optional[str]) -> dict:
+    """Run the agent once, publishing a summary of each event to ``flight``'s streams."""
+    runner = RUNNERS.get(mode, agent)
+    user_id, session_id = body.user_id, body.session_id
     user_msg = types.Content(role="user", parts=[types.Part(text=body.query)])
+    # SSE streaming mode makes the model yield partial text chunks as they arrive
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE) if streaming else None
+
+    timer = ToolTimer()
+    # Folds each event in as it arrives instead of keeping the stream around
+    aggregate = EventAggregator()
+    llm_calls = 0
+    run_started = time.perf_counter()
+    try:
+        await RUNNERS.ensure_session(mode, user_id, session_id)
+        # run_async keeps the event loop free for other clients while the agent works.
+        # The session lock comes first so a turn queued behind its own session does
+        # not hold a run slot meanwhile.
+        async with SESSION_LOCKS.hold((RUNNERS.app_name(mode), user_id, session_id)), SCHEDULER.slot(mode, body.priority):
+            if (key is not None or flight.owner is not None) and await RUNNERS.history_length(mode, user_id, session_id):
+                # Another turn on this session finished first; this answer depends on it
+                key = None
+                flight.shareable = False
+            flight.mark_started()
+            run_started = time.perf_counter()
+            # A cancelled run skips the plugin's after-run callback; the scope cleans up for it
+            with METRICS_PLUGIN.scope():
+                async for event in runner.run_async(
+                    user_id=user_id,
+                    session_id=session_id,
+                    new_message=user_msg,
+                    run_config=run_config,
+                ):
+                    if not event.author or event.author == "user":
+                        continue
+                    if not event.partial:
+                        aggregate.add(event)
+                        llm_calls += bool(event.content and event.content.role == "model")
+                    flight.publish(event_payload(event, timer))
+    except asyncio.CancelledError:
+        # Every caller left: the cancellation already stopped the model call or
+        # tool in progress (queued Selenium commands are dropped with it)
+        RUN_COST.cancelled_run(
+            mode, flight.cancel_reason or "shutdown", flight.started,
+            time.perf_counter() - run_started if flight.started else 0.0, llm_calls, timer.pending,
+        )
+        raise
+    except Overloaded:
+        raise
+    except Exception:
+        logger.exception("Agent run failed")
+        raise
+
+    RUN_COST.finished(mode, time.perf_counter() - run_started, llm_calls)
+    result = aggregate.result()
+    if key is not None:
+        await RESPONSE_CACHE.set(key, result)
+    return result
+
+
+async def _follow(flight: Flight, shared: Flight, mode: str, agent: object, body: QueryIn, streaming: bool, key: Optional[str]) -> dict:
+    """Relay another session's run of the same first turn, then record its answer in this session."""
+    leave_reason = "disconnect"
+    try:
+        await shared.until_started()
+        if shared.shareable:
+            flight.mark_started()
+            if streaming:
+                async for frame in shared.frames_iter():
+                    flight.publish(frame)
+            result = await shared.wait()
+        leave_reason = "done"
+    except asyncio.CancelledError:
+        leave_reason = flight.cancel_reason or leave_reason
+        raise
+    finally:
+        FLIGHTS.leave(shared, leave_reason)
+    if shared.shareable:
+        async with SESSION_LOCKS.hold((RUNNERS.app_name(mode), body.user_id, body.session_id)):
+            if not await RUNNERS.history_length(mode, body.user_id, body.session_id):
+                await RUNNERS.record_turn(mode, body.user_id, body.session_id, agent.name, body.query, result.get("text") or "")
+                return result
+    # One of the two sessions got another turn in first, so the shared answer is not this turn's
+    return await _run_agent(flight, mode, agent, body, streaming, key)
+
+
+async def _join_run(mode: str, agent: object, body: QueryIn, streaming: bool, key: Optional[str]) -> Flight:
+    # Identical requests in flight on one session (a double submit, a client
+    # retry) share one run and one recorded turn. A first turn does not depend
+    # on any history, so fresh sessions asking the same question share one run
+    # too: it runs on the first caller's session, and each other session
+    # follows it and records the answer as its own turn. Later turns depend on
+    # their session's history and only share within that session.
+    query_key = normalize_query(body.query)
+    owner = (body.user_id, body.session_id)
+    own_key = "\x00".join((mode, *owner, query_key))
+    produce = lambda flight: _run_agent(flight, mode, agent, body, streaming, key)  # noqa: E731
+    if await RUNNERS.history_length(mode, *owner):
+        flight = FLIGHTS.join(own_key, produce)
+    else:
+        flight = FLIGHTS.join("\x00".join((mode, query_key)), produce)
+        if flight.owner is None:
+            flight.owner = owner
+        elif flight.owner != owner:
+            shared = flight
+            if streaming:
+                shared.subscribe()
+            flight = FLIGHTS.join(
+                own_key, lambda f: _follow(f, shared, mode, agent, body, streaming, key), follower=True
+            )
+    if streaming:
+        flight.subscribe()  # before the run can publish, so the stream starts at its first frame
+    return flight
+
+
+def _observe(body: QueryIn, endpoint: str, outcome: str, started: float) -> None:
+    # Unknown modes share one label so clients cannot blow up series cardinality
+    mode = (body.mode or DEFAULT_MODE).lower()
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        mode=mode if mode in LOADER.sources else "unknown",
+        endpoint=endpoint,
+        outcome=outcome,
+    )
+
+
+def _deadline(body: QueryIn) -> Optional[float]:
+    """Seconds this caller will wait for its run; None means no limit."""
+    if RUN_DEADLINE <= 0:
+        return body.timeout
+    return min(body.timeout or RUN_DEADLINE, RUN_DEADLINE)
+
 
-    last_model_event_content: Optional[types.Content] = None
+def _identify(body: QueryIn) -> dict[str, str]:
+    """Issue a session to callers without one; returns the header that tells them its id."""
+    if not body.session_id:
+        body.session_id = new_session_id()
+    if not body.user_id:
+        # Anonymous sessions get a user of their own, so "user:" state is not shared either
+        body.user_id = f"anon-{body.session_id}"
+    return {"X-Session-Id": body.session_id}
+
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=e.status, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+
+@app.post("/query")
+async def query(body: QueryIn, request: Request):
+    started = time.perf_counter()
+    session_header = _identify(body)
+    key = await _cache_lookup_key(body)
+    cached = await _cached_response(key, body, request)
+    if cached is not None:
+        # Cache hits skip the runner
+        value, age = cached
+        _observe(body, "query", "cache_hit", started)
+        return FastJSONResponse(
+            {**value, "session_id": body.session_id}, headers={**session_header, "X-Cache": "HIT", "Age": str(int(age))}
+        )
+
+    mode, agent = await _resolve_mode(body)
+    flight = await _join_run(mode, agent, body, streaming=False, key=key)
+    leave_reason = None
     try:
-        for event in runner.run(
-            user_id=body.user_id or "user-1",
-            session_id=body.session_id or "session-001",
-            new_message=user_msg,
-        ):
-            if getattr(event, "author", None) and event.author != "user":
-                # Keep the last non-user content as candidate for display
-                last_model_event_content = getattr(event, "content", None)
+        result = await wait_for_client(request, flight.wait(), _deadline(body))
+    except ClientGone:
+        # Nobody will read the answer; 499 (client closed request) is only logged
+        leave_reason = "disconnect"
+        _observe(body, "query", "disconnected", started)
+        return Response(status_code=499)
+    except asyncio.TimeoutError:
+        leave_reason = "deadline"
+        _observe(body, "query", "timeout", started)
+        raise HTTPException(status_code=504, detail=f"No answer within {_deadline(body):g}s")
+    except Overloaded as e:
+        _observe(body, "query", "rejected", started)
+        raise _overloaded(e)
     except Exception as e:
-        logger.exception("Agent run failed")
+        _observe(body, "query", "error", started)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # The last caller to give up cancels the run
+        FLIGHTS.leave(flight, leave_reason or "done")
+
+    _observe(body, "query", "ok", started)
+    if key is not None:
+        session_header["X-Cache"] = "MISS"
+    # Returned as bytes straight away; FastAPI's jsonable_encoder pass is skipped.
+    # The session id is added per caller: the run's result is shared and cached.
+    return FastJSONResponse({**result, "session_id": body.session_id}, headers=session_header)
 
-    text, html, images = _extract_text_and_html(last_model_event_content)
 
-    return {"text": text, "html": html, "images": images}
+@app.post("/query/stream")
+async def query_stream(body: QueryIn, request: Request):
+    """Same as /query, but emits each agent event as Server-Sent Events.
+
+    Frames: "event" (author, partial text, tool calls/durations, state_delta),
+    then one "done" with the final text/html/images, or "error". A cache hit
+    sends just the "done" frame.
+    """
+    started = time.perf_counter()
+    sse_headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **_identify(body)}
+    key = await _cache_lookup_key(body)
+    cached = await _cached_response(key, body, request)
+    if cached is not None:
+        value, age = cached
+        _observe(body, "stream", "cache_hit", started)
+
+        async def cached_frames():
+            yield sse("done", {**value, "session_id": body.session_id})
+
+        return StreamingResponse(
+            cached_frames(),
+            media_type="text/event-stream",
+            headers={**sse_headers, "X-Cache": "HIT", "Age": str(int(age))},
+        )
+
+    mode, agent = await _resolve_mode(body)
+    flight = await _join_run(mode, agent, body, streaming=True, key=key)
+    deadline = _deadline(body)
+    # Wait for admission so a saturated mode answers 429/503 instead of an open stream
+    try:
+        await wait_for_client(request, flight.until_started(), deadline)
+    except (ClientGone, asyncio.TimeoutError) as e:
+        gone = isinstance(e, ClientGone)
+        FLIGHTS.leave(flight, "disconnect" if gone else "deadline")
+        _observe(body, "stream", "disconnected" if gone else "timeout", started)
+        if gone:
+            return Response(status_code=499)
+        raise HTTPException(status_code=504, detail=f"Could not start within {deadline:g}s")
+    if isinstance(flight.error, Overloaded):
+        FLIGHTS.leave(flight, "done")
+        _observe(body, "stream", "rejected", started)
+        raise _overloaded(flight.error)
+
+    async def frames():
+        # Starlette closes this generator when the client goes away; leaving the
+        # flight then cancels the run unless another caller still follows it
+        leave_reason = "disconnect"
+        end = started + deadline if deadline else None
+        events = flight.frames_iter()
+        try:
+            while True:
+                remaining = None if end is None else max(0.0, end - time.perf_counter())
+                try:
+                    payload = await asyncio.wait_for(anext(events), remaining)
+                except StopAsyncIteration:
+                    break
+                yield sse("event", payload)
+            leave_reason = "done"
+            result = await flight.wait()
+        except asyncio.TimeoutError:
+            leave_reason = "deadline"
+            _observe(body, "stream", "timeout", started)
+            yield sse("error", {"error": f"No answer within {deadline:g}s", "code": 504})
+            return
+        except Exception as e:
+            _observe(body, "stream", "error", started)
+            yield sse("error", {"error": str(e)})
+            return
+        finally:
+            FLIGHTS.leave(flight, leave_reason)
+        _observe(body, "stream", "ok", started)
+        yield sse("done", {**result, "session_id": body.session_id})
+
+    if key is not None:
+        sse_headers["X-Cache"] = "MISS"
+    return StreamingResponse(frames(), media_type="text/event-stream", headers=sse_headers)
+
+
+async def _batch_item(index: int, item: BatchItem, request: Request, timeout: float) -> dict:
+    """Answer one batch item like /query would; failures become an error record."""
+    started = time.perf_counter()
+    _identify(item)
+    out: dict = {"index": index, "id": item.id, "mode": (item.mode or DEFAULT_MODE).lower(), "session_id": item.session_id}
+    timeout = min(item.timeout or timeout, timeout)
+    try:
+        key = await _cache_lookup_key(item)
+        cached = await _cached_response(key, item, request)
+        if cached is not None:
+            out.update(status="ok", cached=True, result=cached[0])
+            _observe(item, "batch", "cache_hit", started)
+        else:
+            mode, agent = await _resolve_mode(item)
+            flight = await _join_run(mode, agent, item, streaming=False, key=key)
+            leave_reason = "done"
+            try:
+                result = await asyncio.wait_for(flight.wait(), timeout)
+            except asyncio.TimeoutError:
+                leave_reason = "deadline"
+                raise
+            except asyncio.CancelledError:
+                leave_reason = "disconnect"  # the client left and the batch is being torn down
+                raise
+            finally:
+                # Cancels the run unless another caller still waits for it
+                FLIGHTS.leave(flight, leave_reason)
+            out.update(status="ok", cached=False, result=result)
+            _observe(item, "batch", "ok", started)
+    except Overloaded as e:
+        out.update(status="error", code=e.status, error=e.reason, retry_after=e.retry_after)
+        _observe(item, "batch", "rejected", started)
+    except HTTPException as e:
+        out.update(status="error", code=e.status_code, error=e.detail)
+        _observe(item, "batch", "error", started)
+    except asyncio.TimeoutError:
+        out.update(status="error", code=504, error=f"Timed out after {timeout:g}s")
+        _observe(item, "batch", "timeout", started)
+    except Exception as e:
+        logger.exception("Batch item %s failed", index)
+        out.update(status="error", code=500, error=str(e))
+        _observe(item, "batch", "error", started)
+    out["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return out
+
+
+@app.post("/query/batch")
+async def query_batch(body: BatchIn, request: Request):
+    """Run many /query items concurrently; stream one NDJSON line per item as it finishes.
+
+    Each line has index, id, mode, status ("ok" | "error"), and either
+    result or code/error (plus retry_after when admission control rejected
+    it). A last line {"done": true, ...} summarises the batch. Items run with
+    at most ``parallelism`` in flight (capped by GATEWAY_BATCH_PARALLELISM),
+    each under its own ``timeout``, and default to low priority.
+    """
+    if len(body.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    parallelism = min(body.parallelism or BATCH_PARALLELISM, BATCH_PARALLELISM)
+    timeout = min(body.timeout or BATCH_ITEM_TIMEOUT, BATCH_ITEM_TIMEOUT)
+    slots = asyncio.Semaphore(parallelism)
+
+    async def bounded(index: int, item: BatchItem) -> dict:
+        async with slots:
+            return await _batch_item(index, item, request, timeout)
+
+    async def lines():
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(bounded(i, item)) for i, item in enumerate(body.items)]
+        ok = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                record = await next_done
+                ok += record["status"] == "ok"
+                yield dumps_str(record) + "\n"
+        finally:
+            # Client went away: stop the items that have not finished
+            for task in tasks:
+                task.cancel()
+        summary = {"done": True, "items": len(tasks), "ok": ok, "errors": len(tasks) - ok,
+                   "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        yield dumps_str(summary) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/warmup")
+async def warmup(mode: Optional[str] = None):
+    """Import agents ahead of traffic (one mode, or every available mode)."""
+    modes = [mode.lower()] if mode else LOADER.modes()
+    unknown = [m for m in modes if m not in LOADER.sources]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {unknown[0]}")
+    return await _warm(modes)
+
+
+@app.get("/stats")
+async def stats():
+    # Runner reuse counters (setup_ms_saved is what per-request runners would have
+    # cost) and the import-time report for each agent module
+    out = {
+        **RUNNERS.stats(),
+        "agents": LOADER.report(),
+        "scheduler": SCHEDULER.stats(),
+        "event_loop": LOOP_LAG.stats(),
+        "single_flight": FLIGHTS.stats(),
+        "run_cost": RUN_COST.stats(),
+        "session_locks": SESSION_LOCKS.stats(),
+        "images": IMAGES.stats(),
+    }
+    if RESPONSE_CACHE is not None:
+        out["cache"] = RESPONSE_CACHE.stats()
+    return out
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: request latency per mode, plus per-agent events,
+    tool latency and LLM calls/tokens recorded by the ADK metrics plugin."""
+    return PlainTextResponse(METRICS.render(), media_type=METRICS.content_type)
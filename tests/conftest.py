@@ -0,0 +1,90 @@
+"""Shared fixtures: the gateway app (main.py) with a scripted model instead of Gemini.
+
+``gateway`` swaps the e-commerce agent for an LlmAgent backed by
+``EchoLlm`` and gives main.py fresh runners, session store, locks and
+single-flight table, so tests start from an empty gateway and never touch
+the network. Requests go through the ASGI app with httpx.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+from typing import Any, AsyncGenerator
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import httpx  # noqa: E402
+from google.adk.agents import LlmAgent  # noqa: E402
+from google.adk.models.base_llm import BaseLlm  # noqa: E402
+from google.adk.models.llm_request import LlmRequest  # noqa: E402
+from google.adk.models.llm_response import LlmResponse  # noqa: E402
+from google.genai import types  # noqa: E402
+
+from gateway.concurrency import AdmissionScheduler  # noqa: E402
+from gateway.runners import RunnerRegistry  # noqa: E402
+from gateway.sessions import BoundedSessionService, SessionLocks  # noqa: E402
+from gateway.singleflight import SingleFlight  # noqa: E402
+
+
+class EchoLlm(BaseLlm):
+    """Answers "re: <last user message> (turn N)" after ``latency`` seconds.
+
+    N counts the user messages in the request, so an answer shows how much
+    of its session's history the model was given.
+    """
+
+    model: str = "echo"
+    latency: float = 0.0
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self.latency)
+        asked = [c.parts[0].text for c in llm_request.contents if c.role == "user" and c.parts and c.parts[0].text]
+        text = f"re: {asked[-1] if asked else ''} (turn {len(asked)})"
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+class Gateway:
+    """main.py wired to an EchoLlm agent; ``client()`` talks to it over ASGI."""
+
+    def __init__(self, main: Any, llm: EchoLlm):
+        self.main = main
+        self.llm = llm
+        self.agent = LlmAgent(name="echo", model=llm, instruction="Echo the user.")
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.main.app), base_url="http://gateway", timeout=30)
+
+    async def session(self, user_id: str, session_id: str):
+        return await self.main.RUNNERS.session_service.get_session(
+            app_name=self.main.RUNNERS.app_name("ecommerce"), user_id=user_id, session_id=session_id
+        )
+
+
+@pytest.fixture
+def gateway(monkeypatch: pytest.MonkeyPatch) -> Gateway:
+    import main
+
+    gw = Gateway(main, EchoLlm())
+
+    async def load(mode: str) -> LlmAgent:
+        if mode != "ecommerce":
+            raise LookupError(mode)
+        return gw.agent
+
+    monkeypatch.setattr(main.LOADER, "get", load)
+    monkeypatch.setattr(main, "DEFAULT_MODE", "ecommerce")
+    monkeypatch.setattr(main, "RUNNERS", RunnerRegistry(
+        session_service=BoundedSessionService(idle_ttl=0, max_bytes=0, max_events=0), plugins=main.RUNNERS.plugins
+    ))
+    monkeypatch.setattr(main, "SESSION_LOCKS", SessionLocks())
+    monkeypatch.setattr(main, "SCHEDULER", AdmissionScheduler(limits={}, default=64))
+    monkeypatch.setattr(main, "FLIGHTS", SingleFlight())
+    monkeypatch.setattr(main, "RESPONSE_CACHE", None)
+    return gw
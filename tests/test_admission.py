@@ -0,0 +1,68 @@
+"""Admission control: saturated modes answer 429/503 instead of queueing forever."""
+from __future__ import annotations
+
+import asyncio
+
+from gateway.concurrency import AdmissionScheduler
+
+DELAY = 0.5
+
+
+def _query(i: int) -> dict:
+    return {"query": f"question {i}", "user_id": f"u{i}", "session_id": f"s{i}"}
+
+
+async def _after(seconds: float, request):
+    await asyncio.sleep(seconds)
+    return await request
+
+
+def _admit(gateway, monkeypatch, queue: int, queue_timeout: float = 10.0) -> AdmissionScheduler:
+    scheduler = AdmissionScheduler(limits={}, default=1, queue_limits={}, queue_default=queue, queue_timeout=queue_timeout)
+    monkeypatch.setattr(gateway.main, "SCHEDULER", scheduler)
+    gateway.llm.latency = DELAY
+    return scheduler
+
+
+def test_full_queue_answers_429(gateway, monkeypatch):
+    scheduler = _admit(gateway, monkeypatch, queue=1)
+
+    async def scenario():
+        async with gateway.client() as client:
+            # One runs, one waits, the third finds the queue full
+            return await asyncio.gather(*(_after(0.05 * i, client.post("/query", json=_query(i))) for i in range(3)))
+
+    responses = asyncio.run(scenario())
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert int(responses[2].headers["Retry-After"]) >= 1
+    assert scheduler.stats()["modes"]["ecommerce"]["rejected_full"] == 1
+
+
+def test_queue_wait_timeout_answers_503(gateway, monkeypatch):
+    scheduler = _admit(gateway, monkeypatch, queue=4, queue_timeout=0.1)
+
+    async def scenario():
+        async with gateway.client() as client:
+            return await asyncio.gather(*(_after(0.05 * i, client.post("/query", json=_query(i))) for i in range(2)))
+
+    responses = asyncio.run(scenario())
+    assert [r.status_code for r in responses] == [200, 503]
+    assert "queue wait exceeded" in responses[1].json()["detail"]
+    assert scheduler.stats()["modes"]["ecommerce"]["timed_out"] == 1
+
+
+def test_stream_is_rejected_with_a_status_not_an_open_stream(gateway, monkeypatch):
+    _admit(gateway, monkeypatch, queue=0)
+
+    async def scenario():
+        async with gateway.client() as client:
+            return await asyncio.gather(
+                client.post("/query", json=_query(0)),
+                _after(0.05, client.post("/query/stream", json=_query(1))),
+            )
+
+    running, stream = asyncio.run(scenario())
+    assert running.status_code == 200
+    assert stream.status_code == 429
+    assert stream.headers["content-type"].startswith("application/json")
+    assert "Retry-After" in stream.headers
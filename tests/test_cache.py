@@ -0,0 +1,43 @@
+"""Response cache: only first turns are shared, and a hit still lands in the caller's session."""
+from __future__ import annotations
+
+import asyncio
+
+from gateway.cache import MemoryBackend, ResponseCache
+
+
+def test_cache_hit_is_recorded_in_the_callers_session(gateway, monkeypatch):
+    monkeypatch.setattr(gateway.main, "RESPONSE_CACHE", ResponseCache(MemoryBackend()))
+
+    async def scenario():
+        async with gateway.client() as client:
+            first = await client.post("/query", json={"query": "Hello", "user_id": "u0", "session_id": "s0"})
+            hit = await client.post("/query", json={"query": "hello ", "user_id": "u1", "session_id": "s1"})
+            follow_up = await client.post("/query", json={"query": "tell me more", "user_id": "u1", "session_id": "s1"})
+            return first, hit, follow_up, await gateway.session("u1", "s1")
+
+    first, hit, follow_up, session = asyncio.run(scenario())
+    assert first.headers["X-Cache"] == "MISS"
+    assert hit.headers["X-Cache"] == "HIT"
+    assert hit.json()["text"] == first.json()["text"]
+    # The follow-up ran with the cached turn in its history
+    assert "X-Cache" not in follow_up.headers
+    assert follow_up.json()["text"] == "re: tell me more (turn 2)"
+    assert [e.author for e in session.events] == ["user", "echo", "user", "echo"]
+    assert session.events[0].content.parts[0].text == "hello "
+
+
+def test_later_turns_are_not_served_from_the_cache(gateway, monkeypatch):
+    monkeypatch.setattr(gateway.main, "RESPONSE_CACHE", ResponseCache(MemoryBackend()))
+
+    async def scenario():
+        async with gateway.client() as client:
+            await client.post("/query", json={"query": "tell me more", "user_id": "u0", "session_id": "s0"})
+            # s1 has history, so the cached first-turn answer does not apply to it
+            await client.post("/query", json={"query": "hi", "user_id": "u1", "session_id": "s1"})
+            return await client.post("/query", json={"query": "tell me more", "user_id": "u1", "session_id": "s1"})
+
+    later = asyncio.run(scenario())
+    assert "X-Cache" not in later.headers
+    assert later.json()["text"] == "re: tell me more (turn 2)"
+    assert gateway.main.RESPONSE_CACHE.stats()["hits"] == 0
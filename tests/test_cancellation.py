@@ -0,0 +1,99 @@
+"""A caller that disconnects or runs out of time cancels its run and frees the run slot."""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from gateway.concurrency import AdmissionScheduler
+
+SLOW = 5.0
+
+
+@pytest.fixture
+def one_slot(gateway, monkeypatch) -> AdmissionScheduler:
+    scheduler = AdmissionScheduler(limits={}, default=1, queue_limits={}, queue_default=4, queue_timeout=10)
+    monkeypatch.setattr(gateway.main, "SCHEDULER", scheduler)
+    gateway.llm.latency = SLOW
+    return scheduler
+
+
+async def _disconnecting_query(app, body: dict, after: float) -> list[dict]:
+    """POST /query straight through ASGI, hanging up ``after`` seconds in."""
+    sent: list[dict] = []
+    delivered = False
+
+    async def receive() -> dict:
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+        await asyncio.sleep(after)
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/query", "raw_path": b"/query", "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"host", b"gateway")],
+        "client": ("127.0.0.1", 1234), "server": ("gateway", 80),
+    }
+    await app(scope, receive, send)
+    return sent
+
+
+async def _slot_is_free(gateway) -> float:
+    """Time for a quick query to get through the single run slot."""
+    gateway.llm.latency = 0.0
+    started = time.perf_counter()
+    async with gateway.client() as client:
+        resp = await client.post("/query", json={"query": "next", "user_id": "u9", "session_id": "s9"})
+    assert resp.status_code == 200
+    return time.perf_counter() - started
+
+
+def test_disconnect_cancels_the_run_and_frees_its_slot(gateway, one_slot):
+    async def scenario():
+        started = time.perf_counter()
+        sent = await _disconnecting_query(gateway.main.app, {"query": "slow", "user_id": "u0", "session_id": "s0"}, 0.2)
+        gone_after = time.perf_counter() - started
+        await asyncio.sleep(0.05)  # let the cancellation unwind
+        running = one_slot.stats()["modes"]["ecommerce"]["running"]
+        return sent, gone_after, running, await _slot_is_free(gateway), await gateway.session("u0", "s0")
+
+    sent, gone_after, running, next_wait, session = asyncio.run(scenario())
+    assert sent[0]["status"] == 499
+    assert gone_after < 1.0
+    assert running == 0
+    assert next_wait < 1.0
+    assert gateway.main.FLIGHTS.stats()["runs_cancelled"] == 1
+    assert [e.author for e in session.events] == ["user"]  # the model never answered
+
+
+@pytest.mark.parametrize("limit", ["timeout", "run_deadline"])
+def test_expired_deadline_cancels_the_run_and_frees_its_slot(gateway, one_slot, monkeypatch, limit):
+    body = {"query": "slow", "user_id": "u0", "session_id": "s0"}
+    if limit == "timeout":
+        body["timeout"] = 0.2
+    else:
+        monkeypatch.setattr(gateway.main, "RUN_DEADLINE", 0.2)
+
+    async def scenario():
+        started = time.perf_counter()
+        async with gateway.client() as client:
+            resp = await client.post("/query", json=body)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.05)
+        running = one_slot.stats()["modes"]["ecommerce"]["running"]
+        return resp, elapsed, running, await _slot_is_free(gateway)
+
+    resp, elapsed, running, next_wait = asyncio.run(scenario())
+    assert resp.status_code == 504
+    assert elapsed < 1.0
+    assert running == 0
+    assert next_wait < 1.0
+    assert gateway.main.FLIGHTS.stats()["runs_cancelled"] == 1
@@ -0,0 +1,53 @@
+"""Agent runs must not block the event loop: concurrent requests overlap."""
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT
+
+DELAY = 0.3
+N = 8
+
+
+async def _timed_queries(gateway, n: int) -> tuple[float, list[dict]]:
+    async with gateway.client() as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/query", json={"query": f"question {i}", "user_id": f"u{i}", "session_id": f"s{i}"})
+            for i in range(n)
+        ))
+        wall = time.perf_counter() - started
+    assert [r.status_code for r in responses] == [200] * n
+    return wall, [r.json() for r in responses]
+
+
+def test_concurrent_queries_take_about_one_model_call(gateway):
+    gateway.llm.latency = DELAY
+    wall, bodies = asyncio.run(_timed_queries(gateway, N))
+    assert [b["text"] for b in bodies] == [f"re: question {i} (turn 1)" for i in range(N)]
+    # Serial runs would take N * DELAY (2.4 s); overlapping ones about DELAY
+    assert wall < 3 * DELAY, f"{N} requests took {wall:.2f}s"
+
+
+def test_blocking_tool_stays_off_the_event_loop(gateway):
+    pytest.importorskip("selenium")
+    sys.path.insert(0, str(ROOT / "Agentic-Tools" / "brand-SEO"))
+    from sub_agent.search_result.tools import _off_loop
+
+    blocking = _off_loop(time.sleep)
+
+    async def scenario() -> tuple[float, float]:
+        started = time.perf_counter()
+        tool = asyncio.create_task(blocking(4 * DELAY))
+        wall, _ = await _timed_queries(gateway, N)
+        await tool
+        return wall, time.perf_counter() - started
+
+    gateway.llm.latency = DELAY
+    wall, total = asyncio.run(scenario())
+    # The queries finished while the Selenium thread was still sleeping
+    assert wall < 3 * DELAY < total
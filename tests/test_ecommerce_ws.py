@@ -0,0 +1,29 @@
+"""E-commerce agent /ws: malformed client frames get an error frame, not a dead socket."""
+from __future__ import annotations
+
+import importlib.util
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from conftest import ROOT
+
+
+@pytest.fixture(scope="module")
+def ecommerce():
+    spec = importlib.util.spec_from_file_location("ecommerce_agent", ROOT / "Agentic-Tools" / "e-commerce" / "agent.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_binary_and_non_object_frames_get_a_400_frame(ecommerce):
+    with TestClient(ecommerce.app).websocket_connect("/ws") as ws:
+        assert json.loads(ws.receive_text())["type"] == "session"
+        ws.send_bytes(b"\x00\x01")
+        assert json.loads(ws.receive_text()) == {"type": "error", "status": 400, "error": "Expected a text frame"}
+        ws.send_text("[1, 2]")
+        assert json.loads(ws.receive_text()) == {"type": "error", "status": 400, "error": "Expected a JSON object"}
+        ws.send_text(json.dumps({"query": ""}))
+        assert json.loads(ws.receive_text())["error"] == "query is required"  # the socket is still serving
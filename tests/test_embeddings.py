@@ -0,0 +1,48 @@
+"""Shared embedding stores: workers load the fitted encoder, and only unused old stores are removed."""
+from __future__ import annotations
+
+import gc
+
+import pytest
+
+from gateway import embeddings, search
+from gateway.search import HybridIndex
+
+COLORS = ["red", "blue", "green", "black", "white", "silver"]
+THINGS = ["running shoe", "rain jacket", "coffee mug", "desk lamp", "phone case"]
+
+
+def catalog(tag: str) -> list[dict]:
+    return [
+        {"id": f"{tag}-{i}", "title": f"{color} {thing} {tag}", "brand": f"brand{i % 4}"}
+        for i, (color, thing) in enumerate((c, t) for c in COLORS for t in THINGS)
+    ]
+
+
+def test_second_worker_loads_the_encoder_instead_of_refitting(tmp_path, monkeypatch):
+    first = HybridIndex(catalog("a"), dense_dim=16, store_dir=tmp_path)
+
+    def refit(*args, **kwargs):
+        raise AssertionError("the encoder was fitted again")
+
+    monkeypatch.setattr(search.LsaEncoder, "__init__", refit)
+    second = HybridIndex(catalog("a"), dense_dim=16, store_dir=tmp_path)
+    assert second.dense.matrix is None and second.dense_store.dtype == "int8"
+    for query in ("blu rain jaket", "silver lamp", "mug"):
+        assert [r["id"] for r in second.search(query, use_sparse=False)] == [r["id"] for r in first.search(query, use_sparse=False)]
+
+
+def test_old_stores_are_removed_only_once_nobody_has_them_open(tmp_path):
+    if embeddings.fcntl is None:
+        pytest.skip("needs flock")
+    old = HybridIndex(catalog("a"), dense_dim=16, store_dir=tmp_path)
+    old_dir = old.dense_store.root
+    current = HybridIndex(catalog("b"), dense_dim=16, store_dir=tmp_path)
+    assert old_dir.exists()  # still served by `old`
+
+    del old
+    gc.collect()
+    newest = HybridIndex(catalog("c"), dense_dim=16, store_dir=tmp_path)
+    assert not old_dir.exists()
+    assert current.dense_store.root.exists()  # still open
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([current.dense_store.root.name, newest.dense_store.root.name])
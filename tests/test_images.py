@@ -0,0 +1,108 @@
+"""Image proxy disk cache: eviction bookkeeping and bodies over the size cap."""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+
+from aiohttp import web
+
+from gateway.images import DiskCache, ImageProxy
+
+BODY = 40_000
+
+
+async def _host() -> tuple[web.AppRunner, str]:
+    """Serves /<n>.png (BODY bytes) and /big.png (chunked, no Content-Length)."""
+
+    async def image(request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        if name == "big":
+            resp = web.StreamResponse(headers={"Content-Type": "image/png"})
+            resp.enable_chunked_encoding()
+            await resp.prepare(request)
+            for _ in range(3):
+                await resp.write(b"b" * BODY)
+            await resp.write_eof()
+            return resp
+        return web.Response(body=os.urandom(BODY), content_type="image/png")
+
+    app = web.Application()
+    app.router.add_get("/{name}.png", image)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def _get(proxy: ImageProxy, url: str) -> bytes:
+    resp = await proxy.serve(url)
+    return b"".join([chunk async for chunk in resp.body_iterator])
+
+
+def test_eviction_removes_meta_files_and_tracks_size(tmp_path):
+    async def scenario():
+        runner, base = await _host()
+        proxy = ImageProxy(cache_dir=tmp_path, max_cache_bytes=int(2.5 * BODY))
+        try:
+            for i in range(5):
+                assert len(await _get(proxy, f"{base}/{i}.png")) == BODY
+        finally:
+            await proxy.close()
+            await runner.cleanup()
+        return proxy
+
+    proxy = asyncio.run(scenario())
+    blobs = list((tmp_path / "blobs").iterdir())
+    metas = list((tmp_path / "meta").glob("*.json"))
+    assert len(blobs) == len(metas) == 2
+    assert proxy.cache.size() == sum(p.stat().st_size for p in blobs) == 2 * BODY
+    assert proxy.cache.evictions == 3
+    # A restart rebuilds the same index
+    assert ImageProxy(cache_dir=tmp_path, max_cache_bytes=int(2.5 * BODY)).cache.size() == 2 * BODY
+
+
+def test_body_over_the_cap_is_streamed_whole_but_not_cached(tmp_path):
+    async def scenario():
+        runner, base = await _host()
+        proxy = ImageProxy(cache_dir=tmp_path, max_body_bytes=BODY)
+        try:
+            return await _get(proxy, f"{base}/big.png"), proxy.cache.get_meta(f"{base}/big.png")
+        finally:
+            await proxy.close()
+            await runner.cleanup()
+
+    body, meta = asyncio.run(scenario())
+    assert len(body) == 3 * BODY
+    assert meta is None
+    assert not list((tmp_path / "blobs").iterdir())
+    assert not list((tmp_path / "tmp").iterdir())
+
+
+def test_cache_reads_run_off_the_event_loop(tmp_path, monkeypatch):
+    threads: dict[str, set[str]] = {"get_meta": set(), "touch": set()}
+    for name in threads:
+        original = getattr(DiskCache, name)
+
+        def spy(self, *args, _name=name, _original=original):
+            threads[_name].add(threading.current_thread().name)
+            return _original(self, *args)
+
+        monkeypatch.setattr(DiskCache, name, spy)
+
+    async def scenario():
+        runner, base = await _host()
+        proxy = ImageProxy(cache_dir=tmp_path)
+        try:
+            first = await _get(proxy, f"{base}/1.png")
+            assert await _get(proxy, f"{base}/1.png") == first  # a cache hit
+            assert proxy.hits == 1
+        finally:
+            await proxy.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+    assert threads["get_meta"] and threads["touch"]
+    assert threading.main_thread().name not in threads["get_meta"] | threads["touch"]
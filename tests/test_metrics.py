@@ -0,0 +1,35 @@
+"""MetricsPlugin must not keep bookkeeping for runs that were cancelled."""
+from __future__ import annotations
+
+import asyncio
+
+
+def test_cancelled_runs_leave_no_start_times(gateway):
+    plugin = gateway.main.METRICS_PLUGIN
+    gateway.llm.latency = 5.0
+
+    async def scenario():
+        async with gateway.client() as client:
+            responses = await asyncio.gather(*(
+                client.post("/query", json={"query": f"slow {i}", "session_id": f"s{i}", "timeout": 0.2})
+                for i in range(4)
+            ))
+            await asyncio.sleep(0.05)  # let the cancellations unwind
+            return responses
+
+    responses = asyncio.run(scenario())
+    assert [r.status_code for r in responses] == [504] * 4
+    assert gateway.main.FLIGHTS.stats()["runs_cancelled"] == 4
+    assert plugin.in_flight() == 0
+
+
+def test_finished_runs_leave_no_start_times(gateway):
+    plugin = gateway.main.METRICS_PLUGIN
+
+    async def scenario():
+        async with gateway.client() as client:
+            return await client.post("/query", json={"query": "quick", "session_id": "s0"})
+
+    assert asyncio.run(scenario()).status_code == 200
+    assert plugin.in_flight() == 0
+    assert "adk_llm_duration_seconds_count" in gateway.main.METRICS.render()
@@ -0,0 +1,25 @@
+"""Local hybrid search: catalogs without searchable text load instead of failing."""
+from __future__ import annotations
+
+import pytest
+
+from gateway.search import HybridIndex, SearchEngine
+
+
+@pytest.mark.parametrize("documents", [
+    [{"title": ""}, {"title": "!!"}],
+    [{"title": "!!"}],
+    [{"title": ""}, {"title": "  "}],
+])
+def test_catalog_without_words_loads_and_searches(documents, tmp_path):
+    for store_dir in (None, tmp_path):
+        engine = SearchEngine(store_dir=store_dir)
+        index = engine.load("odd", documents)
+        assert len(index) == len(documents)
+        assert index.sparse.scores("anything").tolist() == [0.0] * len(documents)
+        assert isinstance(engine.search("odd", "anything"), list)
+
+
+def test_words_are_still_found_next_to_empty_documents():
+    index = HybridIndex([{"id": "a", "title": "red shoe"}, {"id": "b", "title": "!!"}, {"id": "c", "title": ""}])
+    assert index.search("shoe", use_dense=False)[0]["id"] == "a"
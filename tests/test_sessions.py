@@ -0,0 +1,113 @@
+"""SharedSessionService over SQLite and LocalRedis: concurrent writers on one session."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from gateway.localredis import LocalRedis
+from gateway.sessions import RedisSessionStore, SessionConflictError, SharedSessionService, SQLiteSessionStore
+
+APP, USER, SID = "test-sessions", "u", "s"
+EVENTS = 10
+
+
+class RivalSQLite(SQLiteSessionStore):
+    """Another worker always appends first, so every append here conflicts."""
+
+    def append(self, app, user, sid, expected, state, updated, event):
+        _, current, _ = self.load(app, user, sid)
+        super().append(app, user, sid, current, state, current + 1, _event("rival", 0).model_dump_json())
+        return super().append(app, user, sid, expected, state, updated, event)
+
+
+class RivalRedis(RedisSessionStore):
+    async def append(self, app, user, sid, expected, state, updated, event):
+        _, current, _ = await self.load(app, user, sid)
+        await super().append(app, user, sid, current, state, current + 1, _event("rival", 0).model_dump_json())
+        return await super().append(app, user, sid, expected, state, updated, event)
+
+
+def _event(writer: str, i: int) -> Event:
+    return Event(
+        invocation_id=f"{writer}-{i}",
+        author=writer,
+        content=types.Content(role="model", parts=[types.Part(text=f"{writer} {i}")]),
+        actions=EventActions(state_delta={f"{writer}_{i}": i}),
+    )
+
+
+def _workers(backend: str, tmp_path, rival: bool = False) -> list[SharedSessionService]:
+    """Two services over one store, like two uvicorn workers."""
+    if backend == "sqlite":
+        cls = RivalSQLite if rival else SQLiteSessionStore
+        return [SharedSessionService(cls(tmp_path / "sessions.sqlite3"), max_retries=2 if rival else 8) for _ in range(2)]
+    client = LocalRedis()
+    cls = RivalRedis if rival else RedisSessionStore
+    return [SharedSessionService(cls(client), max_retries=2 if rival else 8) for _ in range(2)]
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "redis-local"])
+def test_concurrent_writers_lose_no_events(backend, tmp_path):
+    workers = _workers(backend, tmp_path)
+
+    async def write(service: SharedSessionService, writer: str) -> None:
+        # Each worker holds its own copy, which goes stale as soon as the other one writes
+        session = await service.get_session(app_name=APP, user_id=USER, session_id=SID)
+        for i in range(EVENTS):
+            await service.append_event(session, _event(writer, i))
+            await asyncio.sleep(0)
+
+    async def scenario():
+        await workers[0].create_session(app_name=APP, user_id=USER, session_id=SID)
+        await asyncio.gather(write(workers[0], "a"), write(workers[1], "b"))
+        return await workers[1].get_session(app_name=APP, user_id=USER, session_id=SID)
+
+    session = asyncio.run(scenario())
+    written = {f"{w}-{i}" for w in "ab" for i in range(EVENTS)}
+    assert {e.invocation_id for e in session.events} == written
+    assert len(session.events) == 2 * EVENTS
+    assert session.state == {f"{w}_{i}": i for w in "ab" for i in range(EVENTS)}
+    assert sum(w.conflicts for w in workers) > 0
+    assert sum(w.appends for w in workers) == 2 * EVENTS
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "redis-local"])
+def test_gives_up_after_max_retries(backend, tmp_path):
+    service = _workers(backend, tmp_path, rival=True)[0]
+
+    async def scenario():
+        session = await service.create_session(app_name=APP, user_id=USER, session_id=SID)
+        await service.append_event(session, _event("a", 0))
+
+    with pytest.raises(SessionConflictError, match="gave up after 2 retries"):
+        asyncio.run(scenario())
+    assert service.conflicts == 3
+    assert service.appends == 0
+
+
+def test_concurrent_users_each_see_only_their_own_session(gateway):
+    gateway.llm.latency = 0.1
+
+    async def turns(client, user: str) -> list[str]:
+        # Two turns at once on one session: the lock runs them one after the other
+        responses = await asyncio.gather(*(
+            client.post("/query", json={"query": f"{user} {t}", "user_id": user, "session_id": "s0"}) for t in range(2)
+        ))
+        return sorted(r.json()["text"] for r in responses)
+
+    async def scenario():
+        async with gateway.client() as client:
+            texts = await asyncio.gather(turns(client, "alice"), turns(client, "bob"))
+        return texts, [await gateway.session(user, "s0") for user in ("alice", "bob")]
+
+    texts, sessions = asyncio.run(scenario())
+    for user, answers, session in zip(("alice", "bob"), texts, sessions):
+        assert [a.split(" (turn ")[1] for a in answers] == ["1)", "2)"]  # no turn saw the other user's messages
+        asked = [e.content.parts[0].text for e in session.events if e.author == "user"]
+        assert sorted(asked) == [f"{user} 0", f"{user} 1"]
+        assert [e.author for e in session.events] == ["user", "echo"] * 2  # turns did not interleave
+    assert gateway.main.SESSION_LOCKS.stats()["active_sessions"] == 0
+    assert gateway.main.SESSION_LOCKS.stats()["waited"] == 2
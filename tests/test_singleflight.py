@@ -0,0 +1,118 @@
+"""Single-flight coalesces duplicates on one session, and first turns across fresh sessions."""
+from __future__ import annotations
+
+import asyncio
+
+from gateway.singleflight import Flight
+
+
+def test_first_turn_on_fresh_sessions_shares_one_run(gateway):
+    gateway.llm.latency = 0.2
+
+    async def scenario():
+        async with gateway.client() as client:
+            responses = await asyncio.gather(
+                *(
+                    client.post("/query", json={"query": "tell me more", "user_id": f"u{i}", "session_id": f"s{i}"})
+                    for i in range(2)
+                ),
+                client.post("/query/stream", json={"query": "Tell me  more", "user_id": "u2", "session_id": "s2"}),
+            )
+            sessions = [await gateway.session(f"u{i}", f"s{i}") for i in range(3)]
+            return responses, sessions
+
+    responses, sessions = asyncio.run(scenario())
+    stats = gateway.main.FLIGHTS.stats()
+    assert stats["runs_started"] == 1
+    assert stats["followers"] == 2
+    assert [r.json()["text"] for r in responses[:2]] == ["re: tell me more (turn 1)"] * 2
+    assert [r.json()["session_id"] for r in responses[:2]] == ["s0", "s1"]
+    assert "event: done" in responses[2].text and "re: tell me more (turn 1)" in responses[2].text
+    for i, session in enumerate(sessions):
+        # Each session records the shared answer as its own first turn
+        assert session is not None and [e.author for e in session.events] == ["user", "echo"]
+        assert session.events[0].content.parts[0].text == ("Tell me  more" if i == 2 else "tell me more")
+        assert session.events[1].content.parts[0].text == "re: tell me more (turn 1)"
+
+
+def test_same_question_on_sessions_with_history_runs_per_session(gateway):
+    gateway.llm.latency = 0.2
+
+    async def scenario():
+        async with gateway.client() as client:
+            # Give each session a different amount of history first
+            for i in range(1, 4):
+                for t in range(i):
+                    await client.post("/query", json={"query": f"warm-up {t}", "user_id": f"u{i}", "session_id": f"s{i}"})
+            before = gateway.main.FLIGHTS.stats()
+            responses = await asyncio.gather(*(
+                client.post("/query", json={"query": "tell me more", "user_id": f"u{i}", "session_id": f"s{i}"})
+                for i in range(1, 4)
+            ))
+            sessions = [await gateway.session(f"u{i}", f"s{i}") for i in range(1, 4)]
+            return before, gateway.main.FLIGHTS.stats(), responses, sessions
+
+    before, after, responses, sessions = asyncio.run(scenario())
+    assert after["runs_started"] - before["runs_started"] == 3
+    assert after["requests_coalesced"] == before["requests_coalesced"]
+    for i, (r, session) in enumerate(zip(responses, sessions), start=1):
+        assert r.json()["session_id"] == f"s{i}"
+        assert r.json()["text"] == f"re: tell me more (turn {i + 1})"
+        assert session is not None and len(session.events) == 2 * (i + 1)
+        assert session.events[-2].content.parts[0].text == "tell me more"
+
+
+def test_duplicate_submits_on_one_session_share_a_run(gateway):
+    gateway.llm.latency = 0.2
+
+    async def scenario():
+        async with gateway.client() as client:
+            body = {"query": "hello", "user_id": "u0", "session_id": "s0"}
+            responses = await asyncio.gather(client.post("/query", json=body), client.post("/query", json=body))
+            return responses, await gateway.session("u0", "s0")
+
+    responses, session = asyncio.run(scenario())
+    assert [r.json()["text"] for r in responses] == ["re: hello (turn 1)"] * 2
+    assert gateway.main.FLIGHTS.stats()["requests_coalesced"] == 1
+    assert len(session.events) == 2  # one turn, not two
+
+
+def test_frames_are_kept_only_for_stream_subscribers():
+    async def scenario():
+        flight = Flight(backlog=3)
+        for i in range(5):
+            flight.publish(i)
+        nobody = flight.frames
+        flight.subscribe()
+        for i in range(5, 10):
+            flight.publish(i)
+        flight.finish(result="done")
+        return nobody, [frame async for frame in flight.frames_iter()], await flight.wait()
+
+    nobody, replayed, result = asyncio.run(scenario())
+    assert nobody is None  # a /query run publishes into nothing
+    assert replayed == [7, 8, 9]  # a late joiner gets the ring, not the whole run
+    assert result == "done"
+
+
+def test_stream_follows_the_run_and_query_keeps_no_frames(gateway):
+    flights = []
+    join = gateway.main.FLIGHTS.join
+
+    def recording_join(key, producer, follower=False):
+        flights.append(join(key, producer, follower))
+        return flights[-1]
+
+    gateway.main.FLIGHTS.join = recording_join
+
+    async def scenario():
+        async with gateway.client() as client:
+            query = await client.post("/query", json={"query": "hi", "user_id": "u0", "session_id": "s0"})
+            stream = await client.post("/query/stream", json={"query": "again", "user_id": "u1", "session_id": "s1"})
+            return query, stream
+
+    query, stream = asyncio.run(scenario())
+    assert query.json()["text"] == "re: hi (turn 1)"
+    assert flights[0].frames is None
+    assert "event: event" in stream.text and "re: again (turn 1)" in stream.text
+    assert flights[1].subscribers == 1 and len(flights[1].frames) <= flights[1].backlog
@@ -0,0 +1,124 @@
+"""UpstreamClient: retry backoff and the circuit breaker's open / half-open / closed cycle."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from gateway import upstream
+from gateway.upstream import CircuitBreaker, CircuitOpen, UpstreamClient, UpstreamError
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(upstream.time, "monotonic", clock)
+    return clock
+
+
+async def _host(statuses: list[int]) -> tuple[web.AppRunner, str, list[int]]:
+    """Answers with the next status from ``statuses`` (200 once they run out); records each hit."""
+    hits: list[int] = []
+
+    async def search(request: web.Request) -> web.Response:
+        status = statuses.pop(0) if statuses else 200
+        hits.append(status)
+        return web.json_response({"status": status}, status=status)
+
+    app = web.Application()
+    app.router.add_post("/search", search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/search", hits
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker(failures=2, reset_seconds=30)
+    breaker.failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()  # the probe
+    assert breaker.state == "half_open" and not breaker.allow()  # one probe at a time
+    breaker.failure()
+    assert breaker.state == "open" and breaker.opens == 2 and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.consecutive == 0 and breaker.allow()
+
+
+def test_retries_back_off_exponentially_then_succeed(monkeypatch):
+    waits: list[float] = []
+    monkeypatch.setattr(upstream.random, "uniform", lambda low, high: waits.append(high) or 0.0)
+
+    async def scenario():
+        runner, url, hits = await _host([503, 502])
+        client = UpstreamClient([url], retries=3, backoff=0.1, breaker_failures=5)
+        try:
+            return await client.post_json({"query": "q"}), hits, client.breakers[url]
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    data, hits, breaker = asyncio.run(scenario())
+    assert data == {"status": 200}
+    assert hits == [503, 502, 200]
+    assert waits == [0.1, 0.2]  # full jitter up to backoff * 2**(attempt - 1)
+    assert breaker.state == "closed" and breaker.consecutive == 0
+
+
+def test_failures_open_the_circuit_and_a_probe_closes_it(clock):
+    async def scenario():
+        runner, url, hits = await _host([503, 503])
+        client = UpstreamClient([url], retries=0, breaker_failures=2, breaker_reset=10)
+        try:
+            for _ in range(2):
+                with pytest.raises(UpstreamError) as failed:
+                    await client.post_json({})
+                assert failed.value.status == 503
+            with pytest.raises(CircuitOpen):
+                await client.post_json({})  # fails fast, nothing is sent
+            sent_while_open = len(hits)
+            clock.now += 10
+            data = await client.post_json({})  # half-open probe
+            return sent_while_open, data, client.breakers[url].state
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    sent_while_open, data, state = asyncio.run(scenario())
+    assert sent_while_open == 2
+    assert data == {"status": 200}
+    assert state == "closed"
+
+
+def test_unexpected_error_during_probe_lets_the_next_probe_through(clock, monkeypatch):
+    client = UpstreamClient(["http://upstream.invalid/search"], retries=0, breaker_failures=1)
+    breaker = client.breakers[client.urls[0]]
+    breaker.failure()
+    clock.now += breaker.reset_seconds
+
+    class Broken:
+        def post(self, *args, **kwargs):
+            raise RuntimeError("not a ClientError")
+
+    monkeypatch.setattr(client, "_client", Broken)
+    with pytest.raises(RuntimeError):
+        asyncio.run(client.post_json({}))
+    assert breaker.state == "half_open"
+    assert breaker.allow()  # not stuck waiting for the failed probe
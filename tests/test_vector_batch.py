@@ -0,0 +1,48 @@
+"""vector_service /search/batch: the parallelism cap holds with upstream batching on."""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import sys
+
+import httpx
+import pytest
+
+from conftest import ROOT
+from gateway.upstream import MicroBatcher
+
+
+@pytest.fixture
+def vector(monkeypatch: pytest.MonkeyPatch):
+    spec = importlib.util.spec_from_file_location("vector_service", ROOT / "Agentic-Tools" / "e-commerce" / "vector_service.py")
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, "vector_service", module)  # FastAPI resolves the string annotations here
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, "LOCAL", False)
+    monkeypatch.setattr(module, "UPSTREAM", object())
+    monkeypatch.setattr(module, "SEARCH_CACHE", None)
+    monkeypatch.setattr(module, "BATCH_PARALLELISM", 16)
+    return module
+
+
+def test_upstream_batches_respect_the_callers_parallelism(vector, monkeypatch):
+    sizes: list[int] = []
+
+    async def send(payloads: list[dict]) -> list[dict]:
+        sizes.append(len(payloads))
+        await asyncio.sleep(0.01)
+        return [{"results": [], "query": p["query"]} for p in payloads]
+
+    async def scenario():
+        monkeypatch.setattr(vector, "BATCHER", MicroBatcher(send, max_items=32, linger=0.005))
+        transport = httpx.ASGITransport(app=vector.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://vector") as client:
+            items = [{"query": f"q{i}"} for i in range(10)]
+            return await client.post("/search/batch", json={"items": items, "parallelism": 3})
+
+    resp = asyncio.run(scenario())
+    body = resp.json()
+    assert resp.status_code == 200 and body["ok"] == 10
+    assert [r["result"]["query"] for r in body["results"]] == [f"q{i}" for i in range(10)]
+    assert sum(sizes) == 10
+    assert max(sizes) <= 3